@@ -1,31 +1,44 @@
 from flask import Flask, request, jsonify
-import pandas as pd
 import os
+import sys
+import threading
+
+# The shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 app = Flask(__name__)
 excel_file_path = 'PUE_Datenbank.xlsx'  # The path to the Excel file in the repo
 
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_collector():
+    """Collector for excel_file_path, created on first upload"""
+    global _collector
+    if _collector is None:
+        with _collector_lock:
+            if _collector is None:
+                from pue_data_collector import PUEDataCollector
+                _collector = PUEDataCollector(excel_file_path)
+    return _collector
+
+
 @app.route('/upload', methods=['POST'])
 def upload_data():
-    # Handle JSON input
+    # Rows are appended to the journal and the columnar snapshot; the workbook
+    # is neither re-read nor rewritten per upload (see ExcelStore)
     if request.is_json:
-        data = request.get_json()
-        df = pd.DataFrame(data)
+        result = get_collector().add_json_data(request.get_json())
     # Handle CSV input
-    elif request.files['file'].filename.endswith('.csv'):
-        file = request.files['file']
-        df = pd.read_csv(file)
+    elif 'file' in request.files and request.files['file'].filename.endswith('.csv'):
+        result = get_collector().add_csv_data(request.files['file'].stream)
     else:
         return jsonify({"error": "Invalid input format. Please submit JSON or a CSV file."}), 400
 
-    # Load the existing Excel file, or create a new one if it doesn't exist
-    if os.path.exists(excel_file_path):
-        existing_df = pd.read_excel(excel_file_path)
-        df = pd.concat([existing_df, df], ignore_index=True)
-
-    # Save the updated DataFrame to the Excel file
-    df.to_excel(excel_file_path, index=False)
-    return jsonify({"message": "Data uploaded successfully!"}), 200
+    if result.get('success') is False:
+        return jsonify({"error": "Invalid input data.", **result}), 400
+    return jsonify({"message": "Data uploaded successfully!", **result}), 200
 
 if __name__ == '__main__':
     app.run(debug=True)
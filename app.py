@@ -4,14 +4,36 @@ Flask Web Application for PUE Data Collection
 Provides REST API and web interface for adding data to Excel
 """
 
-from flask import Flask, request, jsonify, send_file, render_template_string
-from pue_data_collector import get_collector
+# Imported first: its creation time approximates the start of the process
+from pue_startup import startup_timer
+
+with startup_timer.phase('import:flask'):
+    from flask import (Flask, Response, g, request, jsonify, send_file,
+                       render_template_string, stream_with_context, url_for)
+    from werkzeug.http import is_resource_modified
+with startup_timer.phase('import:pue_data_collector'):
+    from pue_data_collector import get_collector
+    from pue_export import XLSX_MIMETYPE
+    from pue_index import INDEXED_COLUMNS as RECORD_FILTERS
+    from pue_jobs import MAX_ERRORS, get_job_queue
+    from pue_metrics import HTTP_SECONDS, finish_request, registry, server_timing, start_request
+    from pue_search import MIN_SCORE
+import gzip
+import hashlib
 import json
+import os
+import time
 from datetime import datetime
 
 app = Flask(__name__)
-collector = get_collector()
-collector.add_entry(data)
+# Per-request phase breakdown in a Server-Timing header (PUE_SERVER_TIMING=0 disables it)
+SERVER_TIMING = os.environ.get('PUE_SERVER_TIMING', '1') != '0'
+# Text responses from this size on are gzipped for clients that accept it
+GZIP_MIN_BYTES = 1024
+# Compressible mimetypes (xlsx downloads are zip archives already)
+GZIP_MIMETYPES = ('application/json', 'text/plain', 'text/html')
+# Last /api/stats body and its data ETag: {'etag', 'json', 'gzip'}
+_stats_cache = None
 
 # HTML Template (embedded for simplicity)
 HTML_TEMPLATE = '''
@@ -217,8 +239,10 @@ HTML_TEMPLATE = '''
                 const result = await response.json();
                 
                 if (result.success) {
-                    showStatus(result.message, 'success');
-                    updateStats();
+                    const timing = formatServerTiming(response.headers.get('Server-Timing'));
+                    showStatus(result.message + (timing ? ' (' + timing + ')' : ''), 'success');
+                    // With the live stream the new numbers arrive as a delta event
+                    if (!statsSource) updateStats();
                     setTimeout(() => clearInput(), 2000);
                 } else {
                     showStatus(result.message, 'error');
@@ -228,6 +252,16 @@ HTML_TEMPLATE = '''
             }
         }
         
+        function formatServerTiming(header) {
+            // "parse;dur=1.20, map;dur=0.30" -> "parse 1.2 ms, map 0.3 ms"
+            if (!header) return '';
+            return header.split(',').map(entry => {
+                const [name, ...params] = entry.trim().split(';');
+                const dur = params.find(p => p.startsWith('dur='));
+                return dur ? name + ' ' + parseFloat(dur.slice(4)).toFixed(1) + ' ms' : name;
+            }).join(', ');
+        }
+        
         function clearInput() {
             document.getElementById('dataInput').value = '';
             document.getElementById('statusBox').style.display = 'none';
@@ -243,29 +277,122 @@ HTML_TEMPLATE = '''
         async function updateStats() {
             try {
                 const response = await fetch('/api/stats');
-                const stats = await response.json();
-                
-                document.getElementById('totalRecords').textContent = stats.Gesamtanzahl;
-                document.getElementById('totalManufacturers').textContent = stats.Hersteller;
-                document.getElementById('totalCategories').textContent = stats.Produktkategorien;
-                document.getElementById('lastUpdate').textContent = stats.Letzte_Aktualisierung || '-';
-                document.getElementById('statsGrid').style.display = 'grid';
+                showStats(await response.json());
             } catch (error) {
                 console.error('Fehler beim Laden der Statistiken:', error);
             }
         }
         
+        function showStats(stats) {
+            document.getElementById('totalRecords').textContent = stats.Gesamtanzahl;
+            document.getElementById('totalManufacturers').textContent = stats.Hersteller;
+            document.getElementById('totalCategories').textContent = stats.Produktkategorien;
+            document.getElementById('lastUpdate').textContent = stats.Letzte_Aktualisierung || '-';
+            document.getElementById('statsGrid').style.display = 'grid';
+        }
+        
+        // Live stats: full stats once, then only the changed fields per commit;
+        // EventSource reconnects by itself and resumes with Last-Event-ID
+        let statsSource = null;
+        let liveStats = {};
+        
+        function connectStats() {
+            statsSource = new EventSource('/api/stats/stream');
+            statsSource.addEventListener('stats', event => {
+                liveStats = JSON.parse(event.data);
+                showStats(liveStats);
+            });
+            statsSource.addEventListener('delta', event => {
+                showStats(applyDelta(liveStats, JSON.parse(event.data)));
+            });
+        }
+        
+        function applyDelta(stats, delta) {
+            // Nested objects (Anzahl_pro_Kategorie) only carry their changed keys
+            for (const [key, value] of Object.entries(delta)) {
+                const nested = value && typeof value === 'object' && !Array.isArray(value);
+                stats[key] = nested ? applyDelta(Object.assign({}, stats[key]), value) : value;
+            }
+            return stats;
+        }
+        
         function downloadExcel() {
             window.location.href = '/api/download';
         }
         
-        // Load stats on page load
-        updateStats();
+        // Load stats on page load (polling only without EventSource support)
+        if (window.EventSource) {
+            connectStats();
+        } else {
+            updateStats();
+        }
     </script>
 </body>
 </html>
 '''
 
+@app.before_request
+def start_timing():
+    g.request_started = time.perf_counter()
+    g.span_token = start_request()
+
+@app.after_request
+def finish_timing(response):
+    if 'span_token' not in g:
+        return response
+    spans = finish_request(g.pop('span_token'))
+    elapsed = time.perf_counter() - g.request_started
+    HTTP_SECONDS.observe(elapsed, endpoint=request.endpoint or 'unknown',
+                         method=request.method, status=response.status_code)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(spans, total=elapsed)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Gzip larger JSON/text responses unless the route already encoded them"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in GZIP_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not _accepts_gzip():
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+def _cache_validators(variant=None):
+    """
+    ETag and Last-Modified of the current data; variant (query arguments,
+    encoding) distinguishes representations of the same data
+    """
+    version = get_collector().data_version()
+    etag = version['etag']
+    if variant:
+        etag += '-' + hashlib.blake2b(repr(variant).encode('utf-8'), digest_size=6).hexdigest()
+    return etag, version['last_modified']
+
+def _not_modified(etag, last_modified):
+    """None if the client has to get the resource, otherwise a 304 response"""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = Response(status=304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Cached copies are revalidated on every request (a 304 if nothing changed)
+    response.cache_control.no_cache = True
+
 @app.route('/')
 def healthcheck():
     return {
@@ -280,46 +407,141 @@ def index():
 
 @app.route('/api/add', methods=['POST'])
 def add_data():
-    """API endpoint to add data to Excel"""
+    """
+    API endpoint to add data to Excel
+    Either a JSON envelope {"data": "...", "format": "json|csv"} or, with
+    ?format=json|csv, the raw (optionally chunked) body streamed into the collector.
+    Optional "dedup" (envelope or query): skip, upsert or keep
+    Optional "async" (envelope true or ?async=1): queue the data as a job and
+    answer 202 with its id right away, progress at /api/jobs/<id>
+    """
     try:
-        request_data = request.get_json()
-        data = request_data.get('data')
-        format_type = request_data.get('format', 'json')
+        if 'format' in request.args:
+            # Raw body: parsed incrementally, never held in memory as a whole
+            data = request.stream
+            format_type = request.args['format']
+            dedup = request.args.get('dedup')
+            run_async = request.args.get('async') in ('1', 'true')
+        else:
+            request_data = request.get_json()
+            data = request_data.get('data')
+            format_type = request_data.get('format', 'json')
+            dedup = request_data.get('dedup')
+            run_async = request_data.get('async') is True or request.args.get('async') in ('1', 'true')
         
         if not data:
             return jsonify({'success': False, 'message': 'Keine Daten empfangen'}), 400
         
+        if run_async:
+            job = get_job_queue().submit(data, format=format_type, dedup=dedup)
+            status_url = url_for('get_job', job_id=job['id'])
+            return jsonify({
+                'success': True,
+                'message': 'Auftrag angenommen',
+                'job_id': job['id'],
+                'status_url': status_url
+            }), 202, {'Location': status_url}
+        
         # Add data based on format
         if format_type == 'json':
-            success = collector.add_json_data(data)
+            result = get_collector().add_json_data(data, dedup=dedup)
         elif format_type == 'csv':
-            success = collector.add_csv_data(data)
+            result = get_collector().add_csv_data(data, dedup=dedup)
         else:
             return jsonify({'success': False, 'message': 'Ungültiges Format'}), 400
         
-        if success:
-            return jsonify({
-                'success': True,
-                'message': '✓ Daten erfolgreich zur Excel-Datei hinzugefügt!'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Fehler beim Hinzufügen der Daten'
-            }), 500
+        if result.get('success') is False:
+            # Chunks before the error stay stored: the counts say how many
+            return jsonify(result), 400
+        return jsonify({
+            'success': True,
+            'message': (f"✓ {result['inserted']} Datensätze hinzugefügt, "
+                        f"{result['updated']} aktualisiert, "
+                        f"{result['skipped']} übersprungen"),
+            **result
+        })
             
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Fehler: {str(e)}'}), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Fehler: {str(e)}'
         }), 500
 
+@app.route('/api/bulk', methods=['POST'])
+def bulk_add():
+    """
+    API endpoint for newline-delimited JSON (application/x-ndjson): one record
+    per line, parsed while the body streams in and written in batches
+    Query: dedup (skip, upsert, keep), batch_size (records per commit)
+    Answers the totals plus "rejected": [{"line": n, "error": "..."}] (the
+    first MAX_ERRORS lines, "truncated" if there were more), "rejected_count" -
+    every other non-empty line was accepted
+    """
+    try:
+        result = get_collector().add_ndjson_data(
+            request.stream,
+            dedup=request.args.get('dedup'),
+            batch_size=request.args.get('batch_size', type=int),
+            max_rejected=MAX_ERRORS
+        )
+        return jsonify({
+            'success': True,
+            'message': (f"✓ {result['accepted']} Zeilen angenommen "
+                        f"({result['inserted']} hinzugefügt, {result['updated']} aktualisiert, "
+                        f"{result['skipped']} übersprungen), "
+                        f"{result['rejected_count']} abgelehnt"),
+            **result
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Fehler: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Fehler: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """API endpoint to get the progress, counts and per-record errors of a job"""
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': f'Unbekannter Auftrag: {job_id}'}), 404
+    return jsonify(status)
+
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """API endpoint to get database statistics"""
+    """
+    API endpoint to get database statistics
+    Answers 304 to If-None-Match/If-Modified-Since while the data is unchanged;
+    the serialized (and gzipped) body is reused until the next change
+    """
+    global _stats_cache
     try:
-        summary = collector.get_summary()
-        return jsonify(summary)
+        use_gzip = _accepts_gzip()
+        data_etag, last_modified = _cache_validators()
+        # The gzipped body is a representation of its own
+        etag = data_etag + ('-gz' if use_gzip else '')
+        response = _not_modified(etag, last_modified)
+        if response is not None:
+            response.vary.add('Accept-Encoding')
+            return response
+
+        cached = _stats_cache
+        if cached is None or cached['etag'] != data_etag:
+            # Validators are read before the summary: the body is never older than its ETag
+            body = app.json.dumps(get_collector().get_summary()).encode('utf-8')
+            cached = _stats_cache = {
+                'etag': data_etag,
+                'json': body,
+                'gzip': gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+            }
+
+        response = Response(cached['json'], mimetype='application/json')
+        if use_gzip and cached['gzip'] is not None:
+            response.set_data(cached['gzip'])
+            response.headers['Content-Encoding'] = 'gzip'
+        _set_validators(response, etag, last_modified)
+        response.vary.add('Accept-Encoding')
+        return response
     except Exception as e:
         return jsonify({
             'Gesamtanzahl': 0,
@@ -329,16 +551,165 @@ def get_stats():
             'error': str(e)
         })
 
+@app.route('/api/stats/stream', methods=['GET'])
+def stream_stats():
+    """
+    Server-Sent Events instead of polling /api/stats: an 'stats' event with
+    the full statistics, then a 'delta' event (changed fields only) after
+    every commit and a heartbeat comment every 15 s. Reconnecting clients
+    send Last-Event-ID (or ?since=<id>) and only get the deltas they missed.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    events = get_collector().stats_stream(last_event_id)
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        # No caching, no buffering in reverse proxies (nginx)
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/search', methods=['GET'])
+def search_records():
+    """
+    API endpoint for fuzzy search over Modellbezeichnung, Produktfamilie and
+    Hersteller, ranked by trigram similarity (spelling, spaces and hyphens
+    do not matter): ?q=Galaxy VS 100 kVA
+    Optional: limit (max 200), min_score (0..1, default 0.3),
+    in=Modellbezeichnung,... (searched columns), fields=... (returned columns)
+    """
+    try:
+        args = request.args
+        columns = args.get('in')
+        fields = args.get('fields')
+        result = get_collector().search(
+            args.get('q', ''),
+            limit=min(max(args.get('limit', 20, type=int), 1), 200),
+            min_score=args.get('min_score', MIN_SCORE, type=float),
+            columns=columns.split(',') if columns else None,
+            fields=fields.split(',') if fields else None
+        )
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """
+    API endpoint for PUE aggregates per Produktkategorie and Hersteller:
+    counts, efficiency and COP/EER (mean/min/max), part-load curve and total
+    electrical input power, maintained incrementally on every insert
+    Query: by=Produktkategorie|Hersteller (default: both)
+    Answers 304 while the data is unchanged, like /api/stats
+    """
+    try:
+        by = request.args.get('by')
+        # The gzipped body is a representation of its own
+        etag, last_modified = _cache_validators((by, _accepts_gzip()))
+        response = _not_modified(etag, last_modified)
+        if response is not None:
+            response.vary.add('Accept-Encoding')
+            return response
+        response = jsonify(get_collector().get_analytics(by))
+        _set_validators(response, etag, last_modified)
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/records', methods=['GET'])
+def get_records():
+    """
+    API endpoint to query devices without downloading the workbook
+    ?Hersteller=&Produktkategorie=&Produktfamilie= exact matches,
+    ?Modellbezeichnung= text match, ?von=&bis= Zeitstempel range,
+    ?offset=&limit= pagination, ?fields=Hersteller,Modellbezeichnung projection
+    """
+    try:
+        args = request.args
+        filters = {column: args[column] for column in RECORD_FILTERS if column in args}
+        fields = args.get('fields')
+        result = get_collector().query_records(
+            filters=filters,
+            time_from=args.get('von'),
+            time_to=args.get('bis'),
+            text=args.get('Modellbezeichnung'),
+            offset=max(args.get('offset', 0, type=int), 0),
+            limit=min(max(args.get('limit', 100, type=int), 0), 1000),
+            fields=fields.split(',') if fields else None
+        )
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/writer/metrics', methods=['GET'])
+def get_writer_metrics():
+    """API endpoint to get queue depth and commit latency of the writer"""
+    return jsonify(get_collector().get_write_metrics())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics: phase/request histograms, ingest counters, storage gauges"""
+    get_collector().collect_metrics()
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/debug/startup', methods=['GET'])
+def get_startup_report():
+    """API endpoint to get the cold-start breakdown (imports, collector init)"""
+    return jsonify(startup_timer.report())
+
 @app.route('/api/download', methods=['GET'])
 def download_excel():
-    """API endpoint to download the Excel file"""
+    """
+    API endpoint to download the Excel file
+    Query parameters filter by column (e.g. ?Hersteller=Eaton&Produktkategorie=USV);
+    filtered exports are streamed row by row instead of building a workbook.
+    With the sharded backend ?shard=2026-02 returns a single shard, otherwise
+    all shards are stitched into one streamed workbook.
+    Unchanged data is answered with 304 (ETag/Last-Modified); complete files
+    also support Range requests, e.g. to resume an interrupted download.
+    """
+    download_name = f'PUE_Datenbank_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
     try:
-        return send_file(
-            collector.excel_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'PUE_Datenbank_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        collector = get_collector()
+        filters = request.args.to_dict()
+        shard = filters.pop('shard', None)
+        complete = shard is not None or (not filters and collector.backend != 'sharded')
+        # Exporting folds the journal into the workbook, which changes the store's
+        # signature: done first, so the validators describe the file that is sent
+        # (a no-op while nothing changed)
+        export_path = collector.export_excel(shard=shard) if complete else None
+        etag, last_modified = _cache_validators(sorted(request.args.items()))
+        response = _not_modified(etag, last_modified)
+        if response is not None:
+            return response
+
+        if complete:
+            # Flask resolves relative paths against the app folder, not the working directory
+            return send_file(
+                os.path.abspath(export_path),
+                mimetype=XLSX_MIMETYPE,
+                as_attachment=True,
+                download_name=(f'PUE_Datenbank_{shard}.xlsx' if shard else download_name),
+                etag=etag,
+                last_modified=last_modified
+            )
+
+        chunks = collector.stream_excel(filters)
+        response = Response(
+            stream_with_context(chunks),
+            mimetype=XLSX_MIMETYPE,
+            headers={'Content-Disposition': f'attachment; filename={download_name}',
+                     'Accept-Ranges': 'none'}
         )
+        _set_validators(response, etag, last_modified)
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -351,7 +722,16 @@ if __name__ == '__main__':
     print()
     print("API Endpoints:")
     print("  POST /api/add     - Daten hinzufügen")
+    print("  POST /api/bulk    - NDJSON-Massenimport (eine Zeile pro Datensatz)")
     print("  GET  /api/stats   - Statistiken abrufen")
+    print("  GET  /api/stats/stream - Statistiken live (Server-Sent Events)")
+    print("  GET  /api/jobs/<id> - Status eines asynchronen Auftrags")
     print("  GET  /api/download - Excel herunterladen")
+    print("  GET  /api/records - Datensätze abfragen")
+    print("  GET  /api/search?q= - Unscharfe Suche (Modell, Familie, Hersteller)")
+    print("  GET  /api/analytics - PUE-Kennzahlen je Kategorie/Hersteller")
+    print("  GET  /api/writer/metrics - Schreib-Metriken abrufen")
+    print("  GET  /api/debug/startup - Startzeiten abrufen")
+    print("  GET  /metrics     - Prometheus-Metriken")
     print("="*60)
     app.run(debug=True, host='0.0.0.0', port=5000)
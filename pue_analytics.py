@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Materialized PUE analytics for the PUE Data Collector
+Per-Produktkategorie and per-Hersteller aggregates of the normalized values
+(efficiency, part-load curve, electrical input power), folded in batch by
+batch so a query costs O(#groups) instead of O(#rows)
+"""
+
+import numpy as np
+
+from pue_normalize import KEY_COLUMNS
+
+
+# Normalized column -> name in the analytics output
+METRICS = {
+    'Wirkungsgrad': 'Wirkungsgrad',
+    'COP_EER_IPLV_Wert': 'COP_EER_IPLV',
+    'Aufnahmeleistung_kW': 'Aufnahmeleistung_kW',
+    'Teillast_25': '25%',
+    'Teillast_50': '50%',
+    'Teillast_75': '75%',
+    'Teillast_100': '100%',
+}
+PART_LOAD = ('Teillast_25', 'Teillast_50', 'Teillast_75', 'Teillast_100')
+
+_COLUMNS = list(METRICS)
+_POWER = _COLUMNS.index('Aufnahmeleistung_kW')
+
+
+class _Group:
+    """Row count and per metric: values present, sum, min, max (NumPy vectors)"""
+
+    __slots__ = ('rows', 'count', 'sum', 'min', 'max', 'stale')
+
+    def __init__(self):
+        self.rows = 0
+        self.count = np.zeros(len(_COLUMNS), dtype=np.int64)
+        self.sum = np.zeros(len(_COLUMNS))
+        self.min = np.full(len(_COLUMNS), np.nan)
+        self.max = np.full(len(_COLUMNS), np.nan)
+        # min/max may be outdated after a row was taken out (recomputed on read)
+        self.stale = False
+
+
+class AnalyticsAggregate:
+    """
+    View over a NumericColumns view that it keeps up to date itself: rows are
+    added to the columns first and then folded into the groups, replaced rows
+    are taken out with their old values before the columns change. Counts and
+    sums are updated in place; a group whose minimum or maximum was replaced
+    recomputes both from the columns the next time it is read.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._fold_all()
+
+    def reset(self, rows):
+        self.columns.reset(rows)
+        self._fold_all()
+
+    def add_rows(self, rows):
+        if not rows:
+            return
+        start = self.columns.size
+        self.columns.add_rows(rows)
+        self._fold(self._batch(slice(start, self.columns.size)), 1)
+
+    def replace_rows(self, replacements):
+        if not replacements:
+            return
+        positions = [position for position, _ in replacements]
+        self._fold(self._batch(positions), -1)
+        self.columns.replace_rows(replacements)
+        self._fold(self._batch(positions), 1)
+
+    def remove_rows(self, positions):
+        if not positions:
+            return
+        self._fold(self._batch(list(positions)), -1)
+        self.columns.remove_rows(positions)
+
+    def summary(self, by=None):
+        """
+        {grouping: {group: aggregates}} for Produktkategorie and Hersteller
+        by: Only one of the two groupings
+        """
+        groupings = KEY_COLUMNS if by is None else (by,)
+        for grouping in groupings:
+            if grouping not in KEY_COLUMNS:
+                raise ValueError(f"Ungültige Gruppierung: {grouping}")
+        return {
+            grouping: {
+                str(key): self._describe(grouping, key, group)
+                for key, group in sorted(self._groups[grouping].items(),
+                                         key=lambda item: str(item[0]))
+            }
+            for grouping in groupings
+        }
+
+    def _fold_all(self):
+        self._groups = {grouping: {} for grouping in KEY_COLUMNS}
+        self._fold(self._batch(slice(0, self.columns.size)), 1)
+
+    def _batch(self, positions):
+        """(values[rows, metrics], {grouping: keys}) of the given row positions"""
+        values = np.column_stack([self.columns.arrays[column][positions] for column in _COLUMNS])
+        if isinstance(positions, slice):
+            keys = {grouping: self.columns.keys[grouping][positions] for grouping in KEY_COLUMNS}
+        else:
+            keys = {grouping: [self.columns.keys[grouping][position] for position in positions]
+                    for grouping in KEY_COLUMNS}
+        return values, keys
+
+    def _fold(self, batch, sign):
+        """Add (sign 1) or take out (sign -1) a batch of rows, vectorized over all its groups"""
+        values, keys = batch
+        if not len(values):
+            return
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        for grouping, column in keys.items():
+            groups = self._groups[grouping]
+            codes, members = _group_codes(column)
+            size = len(members)
+            rows = np.bincount(codes, minlength=size)
+            counts = np.stack([np.bincount(codes, weights=present[:, index], minlength=size)
+                               for index in range(len(_COLUMNS))], axis=1).astype(np.int64)
+            sums = np.stack([np.bincount(codes, weights=filled[:, index], minlength=size)
+                             for index in range(len(_COLUMNS))], axis=1)
+            # fmin/fmax ignore NaN
+            low = np.full((size, len(_COLUMNS)), np.nan)
+            high = np.full((size, len(_COLUMNS)), np.nan)
+            np.fmin.at(low, codes, values)
+            np.fmax.at(high, codes, values)
+
+            for code, key in enumerate(members):
+                if key is None:
+                    continue
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = _Group()
+                group.rows += sign * int(rows[code])
+                group.count += sign * counts[code]
+                group.sum += sign * sums[code]
+                if sign > 0:
+                    group.min = np.fmin(group.min, low[code])
+                    group.max = np.fmax(group.max, high[code])
+                elif np.any(low[code] <= group.min) or np.any(high[code] >= group.max):
+                    # Taking out an extreme value leaves min/max unknown
+                    group.stale = True
+                if group.rows <= 0:
+                    del groups[key]
+
+    def _refresh_extremes(self, grouping, key, group):
+        """Recompute min/max of a group from the columns - O(#rows), after upserts only"""
+        column = self.columns.keys[grouping]
+        positions = [position for position, value in enumerate(column) if value == key]
+        values = np.column_stack([self.columns.arrays[name][positions] for name in _COLUMNS])
+        group.min = _nan_reduce(np.nanmin, values)
+        group.max = _nan_reduce(np.nanmax, values)
+        group.stale = False
+
+    def _describe(self, grouping, key, group):
+        if group.stale:
+            self._refresh_extremes(grouping, key, group)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = group.sum / group.count
+
+        def stats(index):
+            if not group.count[index]:
+                return {'Anzahl': 0, 'Mittel': None, 'Min': None, 'Max': None}
+            return {
+                'Anzahl': int(group.count[index]),
+                'Mittel': float(mean[index]),
+                'Min': float(group.min[index]),
+                'Max': float(group.max[index])
+            }
+
+        return {
+            'Anzahl': group.rows,
+            'Wirkungsgrad': stats(_COLUMNS.index('Wirkungsgrad')),
+            'COP_EER_IPLV': stats(_COLUMNS.index('COP_EER_IPLV_Wert')),
+            'Teillastkurve': {
+                METRICS[column]: (float(mean[_COLUMNS.index(column)])
+                                  if group.count[_COLUMNS.index(column)] else None)
+                for column in PART_LOAD
+            },
+            'Aufnahmeleistung_kW_gesamt': float(group.sum[_POWER]) if group.count[_POWER] else 0.0,
+            'Aufnahmeleistung_Anzahl': int(group.count[_POWER])
+        }
+
+
+def _group_codes(keys):
+    """Integer code per row and the distinct keys in order of appearance"""
+    index = {}
+    codes = np.fromiter((index.setdefault(key, len(index)) for key in keys),
+                        dtype=np.int64, count=len(keys))
+    return codes, list(index)
+
+
+def _nan_reduce(function, values):
+    """Column-wise nanmin/nanmax; all-NaN columns stay NaN without a warning"""
+    result = np.full(values.shape[1], np.nan)
+    present = ~np.isnan(values).all(axis=0)
+    if present.any():
+        result[present] = function(values[:, present], axis=0)
+    return result
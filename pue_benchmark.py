@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the PUE Data Collector
+Builds synthetic Geräte databases (default 1k/10k/100k rows) and measures
+ingest latency and throughput, stats latency, downloads and peak RSS
+through the Flask test client, plus record mapping throughput. Writes a
+JSON report that can be compared across commits.
+
+Usage:
+  python pue_benchmark.py [--sizes 1000 10000 100000] [--backend excel|sqlite|sharded]
+                          [--output benchmark.json] [--compare old.json]
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+MANUFACTURERS = ['Schneider Electric', 'Eaton', 'Vertiv', 'Riello', 'Socomec', 'ABB',
+                 'Rittal', 'Stulz', 'Siemens', 'Legrand', 'Huawei', 'Delta']
+CATEGORIES = {
+    'USV': ('kVA', (10, 1200)),
+    'PDU': ('kVA', (5, 60)),
+    'Kältemaschine': ('kW', (50, 2000)),
+    'Klimagerät': ('kW', (10, 250)),
+    'Transformator': ('kVA', (250, 4000)),
+    'Rückkühler': ('kW', (100, 1500)),
+}
+
+# Metrics where a lower value is better (everything else: higher is better)
+_LOWER_IS_BETTER = ('_ms', '_mb', '_bytes')
+
+
+def make_record(i, rng, run_id=''):
+    """One synthetic GPT extraction matching the Geräte schema"""
+    manufacturer = rng.choice(MANUFACTURERS)
+    category = rng.choice(list(CATEGORIES))
+    unit, (low, high) = CATEGORIES[category]
+    rating = rng.randint(low, high)
+    efficiency = rng.uniform(93.0, 98.5)
+    cooling = category in ('Kältemaschine', 'Klimagerät', 'Rückkühler')
+    return {
+        'Hersteller': manufacturer,
+        'Produktkategorie': category,
+        'Produktfamilie': f'{manufacturer.split()[0]} {category} {rng.randint(1, 9)}',
+        'Modellbezeichnung': f'{category}-{rating}{unit}-{run_id}{i}',
+        'Nennleistung': f'{rating} {unit}',
+        'Kühlleistung': f'{rating} kW' if cooling else None,
+        'Elektrische Aufnahmeleistung': f'{round(rating * rng.uniform(0.25, 1.05), 1)} kW',
+        'Wirkungsgrad_oder_Verlustleistung': f'{efficiency:.1f}%',
+        'COP_EER_IPLV': f'{rng.uniform(2.5, 6.5):.2f}' if cooling else None,
+        'Teillastdaten': {
+            load: f'{min(efficiency + rng.uniform(-1.5, 0.8), 99.0):.1f}%'
+            for load in ('25%', '50%', '75%', '100%')
+        },
+        'Betriebsbedingungen': f'{rng.choice((20, 25, 30, 35))}°C',
+        'Quelle': {
+            'Dateiname': f'{manufacturer.split()[0].lower()}_{i}.pdf',
+            'Seitenzahl': str(rng.randint(1, 40)),
+            'Zitat': f'Efficiency at 50% load: {efficiency:.1f}%'
+        },
+        'Fehlende_Angaben': [] if cooling else ['COP_EER_IPLV', 'Kühlleistung'],
+        'Verarbeitungsfehler': None
+    }
+
+
+def _flat_record(record):
+    """CSV/flat form of a record (nested Teillastdaten/Quelle dropped)"""
+    return {key: value for key, value in record.items() if not isinstance(value, (dict, list))}
+
+
+def _legacy_record_to_row(record, timestamp):
+    """Per-field dict.get mapping used before the compiled schema (baseline)"""
+    teillast = record.get('Teillastdaten', {}) or {}
+    quelle = record.get('Quelle', {}) or {}
+    fehlende = record.get('Fehlende_Angaben', [])
+    if isinstance(fehlende, str):
+        fehlende_str = fehlende
+    else:
+        fehlende_str = ', '.join(fehlende) if fehlende else ''
+    return [
+        record.get('Hersteller'), record.get('Produktkategorie'),
+        record.get('Produktfamilie'), record.get('Modellbezeichnung'),
+        record.get('Nennleistung'), record.get('Kühlleistung'),
+        record.get('Elektrische Aufnahmeleistung'),
+        record.get('Wirkungsgrad_oder_Verlustleistung'), record.get('COP_EER_IPLV'),
+        teillast.get('25%'), teillast.get('50%'), teillast.get('75%'), teillast.get('100%'),
+        record.get('Betriebsbedingungen'),
+        quelle.get('Dateiname'), quelle.get('Seitenzahl'), quelle.get('Zitat'),
+        fehlende_str, record.get('Verarbeitungsfehler'), timestamp
+    ]
+
+
+def run_mapping(count, rng, repeat=9):
+    """Records/s of the legacy mapping loop and the compiled schema mapper (best of repeat)"""
+    from pue_schema import map_record
+
+    records = [make_record(i, rng, run_id='map-') for i in range(count)]
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    mappers = {'mapping_legacy': _legacy_record_to_row, 'mapping_schema': map_record}
+    best = dict.fromkeys(mappers, float('inf'))
+    # Rounds alternate between the mappers, so a drifting machine speed hits both alike
+    for _ in range(repeat):
+        for name, mapper in mappers.items():
+            _, elapsed = _timed(lambda: [mapper(record, timestamp) for record in records])
+            best[name] = min(best[name], elapsed)
+    return {f'{name}_records_per_s': count / (elapsed / 1000) for name, elapsed in best.items()}
+
+
+def run_memory(count, rng):
+    """
+    Resident size (MB) of the device table held as a list of dicts, as a
+    DataFrame of object columns and as the CompactTable, each built from
+    rows freshly loaded from a columnar snapshot (one object per cell)
+    """
+    import gc
+    import pandas as pd
+    from pue_columnar import ColumnarSnapshot
+    from pue_data_collector import PUEDataCollector
+    from pue_storage import HEADERS
+    from pue_table import CompactTable
+
+    def compact(rows):
+        table = CompactTable()
+        for row in table.intern(rows):
+            table.append(row)
+        return table
+
+    builders = {
+        'table_dicts_mb': lambda rows: [dict(zip(HEADERS, row)) for row in rows],
+        'table_frame_mb': lambda rows: pd.DataFrame(rows, columns=HEADERS, dtype=object),
+        'table_compact_mb': compact,
+    }
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    snapshot = ColumnarSnapshot(tempfile.mkdtemp(prefix='pue-mem-'), len(HEADERS))
+    try:
+        snapshot.write([PUEDataCollector._record_to_row(make_record(i, rng), timestamp)
+                        for i in range(count)], 'memory')
+        metrics = {}
+        for name, build in builders.items():
+            gc.collect()
+            tracemalloc.start()
+            rows = snapshot.load('memory')
+            table = build(rows)
+            del rows
+            gc.collect()
+            metrics[name] = tracemalloc.get_traced_memory()[0] / 1e6
+            tracemalloc.stop()
+            del table
+        return metrics
+    finally:
+        shutil.rmtree(snapshot.directory, ignore_errors=True)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _prefill(excel_file, size, rng):
+    """Write a workbook with size synthetic rows, as if ingested over a year"""
+    from pue_data_collector import PUEDataCollector
+    from pue_export import write_xlsx
+    from pue_storage import COLUMN_WIDTHS, HEADERS
+
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(size, 1)
+    rows = (
+        PUEDataCollector._record_to_row(
+            make_record(i, rng), (start + step * i).strftime('%Y-%m-%d %H:%M:%S')
+        )
+        for i in range(size)
+    )
+    write_xlsx(excel_file, rows, 'Geräte', HEADERS, COLUMN_WIDTHS)
+
+
+def run_size(size, inserts=50, batch_size=1000, stats_calls=50):
+    """
+    Benchmark one database size in the current process (expects a fresh
+    interpreter and an empty working directory). Returns a metrics dict.
+    """
+    rng = random.Random(size)
+    _prefill('PUE_Datenbank.xlsx', size, rng)
+    metrics = {'rows_prefilled': size}
+
+    app_module, metrics['import_app_ms'] = _timed(lambda: __import__('app'))
+    client = app_module.app.test_client()
+
+    # First stats request pays for reading the database into memory
+    _, metrics['stats_cold_ms'] = _timed(lambda: client.get('/api/stats'))
+    latencies = [_timed(lambda: client.get('/api/stats'))[1] for _ in range(stats_calls)]
+    metrics['stats_p50_ms'] = _percentile(latencies, 0.5)
+    metrics['stats_p95_ms'] = _percentile(latencies, 0.95)
+
+    # Single-record inserts, as sent by the GPT action one device at a time
+    latencies = []
+    for i in range(inserts):
+        body = {'data': json.dumps([make_record(i, rng, run_id='single-')]), 'format': 'json'}
+        response, elapsed = _timed(lambda: client.post('/api/add', json=body))
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/add fehlgeschlagen: {response.get_json()}")
+        latencies.append(elapsed)
+    metrics['insert_p50_ms'] = _percentile(latencies, 0.5)
+    metrics['insert_p95_ms'] = _percentile(latencies, 0.95)
+    metrics['insert_max_ms'] = max(latencies)
+
+    # Batch ingest through the streaming raw-body path
+    records = [make_record(i, rng, run_id='json-') for i in range(batch_size)]
+    payload = json.dumps(records).encode('utf-8')
+    _, elapsed = _timed(lambda: client.post('/api/add?format=json', data=payload))
+    metrics['json_batch_ms'] = elapsed
+    metrics['json_batch_records_per_s'] = batch_size / (elapsed / 1000)
+    metrics['json_batch_bytes'] = len(payload)
+
+    # Same batch as NDJSON: no envelope, parsed line by line
+    records = [make_record(i, rng, run_id='ndjson-') for i in range(batch_size)]
+    payload = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+    _, elapsed = _timed(lambda: client.post('/api/bulk', data=payload,
+                                            content_type='application/x-ndjson'))
+    metrics['ndjson_batch_ms'] = elapsed
+    metrics['ndjson_batch_records_per_s'] = batch_size / (elapsed / 1000)
+
+    buffer = io.StringIO()
+    flat = [_flat_record(make_record(i, rng, run_id='csv-')) for i in range(batch_size)]
+    writer = csv.DictWriter(buffer, fieldnames=list(flat[0]))
+    writer.writeheader()
+    writer.writerows(flat)
+    payload = buffer.getvalue().encode('utf-8')
+    _, elapsed = _timed(lambda: client.post('/api/add?format=csv', data=payload))
+    metrics['csv_batch_ms'] = elapsed
+    metrics['csv_batch_records_per_s'] = batch_size / (elapsed / 1000)
+
+    # First analytics request normalizes every row once, later ones read the aggregates
+    _, metrics['analytics_cold_ms'] = _timed(lambda: client.get('/api/analytics'))
+    latencies = [_timed(lambda: client.get('/api/analytics'))[1] for _ in range(stats_calls)]
+    metrics['analytics_p50_ms'] = _percentile(latencies, 0.5)
+    single = {'data': json.dumps([make_record(0, rng, run_id='analytics-')]), 'format': 'json'}
+    _, metrics['insert_with_analytics_ms'] = _timed(lambda: client.post('/api/add', json=single))
+
+    # Timed until the last byte: filtered downloads are streamed
+    body, metrics['download_ms'] = _timed(lambda: client.get('/api/download').data)
+    metrics['download_bytes'] = len(body)
+    body, metrics['download_filtered_ms'] = _timed(
+        lambda: client.get('/api/download', query_string={'Hersteller': 'Eaton'}).data
+    )
+    metrics['download_filtered_bytes'] = len(body)
+
+    metrics['rows_final'] = client.get('/api/stats').get_json()['Gesamtanzahl']
+    _, metrics['close_ms'] = _timed(lambda: app_module.get_collector().close())
+
+    metrics['upload_data_ms'], metrics['upload_data_warm_ms'] = _run_upload_data(size, rng)
+    metrics.update(run_mapping(size, rng))
+    metrics.update(run_memory(size, rng))
+    metrics['peak_rss_mb'] = _peak_rss_mb()
+    return metrics
+
+
+def _run_upload_data(size, rng, batch_size=100):
+    """Time api/index.py's /upload against a database of the same size"""
+    upload_dir = Path('upload')
+    upload_dir.mkdir()
+    os.chdir(upload_dir)
+    try:
+        _prefill('PUE_Datenbank.xlsx', size, rng)
+        spec = importlib.util.spec_from_file_location('pue_api_index', REPO_DIR / 'api' / 'index.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        client = module.app.test_client()
+        timings = []
+        # The first upload also builds the columnar snapshot of the workbook
+        for run in range(2):
+            records = [_flat_record(make_record(i, rng, run_id=f'upload{run}-'))
+                       for i in range(batch_size)]
+            response, elapsed = _timed(lambda: client.post('/upload', json=records))
+            if response.status_code != 200:
+                raise RuntimeError(f"/upload fehlgeschlagen: {response.get_json()}")
+            timings.append(elapsed)
+        module.get_collector().close()
+        return timings
+    finally:
+        os.chdir('..')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, backend='excel', **options):
+    """
+    Run every size in its own interpreter (clean imports, caches and peak RSS)
+    Returns the report dict
+    """
+    report = {
+        'meta': {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': _git_commit(),
+            'backend': backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': options
+        },
+        'results': {}
+    }
+    for size in sizes:
+        print(f"→ {size} Zeilen ({backend}) ...", flush=True)
+        workdir = tempfile.mkdtemp(prefix='pue-bench-')
+        result_file = os.path.join(workdir, 'result.json')
+        command = [sys.executable, str(Path(__file__).resolve()), '--single', str(size),
+                   '--result-file', result_file]
+        for name, value in options.items():
+            command += [f"--{name.replace('_', '-')}", str(value)]
+        env = dict(os.environ, PUE_BACKEND=backend,
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_DIR), os.environ.get('PYTHONPATH')])))
+        try:
+            # Collector progress messages are not part of the report
+            subprocess.run(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, check=True)
+            with open(result_file, encoding='utf-8') as f:
+                report['results'][str(size)] = json.load(f)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare_reports(old, new):
+    """Print relative changes of every metric present in both reports"""
+    print(f"\n=== Vergleich {old['meta'].get('commit')} → {new['meta'].get('commit')} ===")
+    for size, metrics in new['results'].items():
+        previous = old['results'].get(size)
+        if not previous:
+            continue
+        print(f"\n{size} Zeilen:")
+        for name, value in metrics.items():
+            before = previous.get(name)
+            if not isinstance(value, (int, float)) or not before:
+                continue
+            change = (value - before) / before * 100
+            worse = change > 0 if name.endswith(_LOWER_IS_BETTER) else change < 0
+            marker = '✗' if worse and abs(change) >= 10 else ' '
+            print(f"  {marker} {name}: {before:.2f} → {value:.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PUE Datenbank Benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--backend', choices=('excel', 'sqlite', 'sharded'), default='excel')
+    parser.add_argument('--inserts', type=int, default=50, help='Einzel-Inserts pro Größe')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Datensätze pro Batch-Upload')
+    parser.add_argument('--stats-calls', type=int, default=50, help='/api/stats-Aufrufe pro Größe')
+    parser.add_argument('--output', default='benchmark.json', help='JSON-Report')
+    parser.add_argument('--compare', help='Früherer JSON-Report zum Vergleich')
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    options = {'inserts': args.inserts, 'batch_size': args.batch_size,
+               'stats_calls': args.stats_calls}
+
+    if args.single is not None:
+        # Child process started by run_benchmark()
+        metrics = run_size(args.single, **options)
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f)
+        return
+
+    report = run_benchmark(args.sizes, args.backend, **options)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✓ Report gespeichert: {args.output}")
+
+    for size, metrics in report['results'].items():
+        print(f"\n{size} Zeilen:")
+        for name, value in metrics.items():
+            print(f"  {name}: {value:.2f}" if isinstance(value, float) else f"  {name}: {value}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
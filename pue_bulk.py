@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Bulk import for the PUE Data Collector
+Parses and maps folders of GPT JSON/CSV outputs in a process pool; the
+calling process stays the single writer and commits in large batches
+
+Usage: python pue_bulk.py <ordner_oder_dateien...> [--workers N] [--batch-size N]
+                          [--dedup skip|upsert|keep] [--excel PUE_Datenbank.xlsx]
+                          [--backend excel|sharded|sqlite]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from pue_schema import map_record
+from pue_stream import iter_csv_records, iter_json_records
+
+
+BULK_SUFFIXES = ('.json', '.csv')
+
+# Files parsed ahead of the writer per worker (bounds memory held in results)
+_AHEAD_PER_WORKER = 2
+
+
+def find_files(sources):
+    """Expand files and folders (recursively) into a sorted list of JSON/CSV files"""
+    files = []
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            files.extend(p for p in path.rglob('*')
+                         if p.is_file() and p.suffix.lower() in BULK_SUFFIXES)
+        elif path.is_file():
+            files.append(path)
+        else:
+            raise ValueError(f"Datei oder Ordner nicht gefunden: {source}")
+    return sorted(set(files))
+
+
+def parse_file(path, timestamp):
+    """
+    Parse, validate and map one file to worksheet rows (runs in a worker process)
+    Returns {'file', 'rows', 'records', 'errors': [{'record', 'error'}], 'error'}
+    where 'error' is set if the file could not be parsed to the end
+    """
+    result = {'file': str(path), 'rows': [], 'records': 0, 'errors': [], 'error': None}
+    try:
+        with open(path, 'rb') as f:
+            if Path(path).suffix.lower() == '.csv':
+                records = iter_csv_records(f)
+            else:
+                records = iter_json_records(f)
+            for index, record in enumerate(records):
+                result['records'] += 1
+                try:
+                    result['rows'].append(map_record(record, timestamp))
+                except Exception as e:
+                    result['errors'].append({'record': index, 'error': str(e)})
+    except Exception as e:
+        # Rows mapped before the error are still returned
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def iter_parsed_files(paths, timestamp, workers=None):
+    """
+    Yield parse_file() results as workers finish them
+    workers: Number of processes (default: all cores, 1 = parse in this process)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for path in paths:
+            yield parse_file(path, timestamp)
+        return
+
+    pending = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = set()
+        while True:
+            # Keep a bounded number of files in flight
+            while len(running) < workers * _AHEAD_PER_WORKER:
+                path = next(pending, None)
+                if path is None:
+                    break
+                running.add(executor.submit(parse_file, path, timestamp))
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PUE Datenbank Massenimport')
+    parser.add_argument('sources', nargs='+', help='JSON/CSV-Dateien oder Ordner')
+    parser.add_argument('--workers', type=int, default=None, help='Prozesse (Standard: alle Kerne)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Zeilen pro Speichervorgang')
+    parser.add_argument('--dedup', choices=('skip', 'upsert', 'keep'), default='skip')
+    parser.add_argument('--excel', default='PUE_Datenbank.xlsx')
+    parser.add_argument('--backend', choices=('excel', 'sharded', 'sqlite'), default='excel')
+    args = parser.parse_args()
+
+    from pue_data_collector import PUEDataCollector
+
+    collector = PUEDataCollector(args.excel, backend=args.backend)
+    try:
+        summary = collector.bulk_import(args.sources, workers=args.workers,
+                                        batch_size=args.batch_size, dedup=args.dedup)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    finally:
+        collector.close()
+    if summary['failed_files']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot of the stored rows for the PUE Data Collector
+A sidecar directory next to the workbook holding every row in a binary,
+column-by-column layout that is memory-mapped on load, so a cold start or
+a reload after another process wrote does not parse XML-in-zip again
+"""
+
+import json
+import mmap
+import struct
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+from pue_locking import atomic_write
+
+
+_MAGIC = b'PUECOL1\n'
+
+# Cell kinds; texts of the other kinds are converted on load
+_NONE, _STR, _INT, _FLOAT, _BOOL, _DATETIME = range(6)
+_MISSING = 255  # Row shorter than the header (trailing cells absent)
+_ABSENT = object()  # Placeholder of such cells while decoding
+
+# Tail segments merged into one once there are this many
+MERGE_SEGMENTS = 16
+
+
+def _encode_cell(value):
+    cls = value.__class__
+    if cls is str:
+        return _STR, value
+    if value is None:
+        return _NONE, ''
+    if cls is bool:
+        return _BOOL, '1' if value else ''
+    if cls is int:
+        return _INT, str(value)
+    if cls is float:
+        return _FLOAT, repr(value)
+    if isinstance(value, datetime):
+        return _DATETIME, value.isoformat()
+    return _STR, str(value)
+
+
+_DECODERS = {
+    _NONE: lambda text: None,
+    _INT: int,
+    _FLOAT: float,
+    _BOOL: bool,
+    _DATETIME: datetime.fromisoformat,
+}
+
+
+class ColumnarSnapshot:
+    """
+    Chain of immutable segment files, each holding a batch of (position, row)
+    entries column by column: position -1 appends the row, any other value
+    replaces the row stored there. Every segment records the storage
+    signature before and after its change; load(key) only returns rows if
+    the chain is unbroken and ends at key, so any write that bypassed the
+    snapshot (another tool, a crash between journal and snapshot) simply
+    makes it stale until write() rebuilds it.
+    Callers serialize writes (see ExcelStore.file_lock).
+    """
+
+    def __init__(self, directory, column_count):
+        self.directory = Path(directory)
+        self.column_count = column_count
+
+    def load(self, key):
+        """All rows (lists) if the snapshot is current for key, else None"""
+        chain = self._chain()
+        if chain is None or chain[-1][1]['after'] != _key(key):
+            return None
+        rows = []
+        for path, header in chain:
+            _apply(rows, self._read_segment(path, header))
+        return rows
+
+    def write(self, rows, key):
+        """Replace the snapshot with rows, current for key"""
+        self.directory.mkdir(exist_ok=True)
+        old = sorted(self.directory.glob('*.seg'))
+        sequence = int(old[-1].stem) + 1 if old else 0
+        self._write_segment(sequence, [-1] * len(rows), rows, None, _key(key), len(rows))
+        for path in old:
+            path.unlink(missing_ok=True)
+
+    def append(self, rows, before, after):
+        """Record appended rows, if the snapshot was current for before"""
+        self._add([-1] * len(rows), rows, before, after)
+
+    def replace(self, replacements, before, after):
+        """Record (position, row) replacements, if the snapshot was current for before"""
+        self._add([position for position, _ in replacements],
+                  [row for _, row in replacements], before, after)
+
+    def rekey(self, before, after):
+        """The storage changed on disk but not in content (e.g. after a compaction)"""
+        self._add([], [], before, after)
+
+    def _add(self, positions, rows, before, after):
+        chain = self._chain()
+        if chain is None or chain[-1][1]['after'] != _key(before):
+            return
+        last_path, last = chain[-1]
+        count = last['count'] + sum(1 for position in positions if position < 0)
+        self._write_segment(int(last_path.stem) + 1, positions, rows,
+                            last['after'], _key(after), count)
+        if len(chain) >= MERGE_SEGMENTS:
+            self._merge(self._chain())
+
+    def _merge(self, chain):
+        """
+        Fold the tail segments into one, or the whole chain into a new base
+        once the tail holds as many rows as the base: every row is decoded
+        O(log n) times over the lifetime of the snapshot
+        """
+        base_path, base = chain[0]
+        tail = chain[1:]
+        if not tail:
+            return
+        if sum(header['rows'] for _, header in tail) >= base['rows']:
+            rows = []
+            for path, header in chain:
+                _apply(rows, self._read_segment(path, header))
+            positions, merged = [-1] * len(rows), rows
+            first = base
+        else:
+            # Appends of the tail and replacements of rows before it
+            start = base['count']
+            appended = []
+            replaced = {}
+            for path, header in tail:
+                for position, row in self._read_segment(path, header):
+                    if position < 0:
+                        appended.append(row)
+                    elif position >= start:
+                        appended[position - start] = row
+                    else:
+                        replaced[position] = row
+            positions = list(replaced) + [-1] * len(appended)
+            merged = list(replaced.values()) + appended
+            first = tail[0][1]
+        self._write_segment(int(chain[-1][0].stem) + 1, positions, merged,
+                            first['before'], chain[-1][1]['after'], chain[-1][1]['count'])
+        # Drop the segments folded into the new one
+        for path, _ in (chain if first is base else tail):
+            path.unlink(missing_ok=True)
+
+    def _chain(self):
+        """[(path, header)] from the last base segment on, None if broken or empty"""
+        if not self.directory.is_dir():
+            return None
+        chain = []
+        for path in sorted(self.directory.glob('*.seg'), reverse=True):
+            header = _read_header(path)
+            if header is None:
+                return None
+            chain.append((path, header))
+            if header['before'] is None:
+                break
+        else:
+            return None
+        chain.reverse()
+        for (_, previous), (_, header) in zip(chain, chain[1:]):
+            if header['before'] != previous['after']:
+                return None
+        return chain
+
+    def _write_segment(self, sequence, positions, rows, before, after, count):
+        import numpy as np
+
+        columns = self.column_count
+        kinds = np.empty((columns, len(rows)), dtype=np.uint8)
+        ends = np.empty((columns, len(rows)), dtype=np.int64)
+        blobs = []
+        for index in range(columns):
+            texts = []
+            column_kinds = []
+            for row in rows:
+                if index < len(row):
+                    kind, text = _encode_cell(row[index])
+                else:
+                    kind, text = _MISSING, ''
+                column_kinds.append(kind)
+                texts.append(text)
+            kinds[index] = column_kinds
+            # Character offsets: one decode per column, then plain str slices
+            ends[index] = np.cumsum([len(text) for text in texts], dtype=np.int64)
+            blobs.append(''.join(texts).encode('utf-8'))
+
+        arrays = {
+            'positions': np.asarray(positions, dtype=np.int64),
+            'kinds': kinds,
+            'ends': ends,
+            'blob_ends': np.cumsum([len(blob) for blob in blobs], dtype=np.int64),
+        }
+        header = {'before': before, 'after': after, 'rows': len(rows), 'count': count,
+                  'arrays': {}}
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'][name] = [offset, array.dtype.str, list(array.shape)]
+            offset += _aligned(array.nbytes)
+        header['blob'] = offset
+
+        path = self.directory / f'{sequence:08d}.seg'
+        header_bytes = json.dumps(header).encode('utf-8')
+        padding = _aligned(len(_MAGIC) + 4 + len(header_bytes)) - len(_MAGIC) - 4 - len(header_bytes)
+        with atomic_write(path) as f:
+            f.write(_MAGIC + struct.pack('<I', len(header_bytes) + padding))
+            f.write(header_bytes + b' ' * padding)
+            for array in arrays.values():
+                data = array.tobytes()
+                f.write(data + b'\0' * (_aligned(len(data)) - len(data)))
+            for blob in blobs:
+                f.write(blob)
+
+    def _read_segment(self, path, header):
+        """[(position, row)] of a segment, read through a memory map"""
+        import numpy as np
+
+        rows = header['rows']
+        if not rows:
+            return []
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = _data_start(data)
+            arrays = {
+                name: np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)),
+                                    offset=start + offset).reshape(shape)
+                for name, (offset, dtype, shape) in header['arrays'].items()
+            }
+            positions = arrays['positions'].tolist()
+            kinds = arrays['kinds'].copy()
+            ends = arrays['ends'].tolist()
+            blob_ends = [0] + arrays['blob_ends'].tolist()
+            # The map cannot be closed while arrays still point into it
+            del arrays
+            blob_start = start + header['blob']
+            texts = [data[blob_start + first:blob_start + last].decode('utf-8')
+                     for first, last in zip(blob_ends, blob_ends[1:])]
+        finally:
+            data.close()
+
+        columns = []
+        missing = False
+        for text, column_ends, column_kinds in zip(texts, ends, kinds):
+            values = list(map(text.__getitem__, map(slice, [0] + column_ends[:-1], column_ends)))
+            for position in np.flatnonzero(column_kinds != _STR).tolist():
+                kind = int(column_kinds[position])
+                if kind == _MISSING:
+                    missing = True
+                    values[position] = _ABSENT
+                else:
+                    values[position] = _DECODERS[kind](values[position])
+            columns.append(values)
+
+        table = [list(row) for row in zip(*columns)]
+        if missing:
+            table = [[value for value in row if value is not _ABSENT] for row in table]
+        return list(zip(positions, table))
+
+
+def _apply(rows, entries):
+    for position, row in entries:
+        if position < 0:
+            rows.append(row)
+        else:
+            rows[position] = row
+
+
+def _read_header(path):
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(len(_MAGIC) + 4)
+            if len(magic) < len(_MAGIC) + 4 or magic[:len(_MAGIC)] != _MAGIC:
+                return None
+            length, = struct.unpack('<I', magic[len(_MAGIC):])
+            return json.loads(f.read(length))
+    except (OSError, ValueError):
+        return None
+
+
+def _data_start(data):
+    length, = struct.unpack('<I', data[len(_MAGIC):len(_MAGIC) + 4])
+    return len(_MAGIC) + 4 + length
+
+
+def _aligned(size):
+    return (size + 7) // 8 * 8
+
+
+def _key(signature):
+    """Storage signatures (nested tuples) as they compare after a JSON round trip"""
+    return json.loads(json.dumps(signature))
+
+
+class NumericSnapshot:
+    """
+    Typed values derived from the rows (see pue_normalize.NumericColumns),
+    kept in the snapshot directory as segments <n>.num of positions, source
+    hashes and a float64 matrix; later segments win. Only a cache: readers
+    compare every entry's hash with the current row, so a write that
+    bypassed it, a torn or lost segment only costs re-deriving those rows.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def load(self, columns):
+        """(positions, hashes, values[entries, columns]) - latest entry per position, or None"""
+        import numpy as np
+
+        parts = [self._read(path, columns) for path in self._segments()]
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return None
+        positions = np.concatenate([part[0] for part in parts])
+        hashes = np.concatenate([part[1] for part in parts])
+        values = np.concatenate([part[2] for part in parts])
+        # First occurrence in reverse order = last write of each position
+        unique, first = np.unique(positions[::-1], return_index=True)
+        latest = len(positions) - 1 - first
+        return unique, hashes[latest], values[latest]
+
+    def save(self, columns, positions, hashes, values):
+        """Add entries for positions (values: one row per position, one column per name)"""
+        self.directory.mkdir(exist_ok=True)
+        segments = self._segments()
+        sequence = int(segments[-1].stem) + 1 if segments else 0
+        self._write(sequence, columns, positions, hashes, values)
+        if len(segments) + 1 >= MERGE_SEGMENTS:
+            self._merge(columns)
+
+    def _merge(self, columns):
+        """Fold all segments into one (entries of other columns are dropped)"""
+        segments = self._segments()
+        merged = self.load(columns)
+        if merged is not None:
+            self._write(int(segments[-1].stem) + 1, columns, *merged)
+        for path in segments:
+            path.unlink(missing_ok=True)
+
+    def _segments(self):
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob('*.num'))
+
+    def _write(self, sequence, columns, positions, hashes, values):
+        import numpy as np
+
+        with atomic_write(self.directory / f'{sequence:08d}.num') as f:
+            np.savez(f, columns=np.array(columns, dtype=str),
+                     positions=np.asarray(positions, dtype=np.int64),
+                     hashes=np.asarray(hashes, dtype=np.int64),
+                     values=np.asarray(values, dtype=np.float64).reshape(-1, len(columns)))
+
+    @staticmethod
+    def _read(path, columns):
+        import numpy as np
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if data['columns'].tolist() != list(columns):
+                    return None
+                return data['positions'], data['hashes'], data['values']
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Replaced or merged away while listing, or torn
+            return None
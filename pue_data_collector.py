@@ -4,178 +4,653 @@ PUE Data Collector - Appends JSON/CSV data to Excel file
 Automatically updates Excel file each time new data is received
 """
 
+import io
 import json
-import pandas as pd
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from pathlib import Path
+import os
+import threading
+import time
+from contextlib import nullcontext
 from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from pue_stats import StatsAggregate
+from pue_dedup import DEDUP_MODES, DedupIndex
+from pue_events import StatsBroadcaster
+from pue_export import stream_xlsx
+from pue_index import RecordIndex
+from pue_metrics import BYTES_PARSED, RECORDS_INGESTED, CountingReader, registry, span
+from pue_schema import map_record
+from pue_search import MIN_SCORE, SEARCH_COLUMNS, TrigramIndex, trigrams
+from pue_startup import startup_timer
+from pue_storage import COLUMN_WIDTHS, HEADERS, ExcelStore, ShardedExcelStore, SQLiteStore
+from pue_stream import (RejectedLines, iter_chunks, iter_csv_records, iter_json_records,
+                        iter_ndjson_records)
+from pue_version import DataVersion
+from pue_writer import GroupCommitWriter
 
 
 class PUEDataCollector:
-    def __init__(self, excel_file='PUE_Datenbank.xlsx', sheet_name='Geräte'):
+    def __init__(self, excel_file='PUE_Datenbank.xlsx', sheet_name='Geräte',
+                 backend='excel', sqlite_file=None, journal_file=None,
+                 compact_threshold=500, compact_interval=60.0,
+                 commit_window_ms=None, commit_max_records=1000,
+                 ingest_chunk_size=1000, dedup_mode='keep',
+                 shard_rows=None, shard_period='month'):
+        """
+        excel_file: Path of the Excel database
+        sheet_name: Worksheet holding the device rows
+        backend: 'excel' (workbook is the primary store), 'sharded' (one
+                 workbook per month and/or shard_rows rows, only the newest
+                 is written) or 'sqlite' (indexed SQLite table, workbook
+                 exported on demand)
+        sqlite_file: SQLite database for backend='sqlite' (default: <excel_file>.sqlite)
+        journal_file: Append-only journal in front of Excel (default: <excel_file>.journal)
+        compact_threshold: Fold the journal into Excel once it holds this many rows
+        compact_interval: Seconds between background compactions (None = only on threshold)
+        commit_window_ms: Enable group commit - batches arriving within this window
+                          are written by a single writer thread in one commit
+        commit_max_records: Close a commit group early once it holds this many rows
+        ingest_chunk_size: Records parsed, mapped and written per chunk during ingest
+        dedup_mode: Default handling of records whose Hersteller, Modellbezeichnung
+                    and Quelle match a stored row: 'skip', 'upsert' (replace in
+                    place) or 'keep' (append every version)
+        shard_rows: backend='sharded' - start a new shard after this many rows
+        shard_period: backend='sharded' - 'month' (shard per month of Zeitstempel) or None
+        """
         self.excel_file = excel_file
         self.sheet_name = sheet_name
-        self._initialize_excel()
-    
-    def _initialize_excel(self):
-        """Create Excel file with headers if it doesn't exist"""
-        if not Path(self.excel_file).exists():
-            wb = Workbook()
-            ws = wb.active
-            ws.title = self.sheet_name
-            
-            # Define headers (matching your GPT configuration)
-            headers = [
-                'Hersteller', 'Produktkategorie', 'Produktfamilie', 
-                'Modellbezeichnung', 'Nennleistung', 'Kühlleistung',
-                'Elektrische Aufnahmeleistung', 'Wirkungsgrad_oder_Verlustleistung',
-                'COP_EER_IPLV', 'Teillast_25%', 'Teillast_50%', 'Teillast_75%',
-                'Teillast_100%', 'Betriebsbedingungen', 'Quelle_Dateiname',
-                'Quelle_Seitenzahl', 'Quelle_Zitat', 'Fehlende_Angaben',
-                'Verarbeitungsfehler', 'Zeitstempel'
-            ]
-            
-            # Add headers with formatting
-            for col, header in enumerate(headers, start=1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True, color='FFFFFF')
-                cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # Adjust column widths
-            column_widths = {
-                'A': 15, 'B': 20, 'C': 20, 'D': 25, 'E': 15, 'F': 15,
-                'G': 20, 'H': 25, 'I': 15, 'J': 12, 'K': 12, 'L': 12,
-                'M': 12, 'N': 30, 'O': 20, 'P': 12, 'Q': 50, 'R': 30,
-                'S': 30, 'T': 20
-            }
-            for col, width in column_widths.items():
-                ws.column_dimensions[col].width = width
-            
-            wb.save(self.excel_file)
-            print(f"✓ Excel-Datei erstellt: {self.excel_file}")
+        self.backend = backend
+        self.ingest_chunk_size = ingest_chunk_size
+        self.dedup_mode = self._check_dedup_mode(dedup_mode)
+
+        if backend == 'excel':
+            self.storage_file = excel_file
+            self.store = ExcelStore(
+                excel_file, sheet_name, journal_file=journal_file,
+                compact_threshold=compact_threshold, compact_interval=compact_interval
+            )
+        elif backend == 'sharded':
+            path = Path(excel_file)
+            self.storage_file = str(path.with_name(f'{path.stem}_*{path.suffix}'))
+            self.store = ShardedExcelStore(
+                excel_file, sheet_name, shard_rows=shard_rows, shard_period=shard_period,
+                compact_threshold=compact_threshold, compact_interval=compact_interval
+            )
+        elif backend == 'sqlite':
+            self.storage_file = sqlite_file or str(Path(excel_file).with_suffix('.sqlite'))
+            self.store = SQLiteStore(self.storage_file, sheet_name)
+            # One-shot migration the first time an existing workbook is opened as SQLite
+            if self.store.is_empty() and Path(excel_file).exists():
+                self.store.migrate_from_excel(excel_file, sheet_name, journal_file)
+        else:
+            raise ValueError(f"Unbekanntes Backend: {backend}")
+
+        # In-memory views over all stored rows, kept in sync on every insert
+        self._lock = threading.RLock()
+        self.stats = StatsAggregate()
+        self.dedup_index = DedupIndex()
+        self.records = RecordIndex()
+        self.version = DataVersion(self.store)
+        self.search_index = TrigramIndex()
+        self.numeric = None  # NumericColumns, built on first use (needs pandas), persisted by the store
+        self.analytics = None  # AnalyticsAggregate over self.numeric, built on first use
+        self._views = [self.stats, self.dedup_index, self.records, self.version, self.search_index]
+        # Pushes a stats delta to /api/stats/stream clients after every change
+        self.events = StatsBroadcaster()
+        self._rebuild_views()
+
+        self.writer = None
+        if commit_window_ms is not None:
+            self.writer = GroupCommitWriter(
+                self._commit_batches, window_ms=commit_window_ms, max_records=commit_max_records
+            )
+
+    def _rebuild_views(self):
+        """Re-read every stored row once and reset all in-memory views"""
+        with self._lock:
+            load_rows = getattr(self.store, 'load_rows', None)
+            rows = load_rows() if load_rows else list(self.store.iter_rows())
+            # One copy of each repeated value, shared by all views
+            rows = self.records.intern(rows)
+            superseded = self._superseded_positions()
+            for view in self._views:
+                view.reset(rows)
+                view.remove_rows(superseded)
+            self.events.publish(self.version.version, self._summary())
+
+    def _superseded_positions(self):
+        """Stored rows replaced by a newer version (sharded backend only)"""
+        positions = getattr(self.store, 'superseded_positions', None)
+        return positions() if positions else []
+
+    def _refresh_if_changed(self):
+        """Rebuild the views if the storage file was modified by another process"""
+        if self.store.changed_externally():
+            self._rebuild_views()
     
-    def add_json_data(self, json_data):
+    def add_json_data(self, json_data, dedup=None):
         """
         Add JSON data to Excel file
-        json_data: Either a JSON string or parsed dict/list
+        json_data: JSON string, parsed dict/list, or a file-like object
+                   (text or binary) containing a JSON array, read incrementally
+        dedup: 'skip', 'upsert' or 'keep' (default: the collector's dedup_mode)
+        Returns {'inserted': n, 'updated': n, 'skipped': n}. On a parse error
+        the chunks before it stay stored: returns {'success': False, 'message': ...}
+        plus the totals of those chunks, so a client knows what a retry would repeat
         """
-        # Parse JSON if it's a string
+        dedup = self._check_dedup_mode(dedup or self.dedup_mode)
+        json_data = self._counted(json_data)
         if isinstance(json_data, str):
-            try:
-                data = json.loads(json_data)
-            except json.JSONDecodeError as e:
-                print(f"✗ JSON-Parsing-Fehler: {e}")
-                return False
+            records = iter_json_records(io.StringIO(json_data))
+        elif hasattr(json_data, 'read'):
+            records = iter_json_records(json_data)
+        elif isinstance(json_data, list):
+            records = json_data
+        else:
+            records = [json_data]
+
+        totals = self._new_totals()
+        try:
+            return self._ingest(records, dedup, totals=totals)
+        except json.JSONDecodeError as e:
+            print(f"✗ JSON-Parsing-Fehler: {e}")
+            return self._failed(totals, f"JSON-Parsing-Fehler: {e}")
+
+    def add_ndjson_data(self, ndjson_data, dedup=None, batch_size=None, max_rejected=None):
+        """
+        Add newline-delimited JSON (one record per line), read line by line
+        ndjson_data: NDJSON string or file-like object (text or binary)
+        dedup: 'skip', 'upsert' or 'keep' (default: the collector's dedup_mode)
+        batch_size: Records written per commit (default: ingest_chunk_size)
+        max_rejected: Rejected lines listed at most (default: all)
+        Lines that are no valid JSON or no object are rejected, all others written.
+        Returns the insert/update/skip totals plus accepted (number of records),
+        rejected ([{'line': n, 'error': '...'}], line numbers from 1),
+        rejected_count and truncated (True if rejected lists only the first ones)
+        """
+        dedup = self._check_dedup_mode(dedup or self.dedup_mode)
+        if batch_size is not None and batch_size < 1:
+            raise ValueError(f"Ungültige Batch-Größe: {batch_size}")
+        ndjson_data = self._counted(ndjson_data)
+        if isinstance(ndjson_data, str):
+            ndjson_data = io.StringIO(ndjson_data)
+        rejected = RejectedLines(max_rejected)
+        totals = self._ingest(iter_ndjson_records(ndjson_data, rejected), dedup,
+                              chunk_size=batch_size)
+        if rejected.count:
+            print(f"  ✗ {rejected.count} Zeilen abgelehnt")
+        accepted = totals['inserted'] + totals['updated'] + totals['skipped']
+        return {**totals, 'accepted': accepted, 'rejected': rejected.items,
+                'rejected_count': rejected.count, 'truncated': rejected.truncated}
+
+    def ingest(self, data, format='json', dedup=None, start=0, errors=None, on_progress=None):
+        """
+        Ingest JSON or CSV (string or file-like) for background jobs
+        start: Number of records to skip (resuming an interrupted job)
+        errors: List collecting {'record': n, 'error': '...'} for records that
+                cannot be mapped - those are skipped instead of failing the chunk
+        on_progress: Called as on_progress(records_processed, totals) after each chunk
+        Returns the insert/update/skip totals; malformed input raises
+        """
+        dedup = self._check_dedup_mode(dedup or self.dedup_mode)
+        data = self._counted(data)
+        if isinstance(data, str):
+            data = io.StringIO(data, newline='')
+        if format == 'json':
+            records = iter_json_records(data)
+        elif format == 'csv':
+            records = iter_csv_records(data)
         else:
-            data = json_data
-        
-        # Ensure data is a list
-        if not isinstance(data, list):
-            data = [data]
-        
-        # Load existing workbook
-        wb = load_workbook(self.excel_file)
-        ws = wb[self.sheet_name]
-        
-        # Find next empty row
-        next_row = ws.max_row + 1
-        
+            raise ValueError(f"Ungültiges Format: {format}")
+        return self._ingest(records, dedup, start=start, errors=errors, on_progress=on_progress)
+
+    def bulk_import(self, sources, workers=None, batch_size=5000, dedup=None, progress=True):
+        """
+        Import folders/files of GPT JSON/CSV outputs in parallel
+        sources: Files and/or folders (searched recursively for *.json, *.csv)
+        workers: Parser processes (default: all cores)
+        batch_size: Rows collected from the workers per storage commit
+        progress: Print a line per file
+        Returns the totals plus files, failed_files, record errors, seconds and records_per_s
+        """
+        from pue_bulk import find_files, iter_parsed_files
+
+        dedup = self._check_dedup_mode(dedup or self.dedup_mode)
+        files = find_files(sources)
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        started = time.perf_counter()
+
+        summary = {'inserted': 0, 'updated': 0, 'skipped': 0, 'files': len(files),
+                   'records': 0, 'failed_files': [], 'errors': []}
+        batch = []
+
+        def flush():
+            with span('write'):
+                result = self._write_rows(batch, dedup)
+            for key, count in result.items():
+                summary[key] += count
+                RECORDS_INGESTED.inc(count, result=key)
+            batch.clear()
+
+        # The Excel journal is folded into the workbook once at the end, not per batch
+        with getattr(self.store, 'bulk', nullcontext)():
+            for done, parsed in enumerate(iter_parsed_files(files, timestamp, workers), start=1):
+                batch.extend(parsed['rows'])
+                summary['records'] += parsed['records']
+                summary['errors'].extend({'file': parsed['file'], **error}
+                                         for error in parsed['errors'])
+                if parsed['error']:
+                    summary['failed_files'].append({'file': parsed['file'],
+                                                    'error': parsed['error']})
+                if len(batch) >= batch_size:
+                    flush()
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    rate = summary['records'] / elapsed if elapsed else 0
+                    status = f"✗ {parsed['error']}" if parsed['error'] else '✓'
+                    print(f"  [{done}/{len(files)}] {status} {Path(parsed['file']).name}: "
+                          f"{parsed['records']} Datensätze, {len(parsed['errors'])} Fehler "
+                          f"({rate:.0f} Datensätze/s)")
+            if batch:
+                flush()
+
+        summary['seconds'] = time.perf_counter() - started
+        summary['records_per_s'] = summary['records'] / summary['seconds'] if summary['seconds'] else 0
+        print(f"✓ Massenimport: {summary['inserted']} Datensätze hinzugefügt, "
+              f"{summary['updated']} aktualisiert, {summary['skipped']} übersprungen "
+              f"aus {len(files)} Dateien in {summary['seconds']:.1f}s "
+              f"({summary['records_per_s']:.0f} Datensätze/s)")
+        if summary['failed_files'] or summary['errors']:
+            print(f"  ✗ {len(summary['failed_files'])} Dateien mit Parsing-Fehlern, "
+                  f"{len(summary['errors'])} fehlerhafte Datensätze")
+        return summary
+
+    @staticmethod
+    def _counted(data):
+        """Add the input size to pue_bytes_parsed_total (binary streams while read)"""
+        if isinstance(data, str):
+            BYTES_PARSED.inc(len(data.encode('utf-8')))
+        elif hasattr(data, 'read') and not isinstance(data, io.TextIOBase):
+            return io.BufferedReader(CountingReader(data))
+        return data
+
+    @staticmethod
+    def _check_dedup_mode(mode):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Ungültiger Dedup-Modus: {mode} (erlaubt: {', '.join(DEDUP_MODES)})")
+        return mode
+
+    @staticmethod
+    def _new_totals():
+        return {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+    @staticmethod
+    def _failed(totals, message):
+        """Answer for an ingest that failed after totals were already stored"""
+        stored = totals['inserted'] + totals['updated']
+        if stored:
+            message += f" ({stored} Datensätze wurden vor dem Fehler gespeichert)"
+        return {'success': False, **totals, 'message': message}
+
+    def _ingest(self, records, dedup, start=0, errors=None, on_progress=None, chunk_size=None,
+                totals=None):
+        """
+        Map records to rows and write them in chunks of ingest_chunk_size
+        (or chunk_size), so peak memory does not grow with the size of the upload.
+        Chunks written before a parse error stay stored; totals (a dict from
+        _new_totals, updated in place) tells the caller how many that were.
+        """
         # Add timestamp
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Add each record
-        rows_added = 0
-        for record in data:
-            # Extract Teillastdaten
-            teillast = record.get('Teillastdaten', {}) or {}
-            
-            # Extract Quelle
-            quelle = record.get('Quelle', {}) or {}
-            
-            # Prepare fehlende_angaben as comma-separated string
-            fehlende = record.get('Fehlende_Angaben', [])
-            fehlende_str = ', '.join(fehlende) if fehlende else ''
-            
-            # Prepare row data
-            row_data = [
-                record.get('Hersteller'),
-                record.get('Produktkategorie'),
-                record.get('Produktfamilie'),
-                record.get('Modellbezeichnung'),
-                record.get('Nennleistung'),
-                record.get('Kühlleistung'),
-                record.get('Elektrische Aufnahmeleistung'),
-                record.get('Wirkungsgrad_oder_Verlustleistung'),
-                record.get('COP_EER_IPLV'),
-                teillast.get('25%'),
-                teillast.get('50%'),
-                teillast.get('75%'),
-                teillast.get('100%'),
-                record.get('Betriebsbedingungen'),
-                quelle.get('Dateiname'),
-                quelle.get('Seitenzahl'),
-                quelle.get('Zitat'),
-                fehlende_str,
-                record.get('Verarbeitungsfehler'),
-                timestamp
-            ]
-            
-            # Write row
-            for col, value in enumerate(row_data, start=1):
-                ws.cell(row=next_row, column=col, value=value)
-            
-            next_row += 1
-            rows_added += 1
-        
-        # Save workbook
-        wb.save(self.excel_file)
-        print(f"✓ {rows_added} Datensätze hinzugefügt zu {self.excel_file}")
-        return True
+
+        if totals is None:
+            totals = self._new_totals()
+        processed = start
+        chunks = iter_chunks(islice(records, start, None), chunk_size or self.ingest_chunk_size)
+        while True:
+            # Records are parsed lazily, so parse time is spent fetching the chunk
+            with span('parse'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with span('map'):
+                rows = self._map_chunk(chunk, timestamp, processed, errors)
+            with span('write'):
+                result = self._write_rows(rows, dedup)
+            processed += len(chunk)
+            for key, count in result.items():
+                totals[key] += count
+                RECORDS_INGESTED.inc(count, result=key)
+            if on_progress is not None:
+                on_progress(processed, totals)
+
+        message = f"✓ {totals['inserted']} Datensätze hinzugefügt zu {self.storage_file}"
+        if totals['updated'] or totals['skipped']:
+            message += f" ({totals['updated']} aktualisiert, {totals['skipped']} übersprungen)"
+        print(message)
+        return totals
+
+    def _map_chunk(self, chunk, timestamp, first, errors):
+        """Map a chunk of records; with an errors list, bad records are reported and skipped"""
+        if errors is None:
+            return [self._record_to_row(record, timestamp) for record in chunk]
+        rows = []
+        for index, record in enumerate(chunk, start=first):
+            try:
+                rows.append(self._record_to_row(record, timestamp))
+            except Exception as e:
+                errors.append({'record': index, 'error': str(e)})
+        return rows
+
+    # Compiled from the Geräte schema: validates each record and notes type
+    # errors and missing required fields in Verarbeitungsfehler
+    _record_to_row = staticmethod(map_record)
+
+    def _write_rows(self, rows, dedup):
+        if self.writer is not None:
+            # Blocks until the group containing these rows is durably written
+            return self.writer.write(rows, dedup=dedup)
+        return self._commit_batches([(rows, {'dedup': dedup})])[0]
+
+    def _commit_batches(self, batches):
+        """
+        Deduplicate (rows, options) batches, write them to storage and fold
+        them into the in-memory views. Returns the insert/update/skip counts
+        per batch.
+        """
+        # Other processes cannot write between deduplication and the write itself
+        with self._lock, getattr(self.store, 'locked', nullcontext)():
+            if self.store.changed_externally():
+                self._rebuild_views()
+            base = self.dedup_index.size
+            # Rows below this position live in immutable shards (sharded backend)
+            sealed = getattr(self.store, 'sealed_rows', 0)
+            inserts = []
+            replacements = []
+            superseded = []
+            results = []
+            try:
+                # Views are updated batch by batch so later batches see earlier ones
+                for rows, options in batches:
+                    with span('dedup'):
+                        batch_inserts, batch_replacements, result = self.dedup_index.plan(
+                            rows, options['dedup']
+                        )
+                    batch_superseded = []
+                    if sealed and batch_replacements:
+                        # Rows in sealed shards cannot change: the new version is
+                        # appended and the old row is superseded in every view
+                        batch_superseded = [position for position, _ in batch_replacements
+                                            if position < sealed]
+                        batch_inserts += [row for position, row in batch_replacements
+                                          if position < sealed]
+                        batch_replacements = [(position, row) for position, row in batch_replacements
+                                              if position >= sealed]
+                    with span('index'):
+                        # Views (and storage) share the record index's copy of repeated values
+                        batch_inserts = self.records.intern(batch_inserts)
+                        batch_replacements = list(zip(
+                            [position for position, _ in batch_replacements],
+                            self.records.intern([row for _, row in batch_replacements])
+                        ))
+                        for view in self._views:
+                            view.add_rows(batch_inserts)
+                            view.replace_rows(batch_replacements)
+                            view.remove_rows(batch_superseded)
+                    inserts.extend(batch_inserts)
+                    superseded.extend(batch_superseded)
+                    for position, row in batch_replacements:
+                        if position >= base:
+                            # Replaces a row of this commit before it is written
+                            inserts[position - base] = row
+                        else:
+                            replacements.append((position, row))
+                    results.append(result)
+
+                # Replacements first: appending may roll over (and seal) the current shard
+                self.store.replace(replacements)
+                self.store.append(inserts)
+                if superseded:
+                    self.store.supersede(superseded)
+            except Exception:
+                self._rebuild_views()
+                raise
+            self.events.publish(self.version.version, self._summary())
+            return results
+
+    def get_write_metrics(self):
+        """Queue depth and commit latency of the group-commit writer"""
+        if self.writer is None:
+            return {'group_commit': False}
+        return {'group_commit': True, **self.writer.metrics()}
+
+    def export_excel(self, shard=None):
+        """
+        Return the path of an xlsx file containing every stored record
+        shard: Name of a single shard to return instead (backend='sharded')
+        """
+        if shard is None:
+            return self.store.export_file()
+        if not hasattr(self.store, 'shard_file'):
+            raise ValueError(f"Backend {self.backend} hat keine Shards")
+        return self.store.shard_file(shard)
+
+    def iter_rows(self, filters=None):
+        """
+        Yield stored rows (lists in HEADERS order)
+        filters: Optional {column: value} dict, e.g. {'Hersteller': 'Eaton'}
+        """
+        if filters:
+            unknown = [column for column in filters if column not in HEADERS]
+            if unknown:
+                raise ValueError(f"Unbekannte Spalte(n): {', '.join(unknown)}")
+        return self.store.iter_rows(filters)
+
+    def stream_excel(self, filters=None):
+        """Yield an xlsx export of the (filtered) rows chunk by chunk"""
+        return stream_xlsx(self.iter_rows(filters), self.sheet_name, HEADERS, COLUMN_WIDTHS)
+
+    def compact(self):
+        """Fold pending journal rows into Excel (no-op for SQLite)"""
+        return self.store.compact()
+
+    def close(self):
+        """Flush pending writes and release the storage backend"""
+        if self.writer is not None:
+            self.writer.close()
+        self.events.close()
+        self.store.close()
     
-    def add_csv_data(self, csv_string):
+    def add_csv_data(self, csv_data, dedup=None):
         """
         Add CSV data to Excel file
-        csv_string: CSV formatted string
+        csv_data: CSV formatted string or a file-like object, read line by line
+        dedup: 'skip', 'upsert' or 'keep' (default: the collector's dedup_mode)
+        Returns the insert/update/skip totals; on an error like add_json_data
+        {'success': False, 'message': ...} plus the totals stored before it
         """
-        # Parse CSV using pandas
-        from io import StringIO
+        dedup = self._check_dedup_mode(dedup or self.dedup_mode)
+        csv_data = self._counted(csv_data)
+        if isinstance(csv_data, str):
+            csv_data = io.StringIO(csv_data, newline='')
+        totals = self._new_totals()
         try:
-            df = pd.read_csv(StringIO(csv_string))
-            
-            # Convert to JSON format and use add_json_data
-            records = df.to_dict('records')
-            return self.add_json_data(records)
-        
+            return self._ingest(iter_csv_records(csv_data), dedup, totals=totals)
         except Exception as e:
             print(f"✗ CSV-Parsing-Fehler: {e}")
-            return False
+            return self._failed(totals, f"CSV-Parsing-Fehler: {e}")
     
+    def query_records(self, filters=None, time_from=None, time_to=None, text=None,
+                      offset=0, limit=100, fields=None):
+        """
+        Query the in-memory record index without touching the storage file
+        filters: {column: value} on Hersteller, Produktkategorie, Produktfamilie
+        time_from/time_to: Inclusive Zeitstempel range
+        text: Case-insensitive match within Modellbezeichnung
+        offset/limit: Pagination, fields: projected columns
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            return self.records.query(filters, time_from, time_to, text, offset, limit, fields)
+
+    def search(self, query, limit=20, min_score=MIN_SCORE, columns=None, fields=None):
+        """
+        Fuzzy search (trigram similarity) over Modellbezeichnung, Produktfamilie
+        and Hersteller, e.g. to find near-duplicates before a submission
+        columns: Only match these of the three columns
+        fields: Columns returned per match (default: the three plus Produktkategorie)
+        Returns {'query': query, 'results': [{'Ähnlichkeit': 0..1, 'Treffer_in': column, ...}]}
+        """
+        if not trigrams(query):
+            raise ValueError("Suchbegriff fehlt oder enthält keine Buchstaben/Ziffern")
+        columns = columns or SEARCH_COLUMNS
+        unknown = [column for column in columns if column not in SEARCH_COLUMNS]
+        if unknown:
+            raise ValueError(f"Spalte nicht durchsuchbar: {', '.join(unknown)} "
+                             f"(erlaubt: {', '.join(SEARCH_COLUMNS)})")
+        fields = fields or ['Hersteller', 'Produktkategorie', 'Produktfamilie', 'Modellbezeichnung']
+        unknown = [column for column in fields if column not in HEADERS]
+        if unknown:
+            raise ValueError(f"Unbekannte Spalte(n): {', '.join(unknown)}")
+
+        self._refresh_if_changed()
+        with self._lock:
+            matches = self.search_index.search(query, limit, min_score, columns)
+            results = [
+                {'Ähnlichkeit': score, 'Treffer_in': column,
+                 **{field: self.records.table[position][field] for field in fields}}
+                for position, score, column in matches
+            ]
+        return {'query': query, 'results': results}
+
+    def numeric_frame(self):
+        """
+        DataFrame of the normalized numeric columns (kW, kVA, fractions)
+        plus Hersteller and Produktkategorie, one row per stored record
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            return self._numeric_view().frame()
+
+    def _numeric_view(self):
+        if self.numeric is None:
+            with startup_timer.phase('numeric_view'):
+                from pue_normalize import NumericColumns
+                self.numeric = NumericColumns(self.store)
+                # Seeded from the record index and the store's persisted values
+                self.numeric.reset(list(self.records.table.rows()))
+                self.numeric.remove_rows(sorted(self.records.superseded))
+            self._views.append(self.numeric)
+        return self.numeric
+
+    def get_analytics(self, by=None):
+        """
+        Per-Produktkategorie and per-Hersteller device counts, efficiency and
+        COP/EER (mean/min/max), mean part-load curve (25-100 %) and total
+        electrical input power - O(#groups), maintained on every insert
+        by: 'Produktkategorie' or 'Hersteller' (default: both)
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            if self.analytics is None:
+                numeric = self._numeric_view()
+                with startup_timer.phase('analytics_view'):
+                    from pue_analytics import AnalyticsAggregate
+                    self.analytics = AnalyticsAggregate(numeric)
+                # From now on the aggregate updates the columns it reads
+                self._views[self._views.index(numeric)] = self.analytics
+            return self.analytics.summary(by)
+
+    def part_load_efficiency(self, by='Produktkategorie'):
+        """Mean part-load efficiency (fraction) per Produktkategorie or Hersteller"""
+        if by not in ('Produktkategorie', 'Hersteller'):
+            raise ValueError(f"Ungültige Gruppierung: {by}")
+        columns = ['Teillast_25', 'Teillast_50', 'Teillast_75', 'Teillast_100']
+        frame = self.numeric_frame()
+        return frame.groupby(by)[columns].mean()
+
     def get_summary(self):
-        """Get summary of database contents"""
-        df = pd.read_excel(self.excel_file, sheet_name=self.sheet_name)
-        
-        summary = {
-            'Gesamtanzahl': len(df),
-            'Hersteller': df['Hersteller'].nunique() if 'Hersteller' in df else 0,
-            'Produktkategorien': df['Produktkategorie'].nunique() if 'Produktkategorie' in df else 0,
-            'Letzte_Aktualisierung': df['Zeitstempel'].max() if 'Zeitstempel' in df else None
-        }
-        
+        """Get summary of database contents - O(1), served from memory"""
+        with span('summary'):
+            self._refresh_if_changed()
+            with self._lock:
+                return self._summary()
+
+    def _summary(self):
+        summary = self.stats.summary()
+        if hasattr(self.store, 'shard_summary'):
+            summary['Shards'] = self.store.shard_summary()
         return summary
 
+    def stats_stream(self, last_event_id=None):
+        """
+        Server-Sent Events of the summary: the full stats first (or the deltas
+        missed since last_event_id), then one delta per commit - see StatsBroadcaster
+        """
+        return self.events.stream(last_event_id, poll=self._refresh_if_changed)
+
+    def data_version(self):
+        """
+        Cache validators of the stored data, after picking up external changes:
+        {'version': changes since startup, 'etag': hash of the store's change
+        signature, 'last_modified': UTC datetime}
+        """
+        # Read before the refresh, so the views are never older than the validators
+        etag, last_modified = self.version.validators()
+        self._refresh_if_changed()
+        with self._lock:
+            return {
+                'version': self.version.version,
+                'etag': etag,
+                'last_modified': last_modified
+            }
+
+    def collect_metrics(self):
+        """Update the gauges of the metrics registry from current state"""
+        registry.gauge('pue_records', 'Stored device records').set(self.stats.count)
+        registry.gauge('pue_stats_stream_clients',
+                       'Connected /api/stats/stream clients').set(self.events.clients)
+        storage_bytes = registry.gauge('pue_storage_file_bytes', 'Size of the storage files',
+                                       ('file',))
+        paths = [self.storage_file, getattr(self.store, 'journal_file', None)]
+        if hasattr(self.store, 'shard_summary'):
+            folder = os.path.dirname(self.excel_file)
+            paths = [os.path.join(folder, shard['Datei']) for shard in self.store.shard_summary()]
+        for path in paths:
+            if path and os.path.exists(path):
+                storage_bytes.set(os.path.getsize(path), file=os.path.basename(path))
+        for name, value in self.get_write_metrics().items():
+            if name != 'group_commit':
+                registry.gauge(f'pue_writer_{name}', f'Group-commit writer {name}').set(value)
+
+
+_collector = None
+_collector_lock = threading.Lock()
 
-def main():
-    """Example usage"""
-  _collector = None
 
 def get_collector():
+    """Return the shared collector instance, creating it on first use"""
     global _collector
     if _collector is None:
-        _collector = PUEDataCollector("PUE_Datenbank.xlsx")
+        with _collector_lock:
+            if _collector is None:
+                with startup_timer.phase('collector_init'):
+                    _collector = PUEDataCollector(
+                        "PUE_Datenbank.xlsx",
+                        backend=os.environ.get('PUE_BACKEND', 'excel'),
+                        commit_window_ms=float(os.environ.get('PUE_COMMIT_WINDOW_MS', '5')),
+                        dedup_mode=os.environ.get('PUE_DEDUP_MODE', 'skip'),
+                        shard_rows=int(os.environ.get('PUE_SHARD_ROWS', '0')) or None,
+                        shard_period=os.environ.get('PUE_SHARD_PERIOD', 'month') or None
+                    )
     return _collector
-    
+
+
+def main():
+    """Example usage"""
+    collector = get_collector()
+
     # Example JSON data from your GPT
     example_json = """
     [
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Content-hash deduplication index for the PUE Data Collector
+Detects re-submitted datasheet extractions in O(1) per record
+"""
+
+import hashlib
+
+from pue_storage import HEADERS
+
+
+DEDUP_MODES = ('skip', 'upsert', 'keep')
+
+# Columns identifying a device extraction: manufacturer, model and source
+KEY_COLUMNS = ('Hersteller', 'Modellbezeichnung', 'Quelle_Dateiname',
+               'Quelle_Seitenzahl', 'Quelle_Zitat')
+_KEY_INDEXES = [HEADERS.index(column) for column in KEY_COLUMNS]
+
+
+def dedup_key(row):
+    """Normalized 16-byte hash of the identifying columns of a row"""
+    parts = []
+    for index in _KEY_INDEXES:
+        value = row[index]
+        parts.append(' '.join(str(value).casefold().split()) if value is not None else '')
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).digest()
+
+
+class DedupIndex:
+    """
+    Maps the content hash of every stored row to its position (latest
+    occurrence wins). Rebuilt from storage at startup like the other
+    in-memory views, so it always reflects the persisted rows.
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def reset(self, rows):
+        self.positions = {}
+        self.size = 0
+        self.add_rows(rows)
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.positions[dedup_key(row)] = self.size
+            self.size += 1
+
+    def replace_rows(self, replacements):
+        for position, row in replacements:
+            self.positions[dedup_key(row)] = position
+
+    def remove_rows(self, positions):
+        """
+        Superseded rows need no change: their new version was added after
+        them, so its position already won their key
+        """
+
+    def plan(self, rows, mode):
+        """
+        Decide per row whether to insert, replace or skip it
+        Returns (inserts, replacements, result) where replacements are
+        (position, row) pairs and result counts inserted/updated/skipped.
+        Rows repeated within the batch are handled as if inserted one by one.
+        """
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Ungültiger Dedup-Modus: {mode}")
+
+        inserts = []
+        replacements = {}
+        batch_positions = {}
+        result = {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+        for row in rows:
+            key = dedup_key(row)
+            if mode != 'keep':
+                in_batch = batch_positions.get(key)
+                stored = self.positions.get(key)
+                if in_batch is not None:
+                    if mode == 'upsert':
+                        inserts[in_batch] = row
+                        result['updated'] += 1
+                    else:
+                        result['skipped'] += 1
+                    continue
+                if stored is not None:
+                    if mode == 'upsert':
+                        replacements[stored] = row
+                        result['updated'] += 1
+                    else:
+                        result['skipped'] += 1
+                    continue
+
+            batch_positions[key] = len(inserts)
+            inserts.append(row)
+            result['inserted'] += 1
+
+        return inserts, list(replacements.items()), result
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Live statistics push for the PUE Data Collector
+One in-process broadcaster turns every commit into a Server-Sent Events
+delta of the stats; all connected dashboards read the same event history,
+so the work per change does not grow with the number of viewers
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+
+# Events kept for clients resuming with Last-Event-ID
+HISTORY = 256
+# Comment line sent when nothing else was sent for this long (keeps proxies from closing)
+HEARTBEAT_SECONDS = 15
+# How often waiting streams check for writes of other processes
+POLL_SECONDS = 1.0
+# Reconnect delay suggested to EventSource clients
+RETRY_MS = 3000
+
+
+def summary_delta(old, new):
+    """
+    Changed entries of new compared with old: nested dicts (Anzahl_pro_Kategorie)
+    only with their changed keys, removed keys as None
+    """
+    delta = {}
+    for key in [*new, *(key for key in old if key not in new)]:
+        before, after = old.get(key), new.get(key)
+        if before == after:
+            continue
+        if isinstance(before, dict) and isinstance(after, dict):
+            delta[key] = summary_delta(before, after)
+        else:
+            delta[key] = after
+    return delta
+
+
+class StatsBroadcaster:
+    """
+    Latest summary plus a bounded history of (previous version, version,
+    delta) events. publish() is called by the collector after each commit
+    (and after picking up external changes); stream() serves one client,
+    waiting on a shared condition instead of a queue per client.
+    Event ids are '<token>-<version>': the token changes with every process,
+    so ids from another worker or an earlier run resume with the full stats.
+    """
+
+    def __init__(self, history=HISTORY):
+        self.token = uuid.uuid4().hex[:8]
+        self.clients = 0
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._summary = None
+        self._version = None
+        self._closed = False
+        self._last_poll = 0.0
+
+    def publish(self, version, summary):
+        """Record the stats after a change; clients are woken if anything differs"""
+        with self._condition:
+            if self._summary is not None:
+                delta = summary_delta(self._summary, summary)
+                if not delta:
+                    return
+                self._events.append((self._version, version, delta))
+            self._summary, self._version = summary, version
+            self._condition.notify_all()
+
+    def close(self):
+        """End all streams (e.g. when the collector is closed)"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stream(self, last_event_id=None, poll=None, heartbeat=HEARTBEAT_SECONDS):
+        """
+        SSE frames for one client: the full stats ('stats' event), or only the
+        missed deltas when resuming from last_event_id; then a 'delta' event
+        per change and a heartbeat comment while nothing changes
+        poll: Called (at most every POLL_SECONDS across all streams) to pick
+              up writes of other processes
+        """
+        with self._condition:
+            self.clients += 1
+            version = self._resume_version(last_event_id)
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            last_sent = time.monotonic()
+            while True:
+                with self._condition:
+                    if version == self._version and not self._closed:
+                        self._condition.wait(POLL_SECONDS)
+                    if self._closed:
+                        return
+                    frames, version = self._frames_since(version)
+                if frames:
+                    yield ''.join(frames)
+                    last_sent = time.monotonic()
+                    continue
+                if poll is not None and self._poll_due():
+                    poll()
+                if time.monotonic() - last_sent >= heartbeat:
+                    yield ': heartbeat\n\n'
+                    last_sent = time.monotonic()
+        finally:
+            with self._condition:
+                self.clients -= 1
+
+    def _resume_version(self, last_event_id):
+        """Version a client has already seen, None if it needs the full stats"""
+        if not last_event_id:
+            return None
+        token, _, version = last_event_id.partition('-')
+        if token != self.token or not version.isdigit():
+            return None
+        return int(version)
+
+    def _frames_since(self, version):
+        """(frames, new version) bringing a client from version to the latest stats"""
+        if version == self._version:
+            return [], version
+        if version is not None:
+            for index, (previous, _, _) in enumerate(self._events):
+                if previous == version:
+                    missed = list(self._events)[index:]
+                    return [self._frame('delta', current, delta)
+                            for _, current, delta in missed], self._version
+        # New client, or too far behind for the history
+        return [self._frame('stats', self._version, self._summary)], self._version
+
+    def _frame(self, event, version, data):
+        payload = json.dumps({'version': version, **data}, ensure_ascii=False, default=str)
+        return f'id: {self.token}-{version}\nevent: {event}\ndata: {payload}\n\n'
+
+    def _poll_due(self):
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_poll < POLL_SECONDS:
+                return False
+            self._last_poll = now
+            return True
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+In-memory query index for the PUE Data Collector
+Compact columnar copy of the device table with hash indexes on the
+categorical columns and a sorted index on Zeitstempel
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+from pue_storage import HEADERS
+from pue_table import TIME_COLUMN, CompactTable, format_seconds
+
+
+INDEXED_COLUMNS = ('Hersteller', 'Produktkategorie', 'Produktfamilie')
+TEXT_COLUMN = 'Modellbezeichnung'
+_INDEXED = [(column, HEADERS.index(column)) for column in INDEXED_COLUMNS]
+
+
+class RecordIndex:
+    """
+    Compact copy of all stored rows (see CompactTable) plus hash indexes
+    value -> sorted positions (int64 arrays) and a Zeitstempel index:
+    parallel sorted (seconds, position) arrays, and a (text, position) list
+    for the rare timestamps that are not 'YYYY-MM-DD HH:MM:SS'. Kept in sync
+    through reset(), add_rows() and replace_rows() like the other views;
+    rows taken out by remove_rows() stay in the table but are never returned.
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def reset(self, rows):
+        self.table = CompactTable()
+        self.hash_indexes = {column: {} for column in INDEXED_COLUMNS}
+        self.time_seconds = array('q')
+        self.time_positions = array('q')
+        self.other_times = []
+        self.size = 0
+        self.superseded = set()
+        self.add_rows(rows)
+
+    def intern(self, rows):
+        """rows with repeated values shared with the table (see CompactTable.intern)"""
+        return self.table.intern(rows)
+
+    def add_rows(self, rows):
+        for row in rows:
+            position = self.size
+            self.table.append(row)
+            self._index_row(position, row)
+            self.size += 1
+
+    def replace_rows(self, replacements):
+        for position, row in replacements:
+            self._unindex_row(position, self.table.row(position))
+            self.table.replace(position, row)
+            self._index_row(position, row)
+
+    def remove_rows(self, positions):
+        for position in positions:
+            self._unindex_row(position, self.table.row(position))
+            self.superseded.add(position)
+
+    def _index_row(self, position, row):
+        for column, index in _INDEXED:
+            value = row[index]
+            if value is not None:
+                bucket = self.hash_indexes[column].get(value)
+                if bucket is None:
+                    bucket = self.hash_indexes[column][value] = array('q')
+                if not bucket or bucket[-1] < position:
+                    bucket.append(position)
+                else:
+                    bucket.insert(bisect_left(bucket, position), position)
+        times = self.table.columns[TIME_COLUMN]
+        if times.sortable(position):
+            seconds = times.seconds[position]
+            # Rows mostly arrive in time order, so this is usually an append
+            at = self._time_slot(seconds, position)
+            self.time_seconds.insert(at, seconds)
+            self.time_positions.insert(at, position)
+        elif times[position] is not None:
+            insort(self.other_times, (str(times[position]), position))
+
+    def _unindex_row(self, position, row):
+        for column, index in _INDEXED:
+            value = row[index]
+            bucket = self.hash_indexes[column].get(value)
+            if bucket is not None:
+                at = bisect_left(bucket, position)
+                if at < len(bucket) and bucket[at] == position:
+                    del bucket[at]
+                if not bucket:
+                    del self.hash_indexes[column][value]
+        times = self.table.columns[TIME_COLUMN]
+        if times.sortable(position):
+            at = self._time_slot(times.seconds[position], position)
+            if at < len(self.time_positions) and self.time_positions[at] == position:
+                del self.time_seconds[at]
+                del self.time_positions[at]
+        elif times[position] is not None:
+            entry = (str(times[position]), position)
+            at = bisect_left(self.other_times, entry)
+            if at < len(self.other_times) and self.other_times[at] == entry:
+                del self.other_times[at]
+
+    def _time_slot(self, seconds, position):
+        """Index of (seconds, position) in the sorted time arrays"""
+        low = bisect_left(self.time_seconds, seconds)
+        high = bisect_right(self.time_seconds, seconds, low)
+        return bisect_left(self.time_positions, position, low, high)
+
+    def query(self, filters=None, time_from=None, time_to=None, text=None,
+              offset=0, limit=100, fields=None):
+        """
+        Return matching records as dicts, in storage order
+        filters: {column: value} exact matches on INDEXED_COLUMNS
+        time_from/time_to: Inclusive Zeitstempel range ('YYYY-MM-DD[ HH:MM:SS]')
+        text: Case-insensitive substring of Modellbezeichnung
+        fields: Columns to return (default: all)
+        Returns {'total': n, 'offset': offset, 'limit': limit, 'records': [...]}
+        """
+        filters = filters or {}
+        for column in filters:
+            if column not in INDEXED_COLUMNS:
+                raise ValueError(f"Spalte nicht filterbar: {column} "
+                                 f"(erlaubt: {', '.join(INDEXED_COLUMNS)})")
+        fields = fields or HEADERS
+        unknown = [column for column in fields if column not in HEADERS]
+        if unknown:
+            raise ValueError(f"Unbekannte Spalte(n): {', '.join(unknown)}")
+
+        candidates = None
+
+        # Intersect hash buckets, smallest first
+        buckets = sorted(
+            (self.hash_indexes[column].get(value, ()) for column, value in filters.items()),
+            key=len
+        )
+        for bucket in buckets:
+            candidates = set(bucket) if candidates is None else candidates.intersection(bucket)
+            if not candidates:
+                break
+
+        if time_from is not None or time_to is not None:
+            # Bounds compare as text ('YYYY-MM-DD[ HH:MM:SS]'); seconds format
+            # to text in the same order, so the arrays are bisected directly
+            low = (bisect_left(self.time_seconds, time_from, key=format_seconds)
+                   if time_from else 0)
+            # Date-only upper bounds include the whole day
+            high = (bisect_right(self.time_seconds, time_to + '\uffff', key=format_seconds)
+                    if time_to else len(self.time_seconds))
+            in_range = set(self.time_positions[low:high])
+            low = bisect_left(self.other_times, (time_from,)) if time_from else 0
+            high = (bisect_right(self.other_times, (time_to + '\uffff',))
+                    if time_to else len(self.other_times))
+            in_range.update(position for _, position in self.other_times[low:high])
+            candidates = in_range if candidates is None else candidates & in_range
+
+        if candidates is not None:
+            positions = sorted(candidates)
+        elif self.superseded:
+            # Superseded rows are only missing from the indexes, not the table
+            positions = [position for position in range(self.size)
+                         if position not in self.superseded]
+        else:
+            positions = range(self.size)
+
+        if text:
+            needle = text.casefold()
+            texts = self.table.columns[TEXT_COLUMN]
+            positions = [
+                position for position in positions
+                if texts[position] is not None and needle in str(texts[position]).casefold()
+            ]
+
+        total = len(positions)
+        page = positions[offset:offset + limit]
+        records = [
+            {column: record[column] for column in fields}
+            for record in map(self.table.__getitem__, page)
+        ]
+        return {'total': total, 'offset': offset, 'limit': limit, 'records': records}
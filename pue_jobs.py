@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Asynchronous ingestion jobs for the PUE Data Collector
+Payloads are spooled to disk and acknowledged right away; a pool of worker
+threads drains them into the collector and records progress per job
+"""
+
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from pue_dedup import DEDUP_MODES
+from pue_locking import FileLock, atomic_write
+
+
+JOB_FORMATS = ('json', 'csv')
+
+# Per-record errors kept in the job status (the total is always counted)
+MAX_ERRORS = 1000
+
+# Status files of done/failed jobs are deleted this long after the job finished
+FINISHED_TTL_SECONDS = 7 * 24 * 3600
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class JobQueue:
+    """
+    File-backed job queue: <id>.payload holds the submitted body, <id>.json
+    the job status. A worker holds the exclusive lock on <id>.lock while it
+    runs a job, so queues of several processes sharing the directory never
+    run the same job twice. Queued or running jobs whose lock is free (their
+    process stopped) are picked up on startup and resume after the last
+    written chunk. Finished jobs are kept for finished_ttl seconds.
+    """
+
+    def __init__(self, collector, directory='PUE_Jobs', workers=2,
+                 finished_ttl=FINISHED_TTL_SECONDS):
+        self.collector = collector
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.finished_ttl = finished_ttl
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._recover()
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f'pue-job-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, data, format='json', dedup=None):
+        """
+        Validate and spool a payload, then queue it
+        data: str, bytes or a binary file-like object (copied to disk in blocks)
+        Returns the initial job status; raises ValueError for invalid input
+        """
+        if self._stopped:
+            raise RuntimeError("Job-Queue wurde bereits beendet")
+        if format not in JOB_FORMATS:
+            raise ValueError(f"Ungültiges Format: {format}")
+        if dedup is not None and dedup not in DEDUP_MODES:
+            raise ValueError(f"Ungültiger Dedup-Modus: {dedup} (erlaubt: {', '.join(DEDUP_MODES)})")
+
+        job_id = uuid.uuid4().hex
+        payload = self._payload_path(job_id)
+        with open(payload, 'wb') as f:
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        try:
+            self._check_payload(payload, format)
+        except ValueError:
+            payload.unlink()
+            raise
+
+        status = {
+            'id': job_id,
+            'status': 'queued',
+            'format': format,
+            'dedup': dedup,
+            'payload_bytes': payload.stat().st_size,
+            'created': _now(),
+            'started': None,
+            'finished': None,
+            'records_processed': 0,
+            'inserted': 0,
+            'updated': 0,
+            'skipped': 0,
+            'error_count': 0,
+            'errors': [],
+            'error': None
+        }
+        self._save(status)
+        self._queue.put(job_id)
+        return status
+
+    def status(self, job_id):
+        """Current status of a job, or None if it does not exist"""
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            return self._load(job_id)
+        except FileNotFoundError:
+            return None
+
+    def close(self):
+        """Stop the workers after the jobs they are processing"""
+        if self._stopped:
+            return
+        self._stopped = True
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _recover(self):
+        pending = []
+        for path in self.directory.glob('*.json'):
+            try:
+                status = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            if status.get('status') in ('queued', 'running'):
+                # A held lock means another worker is running the job
+                with self._lock(status['id']).claim() as claimed:
+                    if claimed:
+                        pending.append(status)
+        self._expire_finished()
+        for status in sorted(pending, key=lambda s: s['created']):
+            print(f"✓ Job {status['id']} wird fortgesetzt "
+                  f"(ab Datensatz {status['records_processed']})")
+            self._queue.put(status['id'])
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._process(job_id)
+            except Exception as e:
+                print(f"✗ Job {job_id} fehlgeschlagen: {e}")
+
+    def _process(self, job_id):
+        with self._lock(job_id).claim() as claimed:
+            if not claimed:
+                return
+            try:
+                status = self._load(job_id)
+            except FileNotFoundError:
+                return
+            # Another process may have run the job since it was queued here
+            if status['status'] in ('queued', 'running'):
+                self._run_job(status)
+        self._lock_path(job_id).unlink(missing_ok=True)
+        self._expire_finished()
+
+    def _run_job(self, status):
+        job_id = status['id']
+        status['status'] = 'running'
+        status['started'] = status['started'] or _now()
+        self._save(status)
+
+        # Counts of an interrupted earlier run are carried over
+        base = {key: status[key] for key in ('inserted', 'updated', 'skipped')}
+        errors = list(status['errors'])
+        dropped = status['error_count'] - len(errors)
+
+        def update_errors():
+            status['error_count'] = dropped + len(errors)
+            status['errors'] = errors[:MAX_ERRORS]
+
+        def progress(processed, totals):
+            status['records_processed'] = processed
+            for key, count in totals.items():
+                status[key] = base[key] + count
+            update_errors()
+            self._save(status)
+
+        try:
+            with open(self._payload_path(job_id), 'rb') as f:
+                self.collector.ingest(
+                    f, format=status['format'], dedup=status['dedup'],
+                    start=status['records_processed'], errors=errors, on_progress=progress
+                )
+            status['status'] = 'done'
+        except Exception as e:
+            status['status'] = 'failed'
+            status['error'] = f"{type(e).__name__}: {e}"
+
+        update_errors()
+        status['finished'] = _now()
+        self._save(status)
+        self._payload_path(job_id).unlink(missing_ok=True)
+
+    @staticmethod
+    def _check_payload(payload, format):
+        """Cheap up-front validation - full parsing happens in the worker"""
+        with open(payload, 'rb') as f:
+            head = f.read(4096).decode('utf-8-sig', errors='ignore').lstrip()
+        if not head:
+            raise ValueError("Keine Daten empfangen")
+        if format == 'json' and head[0] not in '[{':
+            raise ValueError("JSON muss ein Array oder Objekt sein")
+
+    def _payload_path(self, job_id):
+        return self.directory / f'{job_id}.payload'
+
+    def _lock_path(self, job_id):
+        return self.directory / f'{job_id}.lock'
+
+    def _lock(self, job_id):
+        return FileLock(self._lock_path(job_id))
+
+    def _expire_finished(self):
+        """Delete status files of jobs that finished more than finished_ttl ago"""
+        # The last save of a job is its final status, so the mtime is its end
+        cutoff = time.time() - self.finished_ttl
+        for path in self.directory.glob('*.json'):
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                status = json.loads(path.read_text(encoding='utf-8'))
+                if status.get('status') in ('done', 'failed'):
+                    path.unlink()
+            except (OSError, ValueError):
+                continue
+
+    def _load(self, job_id):
+        with open(self.directory / f'{job_id}.json', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, status):
+        # Replaced atomically, so readers never see a half-written status
+        with atomic_write(self.directory / f"{status['id']}.json", 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False)
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the shared job queue, creating it (and the collector) on first use"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                from pue_data_collector import get_collector
+                _job_queue = JobQueue(
+                    get_collector(),
+                    directory=os.environ.get('PUE_JOB_DIR', 'PUE_Jobs'),
+                    workers=int(os.environ.get('PUE_JOB_WORKERS', '2')),
+                    finished_ttl=float(os.environ.get('PUE_JOB_TTL_HOURS', '168')) * 3600
+                )
+    return _job_queue
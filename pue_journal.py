@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Write-Ahead Journal for the PUE Data Collector
+Append-only JSONL log that buffers rows until they are folded into Excel
+"""
+
+import json
+import os
+from pathlib import Path
+
+from pue_locking import atomic_write
+
+
+class WriteAheadJournal:
+    """
+    Append-only journal of worksheet rows.
+
+    Every line is either a row (JSON list in header order), an in-place
+    replacement of an existing row ({"update": [<position>, <row>]}) or a
+    compaction marker ({"compact": {"base": <rows in Excel before>, "rows": <n>,
+    "size": <journal bytes folded>}}) that is written right before the new
+    workbook is renamed into place. The marker lets recover() tell after a
+    crash whether the workbook already contains the journaled rows; entries
+    appended after the compaction's snapshot are kept. Updates are idempotent
+    and simply re-applied. Callers serialize writes (see ExcelStore.file_lock).
+    """
+
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self.pending_rows = 0
+        self.pending_updates = 0
+        self.pending_bytes = 0
+
+    def recover(self, excel_row_count):
+        """
+        Drop entries that were already folded into Excel before a crash
+        excel_row_count: callable returning the number of data rows currently
+                         in the workbook - only called if the journal holds a
+                         compaction marker, so a normal start never reads the workbook
+        """
+        path = Path(self.journal_file)
+        if not path.exists():
+            return
+
+        entries, marker, marker_at = self._read_entries()
+        if marker is not None:
+            folded = marker['base'] + marker['rows'] <= excel_row_count()
+            entries = entries[marker_at:] if folded else entries
+            self._rewrite(entries)
+
+        rows, updates = self._split(entries)
+        self.pending_rows = len(rows)
+        self.pending_updates = len(updates)
+        self.pending_bytes = path.stat().st_size
+
+    def append(self, rows):
+        """Append rows and flush them to disk - O(batch), independent of file size"""
+        self._append_entries(rows)
+        self.pending_rows += len(rows)
+
+    def append_updates(self, updates):
+        """Append (position, row) replacements of already stored rows"""
+        self._append_entries({'update': [position, row]} for position, row in updates)
+        self.pending_updates += len(updates)
+
+    def read(self):
+        """Return (rows, updates) not yet in Excel; updates are (position, row) in order"""
+        if not Path(self.journal_file).exists():
+            return [], []
+        return self._split(self._read_entries()[0])
+
+    def read_rows(self):
+        """Return all journaled rows that are not yet in Excel"""
+        return self.read()[0]
+
+    def snapshot(self):
+        """Return (rows, updates, size): the entries of the first size bytes"""
+        if not Path(self.journal_file).exists():
+            return [], [], 0
+        with open(self.journal_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            data = f.read(size)
+        rows, updates = self._split(self._parse(data.splitlines())[0])
+        return rows, updates, size
+
+    def mark_compacting(self, base_row_count, row_count, size=None):
+        """
+        Record that row_count rows are about to be saved after base_row_count rows
+        size: Journal bytes folded into the workbook (default: all entries so far)
+        """
+        marker = {'compact': {'base': base_row_count, 'rows': row_count}}
+        if size is not None:
+            marker['compact']['size'] = size
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(marker) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def truncate(self, size):
+        """Drop the first size bytes (folded into Excel), keeping later entries"""
+        with open(self.journal_file, 'rb') as f:
+            f.seek(size)
+            tail = f.read()
+        entries, lines = self._parse(tail.splitlines(keepends=True))
+        if not entries:
+            self.clear()
+            return
+        with atomic_write(self.journal_file) as f:
+            f.write(b''.join(lines))
+        rows, updates = self._split(entries)
+        self.pending_rows = len(rows)
+        self.pending_updates = len(updates)
+        self.pending_bytes = sum(len(line) for line in lines)
+
+    def clear(self):
+        """Remove the journal after its rows were saved into Excel"""
+        Path(self.journal_file).unlink(missing_ok=True)
+        self.pending_rows = 0
+        self.pending_updates = 0
+        self.pending_bytes = 0
+
+    def _append_entries(self, entries):
+        lines = ''.join(
+            json.dumps(entry, ensure_ascii=False, default=str) + '\n' for entry in entries
+        )
+        if not lines:
+            return
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending_bytes += len(lines.encode('utf-8'))
+
+    def _read_entries(self):
+        entries = []
+        starts = []
+        marker = None
+        marker_at = 0
+        position = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                start = position
+                position += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from an interrupted append - never acknowledged
+                    break
+                if isinstance(entry, dict) and 'compact' in entry:
+                    marker = entry['compact']
+                    marker_at = len(entries)
+                else:
+                    entries.append(entry)
+                    starts.append(start)
+        if marker is not None and 'size' in marker:
+            # Entries appended after the compaction's snapshot precede its marker
+            marker_at = sum(1 for start in starts if start < marker['size'])
+        return entries, marker, marker_at
+
+    @staticmethod
+    def _parse(lines):
+        """(entries, their lines) of journal lines - markers skipped, stops at a torn line"""
+        entries = []
+        kept = []
+        for line in lines:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            try:
+                entry = json.loads(stripped)
+            except json.JSONDecodeError:
+                break
+            if isinstance(entry, dict) and 'compact' in entry:
+                continue
+            entries.append(entry)
+            kept.append(line)
+        return entries, kept
+
+    @staticmethod
+    def _split(entries):
+        rows = []
+        updates = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                position, row = entry['update']
+                updates.append((position, row))
+            else:
+                rows.append(entry)
+        return rows, updates
+
+    def _rewrite(self, entries):
+        with atomic_write(self.journal_file, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
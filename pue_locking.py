@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Cross-process file locking and atomic saves for the PUE Data Collector
+FileLock is a reader/writer lock (fcntl.flock on a <file>.lock sidecar) shared
+by every process on the host; files are saved to a temp file, fsynced and
+renamed over the original, so readers only ever see the old or the new version
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the lock only excludes threads of this process
+    fcntl = None
+
+from pue_metrics import span
+
+
+# Locks held by the current thread: {path: {'exclusive': bool, 'depth': int}}
+_held = threading.local()
+
+# Fallback without fcntl: one re-entrant lock per path
+_process_locks = {}
+_process_locks_guard = threading.Lock()
+
+
+class FileLock:
+    """
+    Reader/writer lock on path, shared by all processes and threads using it.
+    Re-entrant per thread: while holding the exclusive lock a thread may take
+    either lock again; taking the exclusive lock while holding only the shared
+    one raises RuntimeError (flock cannot upgrade atomically).
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def shared(self):
+        """Context manager: readers exclude writers, not each other"""
+        return self._acquire(exclusive=False)
+
+    def exclusive(self):
+        """Context manager: a single writer, no readers"""
+        return self._acquire(exclusive=True)
+
+    def claim(self):
+        """
+        Context manager: the exclusive lock if nobody holds it right now,
+        without waiting - yields True if it was taken, False otherwise
+        """
+        return self._acquire(exclusive=True, blocking=False)
+
+    @contextmanager
+    def _acquire(self, exclusive, blocking=True):
+        held = getattr(_held, 'locks', None)
+        if held is None:
+            held = _held.locks = {}
+        state = held.get(self.path)
+        if state is not None:
+            if exclusive and not state['exclusive']:
+                raise RuntimeError(f"Lesesperre auf {self.path} kann nicht zur Schreibsperre werden")
+            state['depth'] += 1
+            try:
+                yield True
+            finally:
+                state['depth'] -= 1
+            return
+
+        with span('lock'):
+            release = self._lock(exclusive, blocking)
+        if release is None:
+            yield False
+            return
+        held[self.path] = {'exclusive': exclusive, 'depth': 1}
+        try:
+            yield True
+        finally:
+            del held[self.path]
+            release()
+
+    def _lock(self, exclusive, blocking=True):
+        """Release function of the acquired lock, None if not blocking and busy"""
+        if fcntl is None:
+            with _process_locks_guard:
+                lock = _process_locks.setdefault(self.path, threading.RLock())
+            if not lock.acquire(blocking):
+                return None
+            return lock.release
+
+        # A descriptor per acquisition: flock then also excludes other threads
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(fd, operation if blocking else operation | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+
+        def release():
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        return release
+
+
+def temp_path(path):
+    """Temp file next to path, unique per process and thread"""
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+def remove_stale_temp_files(path):
+    """Delete temp files of path left behind by processes that no longer run"""
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + '.'
+    for name in os.listdir(directory):
+        if not (name.startswith(prefix) and name.endswith('.tmp')):
+            continue
+        pid = name[len(prefix):-len('.tmp')].split('-')[0]
+        if pid.isdigit() and not _process_alive(int(pid)):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def _process_alive(pid):
+    # On Windows os.kill() would terminate the process: keep the file
+    if pid == os.getpid() or os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Runs under another user
+        return True
+    return True
+
+
+def replace_file(tmp_path, path):
+    """Make a fully written temp file durable and rename it over path"""
+    fd = os.open(tmp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+
+
+@contextmanager
+def atomic_write(path, mode='wb', encoding=None):
+    """Yield a temp file that replaces path once the block completes"""
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+        replace_file(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _fsync_directory(path):
+    """Persist the rename itself (not supported on Windows)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Hot-path instrumentation for the PUE Data Collector
+Timing spans, counters, gauges and histograms rendered in the Prometheus
+text format (GET /metrics), plus per-request span totals for Server-Timing
+"""
+
+import contextvars
+import io
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Span totals of the current request (None outside a request)
+_request_spans = contextvars.ContextVar('pue_request_spans', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: Labels {sorted(labels)} erwartet {list(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, *extra):
+        return list(zip(self.labelnames, key)) + list(extra)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, set explicitly before rendering"""
+    type = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts plus sum and count per label set"""
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'buckets': [0] * len(self.buckets),
+                                             'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, dict(s, buckets=list(s['buckets'])))
+                            for key, s in self.series.items())
+        for key, s in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, s['buckets']):
+                cumulative += count
+                yield f'{self.name}_bucket', self._labels(key, ('le', _format_value(bound))), cumulative
+            yield f'{self.name}_sum', self._labels(key), s['sum']
+            yield f'{self.name}_count', self._labels(key), s['count']
+
+
+class MetricsRegistry:
+    """Named metrics in registration order, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metrik {name} ist bereits als {metric.type} registriert")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = MetricsRegistry()
+
+PHASE_SECONDS = registry.histogram(
+    'pue_phase_seconds', 'Duration of collector phases (parse, map, dedup, journal, snapshot, lock, load, save, summary)',
+    ('phase',)
+)
+RECORDS_INGESTED = registry.counter(
+    'pue_records_ingested_total', 'Ingested records by outcome', ('result',)
+)
+BYTES_PARSED = registry.counter(
+    'pue_bytes_parsed_total', 'Bytes of JSON/CSV input read by the parsers'
+)
+HTTP_SECONDS = registry.histogram(
+    'pue_http_request_seconds', 'Duration of HTTP requests', ('endpoint', 'method', 'status')
+)
+
+
+@contextmanager
+def span(phase):
+    """Time a phase into pue_phase_seconds and the current request's totals"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.observe(elapsed, phase=phase)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans[phase] = spans.get(phase, 0.0) + elapsed
+
+
+def start_request():
+    """Begin collecting span totals for the current request, returns a token"""
+    return _request_spans.set({})
+
+
+def finish_request(token):
+    """Stop collecting and return {phase: seconds} for the request"""
+    spans = _request_spans.get()
+    _request_spans.reset(token)
+    return spans or {}
+
+
+def add_spans(spans):
+    """Add span totals measured on another thread (e.g. the group-commit writer) to the current request's"""
+    current = _request_spans.get()
+    if current is not None:
+        for phase, seconds in spans.items():
+            current[phase] = current.get(phase, 0.0) + seconds
+
+
+def server_timing(spans, total=None):
+    """Format span totals as a Server-Timing header value"""
+    entries = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in spans.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class CountingReader(io.RawIOBase):
+    """Binary stream wrapper adding every byte read to BYTES_PARSED"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        BYTES_PARSED.inc(size)
+        return size
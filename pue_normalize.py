@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Numeric normalization for the PUE Data Collector
+Parses "100 kVA", "102 kW", "96.5%" style strings into typed float columns
+with vectorized pandas string operations, one batch at a time (small batches
+row by row with the same rules)
+"""
+
+import hashlib
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+from pue_storage import HEADERS
+
+
+# Value with optional decimal comma, followed by an optional unit
+_VALUE_PATTERN = r'(?P<value>[-+]?\d+(?:[.,]\d+)?)\s*(?P<unit>%|[kKM]?(?:VA|va|W|w)\b)?'
+
+# Unit -> factor to kW / kVA
+_POWER_FACTORS = {
+    'w': 0.001, 'kw': 1.0, 'mw': 1000.0,
+    'va': 0.001, 'kva': 1.0, 'mva': 1000.0,
+}
+
+# Normalized column -> (source column, kind)
+NUMERIC_COLUMNS = {
+    'Nennleistung_kW': ('Nennleistung', 'kW'),
+    'Nennleistung_kVA': ('Nennleistung', 'kVA'),
+    'Kühlleistung_kW': ('Kühlleistung', 'kW'),
+    'Aufnahmeleistung_kW': ('Elektrische Aufnahmeleistung', 'kW'),
+    'Wirkungsgrad': ('Wirkungsgrad_oder_Verlustleistung', 'fraction'),
+    'Verlustleistung_kW': ('Wirkungsgrad_oder_Verlustleistung', 'kW'),
+    'COP_EER_IPLV_Wert': ('COP_EER_IPLV', 'number'),
+    'Teillast_25': ('Teillast_25%', 'fraction'),
+    'Teillast_50': ('Teillast_50%', 'fraction'),
+    'Teillast_75': ('Teillast_75%', 'fraction'),
+    'Teillast_100': ('Teillast_100%', 'fraction'),
+}
+
+# Categorical columns kept next to the numbers for grouping
+KEY_COLUMNS = ('Hersteller', 'Produktkategorie')
+
+# Batches up to this size are normalized row by row: pandas' fixed cost per
+# call dominates single inserts
+SMALL_BATCH = 64
+
+_SOURCE_INDEXES = {
+    column: HEADERS.index(column)
+    for column in {source for source, _ in NUMERIC_COLUMNS.values()} | set(KEY_COLUMNS)
+}
+
+# Cells the numeric columns are parsed from, in HEADERS order
+_HASHED_INDEXES = sorted({HEADERS.index(source) for source, _ in NUMERIC_COLUMNS.values()})
+# Part of every source hash, so persisted values are recomputed once the rules change
+_HASH_KEY = hashlib.blake2b(
+    repr((_VALUE_PATTERN, NUMERIC_COLUMNS, _POWER_FACTORS)).encode('utf-8'), digest_size=16
+).digest()
+
+
+def _parse(series):
+    """Split a column of raw values into float values and lowercase units"""
+    text = series.astype('string').str.strip()
+    parts = text.str.extract(_VALUE_PATTERN)
+    values = pd.to_numeric(parts['value'].str.replace(',', '.', regex=False), errors='coerce')
+    units = parts['unit'].str.lower()
+    return values.to_numpy(dtype='float64', na_value=np.nan), units
+
+
+def normalize_frame(df):
+    """
+    Vectorized normalization of a DataFrame with the original columns
+    Returns a DataFrame with one float64 column per NUMERIC_COLUMNS entry
+    (NaN where a value is missing or has a different unit)
+    """
+    parsed = {}
+    result = {}
+    for target, (source, kind) in NUMERIC_COLUMNS.items():
+        if source not in parsed:
+            parsed[source] = _parse(df[source])
+        values, units = parsed[source]
+
+        if kind in ('kW', 'kVA'):
+            # Active power units end in 'w', apparent power units in 'va'
+            suffix = 'w' if kind == 'kW' else 'va'
+            matches = units.str.endswith(suffix).fillna(False).to_numpy(dtype=bool)
+            factors = units.map(_POWER_FACTORS).to_numpy(dtype='float64', na_value=np.nan)
+            result[target] = np.where(matches, values * factors, np.nan)
+        elif kind == 'fraction':
+            percent = (units == '%').fillna(False).to_numpy(dtype=bool)
+            unitless = units.isna().to_numpy(dtype=bool)
+            # Bare numbers above 1 are percentages written without the sign
+            column = np.where(percent | (unitless & (values > 1)), values / 100.0, values)
+            result[target] = np.where(percent | unitless, column, np.nan)
+        else:
+            result[target] = np.where(units.isna().to_numpy(dtype=bool), values, np.nan)
+
+    return pd.DataFrame(result, index=df.index)
+
+
+_value_regex = re.compile(_VALUE_PATTERN)
+
+
+def _parse_value(value):
+    """(float value, lowercase unit or None) of one cell, as _parse does for a column"""
+    if value is None or (value.__class__ is float and math.isnan(value)):
+        return math.nan, None
+    match = _value_regex.search(str(value).strip())
+    if match is None:
+        return math.nan, None
+    number = match.group('value')
+    unit = match.group('unit')
+    unit = unit.lower() if unit else None
+    # pd.to_numeric only accepts ASCII digits (\d also matches e.g. Arabic ones)
+    if not number.isascii():
+        return math.nan, unit
+    return float(number.replace(',', '.')), unit
+
+
+def normalize_rows(rows):
+    """
+    normalize_frame() for a few rows without pandas: {column: list of floats}
+    rows: Sequences indexed like HEADERS
+    """
+    result = {}
+    parsed = {}
+    for target, (source, kind) in NUMERIC_COLUMNS.items():
+        if source not in parsed:
+            index = _SOURCE_INDEXES[source]
+            parsed[source] = [_parse_value(row[index]) for row in rows]
+        column = []
+        for value, unit in parsed[source]:
+            if kind in ('kW', 'kVA'):
+                suffix = 'w' if kind == 'kW' else 'va'
+                if unit is not None and unit.endswith(suffix):
+                    value *= _POWER_FACTORS.get(unit, math.nan)
+                else:
+                    value = math.nan
+            elif kind == 'fraction':
+                if unit == '%' or (unit is None and value > 1):
+                    value /= 100.0
+                elif unit is not None:
+                    value = math.nan
+            elif unit is not None:
+                value = math.nan
+            column.append(value)
+        result[target] = column
+    return result
+
+
+def source_hashes(rows):
+    """int64 hash per row of the cells normalize_rows() reads (and of its rules)"""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b('\x1f'.join([str(row[index]) for index in _HASHED_INDEXES])
+                                        .encode('utf-8'), digest_size=8, key=_HASH_KEY).digest(),
+                        'little', signed=True)
+         for row in rows),
+        dtype=np.int64, count=len(rows)
+    )
+
+
+class NumericColumns:
+    """
+    Typed float64 arrays (one per NUMERIC_COLUMNS entry) indexed by row
+    position, plus the grouping columns. Every batch of inserted rows is
+    normalized with one vectorized pass and written into preallocated
+    arrays, so analytics are plain NumPy/pandas operations.
+    With a store, the values of every normalized batch are persisted next to
+    the rows together with a hash of their source cells (store.save_numeric);
+    reset() takes each row whose cells still hash the same from there and
+    only normalizes the rest.
+    """
+
+    def __init__(self, store=None):
+        self.store = store if hasattr(store, 'save_numeric') else None
+        self.reset([])
+
+    def reset(self, rows):
+        self.size = 0
+        self._capacity = 0
+        self.arrays = {column: np.empty(0) for column in NUMERIC_COLUMNS}
+        self.hashes = np.empty(0, dtype=np.int64)
+        self.keys = {column: [] for column in KEY_COLUMNS}
+        self.superseded = set()
+        if not rows:
+            return
+
+        size = len(rows)
+        self._reserve(size)
+        self.hashes[:size] = source_hashes(rows)
+        missing = np.ones(size, dtype=bool)
+        stored = self.store.load_numeric(list(NUMERIC_COLUMNS)) if self.store else None
+        if stored is not None:
+            positions, hashes, values = stored
+            inside = positions < size
+            positions, hashes, values = positions[inside], hashes[inside], values[inside]
+            current = self.hashes[positions] == hashes
+            positions, values = positions[current], values[current]
+            for index, column in enumerate(NUMERIC_COLUMNS):
+                self.arrays[column][positions] = values[:, index]
+            missing[positions] = False
+
+        positions = np.flatnonzero(missing)
+        if len(positions):
+            normalized = self._normalize([rows[position] for position in positions])
+            for column in NUMERIC_COLUMNS:
+                self.arrays[column][positions] = normalized[column]
+        for column in KEY_COLUMNS:
+            index = _SOURCE_INDEXES[column]
+            self.keys[column] = [row[index] for row in rows]
+        self.size = size
+        self._save(positions)
+
+    def add_rows(self, rows):
+        if not rows:
+            return
+        normalized = self._normalize(rows)
+        start, end = self.size, self.size + len(rows)
+        self._reserve(end)
+        for column in NUMERIC_COLUMNS:
+            self.arrays[column][start:end] = normalized[column]
+        self.hashes[start:end] = source_hashes(rows)
+        for column in KEY_COLUMNS:
+            index = _SOURCE_INDEXES[column]
+            self.keys[column].extend(row[index] for row in rows)
+        self.size = end
+        self._save(np.arange(start, end))
+
+    def replace_rows(self, replacements):
+        if not replacements:
+            return
+        positions = np.fromiter((position for position, _ in replacements), dtype=np.int64)
+        rows = [row for _, row in replacements]
+        normalized = self._normalize(rows)
+        for column in NUMERIC_COLUMNS:
+            self.arrays[column][positions] = normalized[column]
+        self.hashes[positions] = source_hashes(rows)
+        for column in KEY_COLUMNS:
+            index = _SOURCE_INDEXES[column]
+            for position, row in replacements:
+                self.keys[column][position] = row[index]
+        self._save(positions)
+
+    def _save(self, positions):
+        """Persist the values at positions, if there is a store to keep them"""
+        if self.store is None or not len(positions):
+            return
+        values = np.column_stack([self.arrays[column][positions] for column in NUMERIC_COLUMNS])
+        self.store.save_numeric(list(NUMERIC_COLUMNS), positions, self.hashes[positions], values)
+
+    def remove_rows(self, positions):
+        """Blank superseded rows: NaN values and no group, left out of frame()"""
+        if not positions:
+            return
+        self.superseded.update(positions)
+        for column in NUMERIC_COLUMNS:
+            self.arrays[column][list(positions)] = np.nan
+        for column in KEY_COLUMNS:
+            for position in positions:
+                self.keys[column][position] = None
+
+    def frame(self):
+        """DataFrame of the normalized columns plus Hersteller/Produktkategorie"""
+        data = {column: self.keys[column] for column in KEY_COLUMNS}
+        data.update({column: array[:self.size] for column, array in self.arrays.items()})
+        frame = pd.DataFrame(data)
+        if self.superseded:
+            frame = frame.drop(index=sorted(self.superseded))
+        return frame
+
+    def _normalize(self, rows):
+        """{column: values} - a DataFrame for large batches, lists for small ones"""
+        if len(rows) <= SMALL_BATCH:
+            return normalize_rows(rows)
+        sources = {
+            column: [row[index] for row in rows]
+            for column, index in _SOURCE_INDEXES.items()
+        }
+        return normalize_frame(pd.DataFrame(sources, dtype=object)).to_dict('series')
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2, 1024)
+        for column, array in self.arrays.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self.size] = array[:self.size]
+            self.arrays[column] = grown
+        hashes = np.zeros(capacity, dtype=np.int64)
+        hashes[:self.size] = self.hashes[:self.size]
+        self.hashes = hashes
+        self._capacity = capacity
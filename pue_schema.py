@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Declarative schema of the Geräte worksheet
+The schema is compiled once into a generated mapping function that turns a
+GPT record into a worksheet row, checks types and required fields and notes
+problems in Verarbeitungsfehler instead of rejecting the record
+"""
+
+from operator import itemgetter
+
+from pue_storage import HEADERS
+
+
+# Field kinds
+TEXT = 'text'      # str; numbers are stored as text
+VALUE = 'value'    # str or number (values with units, percentages, page numbers)
+LIST = 'list'      # list of str (joined with ', ') or a str
+
+# (column, path in the GPT record, kind, required) in HEADERS order;
+# Zeitstempel is set by the collector
+GERAETE_SCHEMA = (
+    ('Hersteller', ('Hersteller',), TEXT, True),
+    ('Produktkategorie', ('Produktkategorie',), TEXT, True),
+    ('Produktfamilie', ('Produktfamilie',), TEXT, False),
+    ('Modellbezeichnung', ('Modellbezeichnung',), TEXT, True),
+    ('Nennleistung', ('Nennleistung',), VALUE, False),
+    ('Kühlleistung', ('Kühlleistung',), VALUE, False),
+    ('Elektrische Aufnahmeleistung', ('Elektrische Aufnahmeleistung',), VALUE, False),
+    ('Wirkungsgrad_oder_Verlustleistung', ('Wirkungsgrad_oder_Verlustleistung',), VALUE, False),
+    ('COP_EER_IPLV', ('COP_EER_IPLV',), VALUE, False),
+    ('Teillast_25%', ('Teillastdaten', '25%'), VALUE, False),
+    ('Teillast_50%', ('Teillastdaten', '50%'), VALUE, False),
+    ('Teillast_75%', ('Teillastdaten', '75%'), VALUE, False),
+    ('Teillast_100%', ('Teillastdaten', '100%'), VALUE, False),
+    ('Betriebsbedingungen', ('Betriebsbedingungen',), TEXT, False),
+    ('Quelle_Dateiname', ('Quelle', 'Dateiname'), TEXT, False),
+    ('Quelle_Seitenzahl', ('Quelle', 'Seitenzahl'), VALUE, False),
+    ('Quelle_Zitat', ('Quelle', 'Zitat'), TEXT, False),
+    ('Fehlende_Angaben', ('Fehlende_Angaben',), LIST, False),
+    ('Verarbeitungsfehler', ('Verarbeitungsfehler',), TEXT, False),
+)
+
+_ERROR_COLUMN = 'Verarbeitungsfehler'
+
+# Classes accepted without further checks (bool is a subclass of int, not listed)
+_VALUE_TYPES = frozenset((str, int, float, type(None)))
+_TEXT_TYPES = frozenset((str, type(None)))
+_LIST_TYPES = frozenset((str,))
+
+# Accepted classes and slow-path check per field kind
+_CHECKS = {
+    TEXT: ('_TEXT_TYPES', '_text'),
+    VALUE: ('_VALUE_TYPES', '_value'),
+    LIST: ('_LIST_TYPES', '_list'),
+}
+
+_EMPTY = {}
+
+
+def _describe(value):
+    text = repr(value)
+    return text if len(text) <= 40 else text[:37] + '...'
+
+
+def _text(value, column, problems):
+    """Slow path of TEXT fields: numbers become text, anything else is dropped"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, str):
+        return str(value)
+    problems.append(f"{column}: Text erwartet, {type(value).__name__} erhalten ({_describe(value)})")
+    return None
+
+
+def _value(value, column, problems):
+    """Slow path of VALUE fields (str/number subclasses are accepted)"""
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    problems.append(f"{column}: Wert erwartet, {type(value).__name__} erhalten ({_describe(value)})")
+    return None
+
+
+def _list(value, column, problems):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        if all(isinstance(item, str) for item in value):
+            return ', '.join(value)
+        problems.append(f"{column}: Liste von Texten erwartet")
+        return ', '.join(str(item) for item in value if item is not None)
+    problems.append(f"{column}: Liste erwartet, {type(value).__name__} erhalten ({_describe(value)})")
+    return ''
+
+
+def _group(value, name, problems):
+    """Nested objects (Teillastdaten, Quelle) must be objects or empty"""
+    if value is None:
+        return _EMPTY
+    if isinstance(value, dict):
+        return value
+    problems.append(f"{name}: Objekt erwartet, {type(value).__name__} erhalten ({_describe(value)})")
+    return _EMPTY
+
+
+def _not_a_record(record):
+    return ValueError(f"Datensatz ist kein Objekt ({type(record).__name__})")
+
+
+def _with_problems(existing, problems):
+    """Append schema problems to the record's own Verarbeitungsfehler"""
+    message = '; '.join(problems)
+    return f"{existing}; {message}" if existing else message
+
+
+def _checked_source(schema, columns):
+    """map_checked: field-by-field dict.get with a check per field"""
+    lines = [
+        'def map_checked(record, timestamp):',
+        '    if not isinstance(record, dict):',
+        '        raise _not_a_record(record)',
+        '    get = record.get',
+        '    problems = []',
+    ]
+    groups = {}
+    for index, (column, path, kind, required) in enumerate(schema):
+        source = 'get'
+        if len(path) > 1:
+            parent = path[0]
+            if parent not in groups:
+                groups[parent] = f'g{len(groups)}'
+                lines += [
+                    f'    {groups[parent]} = _group(get({parent!r}), {parent!r}, problems)',
+                ]
+            source = f'{groups[parent]}.get'
+        name = f'v{index}'
+        lines += [f'    {name} = {source}({path[-1]!r})',
+                  f'    if {name}.__class__ not in {_CHECKS[kind][0]}:',
+                  f'        {name} = {_CHECKS[kind][1]}({name}, {column!r}, problems)']
+        if required:
+            lines += [f'    if not {name}:',
+                      f'        problems.append("Pflichtfeld fehlt: {column}")']
+
+    error_name = f'v{columns.index(_ERROR_COLUMN)}'
+    lines += [
+        '    if problems:',
+        f'        {error_name} = _with_problems({error_name}, problems)',
+        f"    return [{', '.join(f'v{index}' for index in range(len(schema)))}, timestamp]",
+    ]
+    return lines
+
+
+def _fast_source(schema, getters):
+    """
+    map_record: all fields fetched with operator.itemgetter and checked in a
+    single expression; records with missing keys, unexpected types or empty
+    required fields fall back to map_checked
+    """
+    top = {}
+    nested = {}
+    for index, (column, path, kind, required) in enumerate(schema):
+        if len(path) == 1:
+            top[path[0]] = f'v{index}'
+        else:
+            top.setdefault(path[0], f'g{len(nested)}')
+            nested.setdefault(path[0], {})[path[1]] = f'v{index}'
+
+    def fetch(getter, keys, names, source):
+        getters[getter] = itemgetter(*keys)
+        # itemgetter returns a tuple only for more than one key
+        target = ', '.join(names) + (',' if len(names) == 1 else '')
+        call = f'({getter}({source}),)' if len(names) == 1 else f'{getter}({source})'
+        return f'        {target} = {call}'
+
+    lines = ['def map_record(record, timestamp):', '    try:',
+             fetch('_top', list(top), list(top.values()), 'record')]
+    for parent, fields in nested.items():
+        lines.append(fetch(f'_{top[parent]}', list(fields), list(fields.values()), top[parent]))
+
+    checks = []
+    for index, (column, path, kind, required) in enumerate(schema):
+        name = f'v{index}'
+        if kind == LIST:
+            lines += [f'        if {name}.__class__ is list:',
+                      f"            {name} = ', '.join({name})",
+                      f'        elif {name} is None:',
+                      f"            {name} = ''"]
+            checks.append(f'{name}.__class__ is str')
+        elif kind == TEXT and required:
+            checks.append(f'{name}.__class__ is str and {name}')
+        elif kind == TEXT:
+            checks.append(f'({name}.__class__ is str or {name} is None)')
+        else:
+            checks.append(f'({name}.__class__ is str or {name}.__class__ in _VALUE_TYPES)')
+    lines += [
+        '    except (KeyError, TypeError):',
+        '        return map_checked(record, timestamp)',
+        '    if not (' + '\n            and '.join(checks) + '):',
+        '        return map_checked(record, timestamp)',
+        f"    return [{', '.join(f'v{index}' for index in range(len(schema)))}, timestamp]",
+    ]
+    return lines
+
+
+def generate_source(schema=GERAETE_SCHEMA, getters=None):
+    """
+    Python source of the mapping functions for schema (see compile_mapper);
+    the itemgetters it refers to are added to getters
+    """
+    columns = [column for column, *_ in schema]
+    if columns + ['Zeitstempel'] != HEADERS:
+        raise ValueError("Schema passt nicht zu den Spalten der Geräte-Tabelle")
+    for column, path, kind, required in schema:
+        if kind not in _CHECKS:
+            raise ValueError(f"Unbekannter Feldtyp: {kind}")
+        if not 1 <= len(path) <= 2:
+            raise ValueError(f"{column}: Pfad muss ein oder zwei Schlüssel haben")
+    getters = {} if getters is None else getters
+    lines = _checked_source(schema, columns) + [''] + _fast_source(schema, getters)
+    return '\n'.join(lines) + '\n'
+
+
+def compile_mapper(schema=GERAETE_SCHEMA):
+    """
+    Compile schema into map_record(record, timestamp) -> row in HEADERS order
+    Raises ValueError for non-object records; every other problem is noted
+    in the row's Verarbeitungsfehler cell
+    """
+    namespace = {
+        '_TEXT_TYPES': _TEXT_TYPES, '_VALUE_TYPES': _VALUE_TYPES, '_LIST_TYPES': _LIST_TYPES,
+        '_text': _text, '_value': _value, '_list': _list, '_group': _group,
+        '_not_a_record': _not_a_record, '_with_problems': _with_problems,
+    }
+    source = generate_source(schema, namespace)
+    exec(compile(source, '<pue_schema>', 'exec'), namespace)
+    return namespace['map_record']
+
+
+map_record = compile_mapper()
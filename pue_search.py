@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Fuzzy search index for the PUE Data Collector
+Trigram inverted index over Modellbezeichnung, Produktfamilie and Hersteller,
+so near-duplicate spellings ("Galaxy VS 100kVA" / "Galaxy-VS 100 kVA") are
+found in milliseconds without scanning every row
+"""
+
+from array import array
+
+from pue_storage import HEADERS
+
+
+SEARCH_COLUMNS = ('Modellbezeichnung', 'Produktfamilie', 'Hersteller')
+_SEARCHED = [HEADERS.index(column) for column in SEARCH_COLUMNS]
+
+# Default minimum similarity of a match (as pg_trgm's similarity_threshold)
+MIN_SCORE = 0.3
+
+
+def trigrams(text):
+    """
+    Trigrams of text with case, spaces and punctuation removed, padded like
+    pg_trgm (two blanks in front, one behind) so short values still match
+    """
+    compact = ''.join(char for char in str(text).casefold() if char.isalnum())
+    if not compact:
+        return set()
+    padded = f'  {compact} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Every distinct value of the searched columns gets a text id, the inverted
+    index maps trigram -> text ids (array of ints, append-only). Rows refer
+    to the text ids of their fields; a replaced row only moves its position
+    between texts, so texts and postings are never removed - texts no row
+    refers to any more are skipped when ranking.
+    Most texts belong to a single row, so a text holds that row's position
+    as a plain int and only switches to a set once a second row shares it.
+    Kept in sync through reset(), add_rows(), replace_rows() and remove_rows().
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def reset(self, rows):
+        self._text_ids = {}
+        self._texts = []
+        self._sizes = array('q')
+        self._postings = {}
+        self._positions = []   # text id -> position, set of positions or None
+        # Per SEARCH_COLUMNS entry: position -> text id (-1: empty)
+        self._row_texts = [array('q') for _ in SEARCH_COLUMNS]
+        self.add_rows(rows)
+
+    def add_rows(self, rows):
+        for row in rows:
+            position = len(self._row_texts[0])
+            for column, text_id in zip(self._row_texts, self._link(position, row)):
+                column.append(text_id)
+
+    def replace_rows(self, replacements):
+        for position, row in replacements:
+            for column in self._row_texts:
+                if column[position] >= 0:
+                    self._unlink(column[position], position)
+            for column, text_id in zip(self._row_texts, self._link(position, row)):
+                column[position] = text_id
+
+    def remove_rows(self, positions):
+        for position in positions:
+            for column in self._row_texts:
+                if column[position] >= 0:
+                    self._unlink(column[position], position)
+                    column[position] = -1
+
+    def _link(self, position, row):
+        ids = []
+        for index in _SEARCHED:
+            value = row[index]
+            if value is None or value == '':
+                ids.append(-1)
+                continue
+            text_id = self._text_ids.get(value)
+            if text_id is None:
+                text_id = self._add_text(value)
+            held = self._positions[text_id]
+            if held is None:
+                self._positions[text_id] = position
+            elif held.__class__ is int:
+                if held != position:
+                    self._positions[text_id] = {held, position}
+            else:
+                held.add(position)
+            ids.append(text_id)
+        return ids
+
+    def _unlink(self, text_id, position):
+        held = self._positions[text_id]
+        if held.__class__ is int:
+            if held == position:
+                self._positions[text_id] = None
+        elif held is not None:
+            held.discard(position)
+
+    def _rows_of(self, text_id):
+        held = self._positions[text_id]
+        if held is None:
+            return ()
+        return (held,) if held.__class__ is int else sorted(held)
+
+    def _add_text(self, value):
+        text_id = len(self._texts)
+        grams = trigrams(value)
+        self._text_ids[value] = text_id
+        self._texts.append(value)
+        self._sizes.append(len(grams))
+        self._positions.append(None)
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('i')
+            postings.append(text_id)
+        return text_id
+
+    def search(self, query, limit=20, min_score=MIN_SCORE, columns=SEARCH_COLUMNS):
+        """
+        Rows whose searched fields are similar to query, best first
+        similarity = shared trigrams / all trigrams of both (Jaccard, as pg_trgm)
+        columns: Restrict matches to these of SEARCH_COLUMNS
+        Returns [(position, score, column)] - column is the best matching field
+        """
+        # Building the index at startup does not need NumPy
+        import numpy as np
+
+        wanted = [SEARCH_COLUMNS.index(column) for column in columns]
+        grams = trigrams(query)
+        if not grams or not self._texts:
+            return []
+
+        # Hits per text id: one vectorized pass over the posting lists
+        postings = [np.frombuffer(self._postings[gram], dtype=np.intc)
+                    for gram in grams if gram in self._postings]
+        if not postings:
+            return []
+        hits = np.bincount(np.concatenate(postings), minlength=len(self._texts))
+        candidates = np.flatnonzero(hits)
+        sizes = np.frombuffer(self._sizes, dtype=np.int64)[candidates]
+        scores = hits[candidates] / (len(grams) + sizes - hits[candidates])
+        keep = scores >= min_score
+        candidates, scores = candidates[keep], scores[keep]
+        # Most similar texts first, ties by text id (i.e. first seen)
+        order = np.lexsort((candidates, -scores))
+
+        results = []
+        seen = set()
+        for text_id, score in zip(candidates[order].tolist(), scores[order].tolist()):
+            for position in self._rows_of(text_id):
+                if position in seen:
+                    continue
+                matched = [index for index in wanted
+                           if self._row_texts[index][position] == text_id]
+                if not matched:
+                    continue
+                seen.add(position)
+                results.append((position, round(score, 4), SEARCH_COLUMNS[matched[0]]))
+                if len(results) >= limit:
+                    return results
+        return results
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Startup timing for the PUE Data Collector
+Records how long module imports and the deferred collector initialization
+take, so cold-start regressions can be compared per deploy
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Libraries whose import dominates a cold start
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+
+class StartupTimer:
+    """
+    Collects named phases (offset since process start and duration in ms).
+    Import this module first, so its creation time approximates the start
+    of the process.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one startup phase"""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.phases.append({
+                    'name': name,
+                    'start_ms': round((begin - self.started) * 1000, 2),
+                    'duration_ms': round((end - begin) * 1000, 2)
+                })
+
+    def report(self):
+        """Phase breakdown plus which heavy libraries are loaded so far"""
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            'phases': phases,
+            'total_ms': round(sum(phase['duration_ms'] for phase in phases), 2),
+            'uptime_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'heavy_modules_loaded': {name: name in sys.modules for name in HEAVY_MODULES}
+        }
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Incrementally maintained database statistics
+Keeps the get_summary() aggregates in memory so stats calls are O(1)
+"""
+
+from collections import Counter
+
+from pue_storage import HEADERS
+
+
+HERSTELLER = HEADERS.index('Hersteller')
+PRODUKTKATEGORIE = HEADERS.index('Produktkategorie')
+ZEITSTEMPEL = HEADERS.index('Zeitstempel')
+
+
+class StatsAggregate:
+    """
+    Row count, distinct manufacturers/categories, per-category counts and
+    last timestamp. Fed once with all stored rows via reset() and then
+    updated with every batch of new rows via add_rows(). The manufacturer
+    and category of each position are remembered so that replace_rows()
+    can move a replaced row between groups and remove_rows() can take a
+    superseded row out.
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def reset(self, rows):
+        """Rebuild the aggregates from all stored rows"""
+        self.count = 0
+        self.manufacturers = Counter()
+        self.categories = Counter()
+        self.last_update = None
+        self._manufacturer_at = []
+        self._category_at = []
+        self.add_rows(rows)
+
+    def add_rows(self, rows):
+        """Fold newly stored rows into the aggregates"""
+        for row in rows:
+            self.count += 1
+            self._manufacturer_at.append(row[HERSTELLER])
+            self._category_at.append(row[PRODUKTKATEGORIE])
+            self._count_row(row)
+            self._track_timestamp(row)
+
+    def replace_rows(self, replacements):
+        """Apply in-place replacements given as (position, row) pairs"""
+        for position, row in replacements:
+            old_manufacturer = self._manufacturer_at[position]
+            old_category = self._category_at[position]
+            if old_manufacturer is not None:
+                self._decrement(self.manufacturers, old_manufacturer)
+            if old_category is not None:
+                self._decrement(self.categories, old_category)
+
+            self._manufacturer_at[position] = row[HERSTELLER]
+            self._category_at[position] = row[PRODUKTKATEGORIE]
+            self._count_row(row)
+            self._track_timestamp(row)
+
+    def remove_rows(self, positions):
+        """Take out superseded rows (their new version was added as a new row)"""
+        for position in positions:
+            manufacturer = self._manufacturer_at[position]
+            category = self._category_at[position]
+            if manufacturer is not None:
+                self._decrement(self.manufacturers, manufacturer)
+            if category is not None:
+                self._decrement(self.categories, category)
+            self._manufacturer_at[position] = None
+            self._category_at[position] = None
+            self.count -= 1
+
+    def _count_row(self, row):
+        if row[HERSTELLER] is not None:
+            self.manufacturers[row[HERSTELLER]] += 1
+        if row[PRODUKTKATEGORIE] is not None:
+            self.categories[row[PRODUKTKATEGORIE]] += 1
+
+    def _track_timestamp(self, row):
+        timestamp = row[ZEITSTEMPEL]
+        if timestamp is not None:
+            timestamp = str(timestamp)
+            if self.last_update is None or timestamp > self.last_update:
+                self.last_update = timestamp
+
+    @staticmethod
+    def _decrement(counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def summary(self):
+        return {
+            'Gesamtanzahl': self.count,
+            'Hersteller': len(self.manufacturers),
+            'Produktkategorien': len(self.categories),
+            'Letzte_Aktualisierung': self.last_update,
+            'Anzahl_pro_Kategorie': dict(self.categories)
+        }
@@ -0,0 +1,974 @@
+#!/usr/bin/env python3
+"""
+Storage backends for the PUE Data Collector
+ExcelStore keeps the workbook as primary store (with write-ahead journal),
+ShardedExcelStore splits it into monthly or size-limited shards,
+SQLiteStore keeps an indexed table and exports the workbook on demand
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+# openpyxl is imported inside the functions that need it, so importing the
+# stores (e.g. for a serverless cold start) does not pay for it up front
+
+from pue_columnar import ColumnarSnapshot, NumericSnapshot
+from pue_export import write_xlsx
+from pue_journal import WriteAheadJournal
+from pue_locking import FileLock, atomic_write, remove_stale_temp_files, replace_file, temp_path
+from pue_metrics import span
+
+
+# Define headers (matching your GPT configuration)
+HEADERS = [
+    'Hersteller', 'Produktkategorie', 'Produktfamilie',
+    'Modellbezeichnung', 'Nennleistung', 'Kühlleistung',
+    'Elektrische Aufnahmeleistung', 'Wirkungsgrad_oder_Verlustleistung',
+    'COP_EER_IPLV', 'Teillast_25%', 'Teillast_50%', 'Teillast_75%',
+    'Teillast_100%', 'Betriebsbedingungen', 'Quelle_Dateiname',
+    'Quelle_Seitenzahl', 'Quelle_Zitat', 'Fehlende_Angaben',
+    'Verarbeitungsfehler', 'Zeitstempel'
+]
+
+COLUMN_WIDTHS = {
+    'A': 15, 'B': 20, 'C': 20, 'D': 25, 'E': 15, 'F': 15,
+    'G': 20, 'H': 25, 'I': 15, 'J': 12, 'K': 12, 'L': 12,
+    'M': 12, 'N': 30, 'O': 20, 'P': 12, 'Q': 50, 'R': 30,
+    'S': 30, 'T': 20
+}
+
+
+def create_workbook(sheet_name):
+    """Create an empty workbook with formatted headers and column widths"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+
+    # Add headers with formatting
+    for col, header in enumerate(HEADERS, start=1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = Font(bold=True, color='FFFFFF')
+        cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    # Adjust column widths
+    for col, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[col].width = width
+
+    return wb
+
+
+class ExcelStore:
+    """
+    Workbook as primary store, with an append-only journal in front of it.
+    Every process on the host may open the same workbook: journal writes and
+    the commit of a compaction hold an exclusive lock on <excel_file>.lock,
+    readers a shared one only while taking their snapshot. The workbook is
+    always replaced atomically, never rewritten in place. A columnar snapshot
+    (<excel_file>.columns) follows every write, so full reads skip the
+    workbook while it is current; it also holds the typed numeric values
+    (see load_numeric).
+    """
+
+    def __init__(self, excel_file, sheet_name, journal_file=None,
+                 compact_threshold=500, compact_interval=60.0):
+        self.excel_file = excel_file
+        self.sheet_name = sheet_name
+        self.journal_file = journal_file or f'{excel_file}.journal'
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+        self.file_lock = FileLock(f'{excel_file}.lock')
+        self.snapshot = ColumnarSnapshot(f'{excel_file}.columns', len(HEADERS))
+        self.numeric_snapshot = NumericSnapshot(f'{excel_file}.columns')
+        self._lock = threading.RLock()
+
+        with self.file_lock.exclusive():
+            remove_stale_temp_files(self.excel_file)
+            self._initialize_excel()
+            self.journal = WriteAheadJournal(self.journal_file)
+            self.journal.recover(self._excel_row_count)
+            self._seen_signature = self._signature()
+
+        self._bulk = 0
+        self._compact_requested = threading.Event()
+        self._compactor_stop = False
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, name='pue-compactor', daemon=True
+            )
+            self._compactor.start()
+
+    def _initialize_excel(self):
+        """Create Excel file with headers if it doesn't exist"""
+        if not Path(self.excel_file).exists():
+            tmp_path = temp_path(self.excel_file)
+            create_workbook(self.sheet_name).save(tmp_path)
+            replace_file(tmp_path, self.excel_file)
+            print(f"✓ Excel-Datei erstellt: {self.excel_file}")
+
+    def locked(self):
+        """Exclusive lock across processes, e.g. around read-modify-write of the collector"""
+        return self.file_lock.exclusive()
+
+    def append(self, rows):
+        """Append rows to the journal - the workbook is only rewritten by compact()"""
+        with self.file_lock.exclusive(), self._lock:
+            before = self._signature()
+            unchanged = before == self._seen_signature
+            with span('journal'):
+                self.journal.append(rows)
+            with span('snapshot'):
+                self.snapshot.append(rows, before, self._signature())
+            due = self._after_journal_write(unchanged)
+        if due:
+            self._request_compaction()
+
+    def replace(self, replacements):
+        """
+        Replace stored rows in place
+        replacements: (position, row) pairs, position counts non-empty data rows from 0
+        """
+        with self.file_lock.exclusive(), self._lock:
+            before = self._signature()
+            unchanged = before == self._seen_signature
+            with span('journal'):
+                self.journal.append_updates(replacements)
+            with span('snapshot'):
+                self.snapshot.replace(replacements, before, self._signature())
+            due = self._after_journal_write(unchanged)
+        if due:
+            self._request_compaction()
+
+    def _after_journal_write(self, unchanged):
+        """Returns True if a compaction is due"""
+        # Writes of other processes since we last looked must still be detected
+        if unchanged:
+            self._seen_signature = self._signature()
+        pending = self.journal.pending_rows + self.journal.pending_updates
+        return pending >= self.compact_threshold and not self._bulk
+
+    @contextmanager
+    def bulk(self):
+        """Skip threshold compactions while a bulk import runs, compact once afterwards"""
+        with self._lock:
+            self._bulk += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._bulk -= 1
+            self._request_compaction()
+
+    def iter_rows(self, filters=None):
+        """
+        Yield every stored row: the workbook followed by pending journal rows
+        filters: Optional {column: value} dict, rows must match all of them
+        """
+        rows, source = self._open_rows()
+        if rows is not None:
+            match = _row_matcher(filters)
+            return (row for row in rows if match(row))
+        return self._iter_workbook(*source, filters)
+
+    def load_rows(self):
+        """
+        Every stored row as a list - from the columnar snapshot if it is
+        current, otherwise read from the workbook and snapshotted
+        """
+        rows, source = self._open_rows()
+        if rows is not None:
+            return rows
+        rows = list(self._iter_workbook(*source))
+        signature = source[-1]
+        with self.file_lock.exclusive(), self._lock, span('snapshot'):
+            # Only if nobody wrote since the rows were read
+            if self._signature() == signature:
+                self.snapshot.write(rows, signature)
+        return rows
+
+    def _open_rows(self):
+        """
+        (rows, None) if the snapshot is current, else (None, (workbook file,
+        journal rows, journal updates, signature)) taken as one consistent view
+        """
+        with self.file_lock.shared(), self._lock:
+            signature = self._signature()
+            with span('snapshot'):
+                rows = self.snapshot.load(signature)
+            if rows is not None:
+                return rows, None
+            pending, updates = self.journal.read()
+            # The open file stays readable even if a compaction replaces the workbook
+            source = open(self.excel_file, 'rb')
+        return None, (source, pending, updates, signature)
+
+    def _iter_workbook(self, source, pending, updates, _signature, filters=None):
+        from openpyxl import load_workbook
+
+        updates = dict(updates)
+        match = _row_matcher(filters)
+        position = 0
+        try:
+            wb = load_workbook(source, read_only=True)
+            try:
+                for row in wb[self.sheet_name].iter_rows(min_row=2, values_only=True):
+                    if any(value is not None for value in row):
+                        row = updates.get(position) or list(row[:len(HEADERS)])
+                        position += 1
+                        if match(row):
+                            yield row
+            finally:
+                wb.close()
+        finally:
+            source.close()
+        for row in pending:
+            row = updates.get(position) or row
+            position += 1
+            if match(row):
+                yield row
+
+    def changed_externally(self):
+        """True if the workbook or journal were modified by someone else since last seen"""
+        with self._lock:
+            signature = self._signature()
+            if signature == self._seen_signature:
+                return False
+            self._seen_signature = signature
+            return True
+
+    def _signature(self):
+        return (_file_signature(self.excel_file), _file_signature(self.journal_file))
+
+    def change_signature(self):
+        """
+        (signature, last modified) of the stored data, the same in every
+        process reading these files: workbook and journal signatures, newest mtime
+        """
+        return self._signature(), _modified(self.excel_file, self.journal_file)
+
+    def load_numeric(self, columns):
+        """Persisted typed values: (positions, source hashes, values) or None"""
+        return self.numeric_snapshot.load(columns)
+
+    def save_numeric(self, columns, positions, hashes, values):
+        """Persist typed values of the rows at positions (a cache, see NumericSnapshot)"""
+        with self._lock:
+            self.numeric_snapshot.save(columns, positions, hashes, values)
+
+    def export_file(self):
+        """Path of an xlsx containing every acknowledged record"""
+        # Fold pending journal rows so the file contains every acknowledged record
+        self.compact()
+        return self.excel_file
+
+    def compact(self):
+        """
+        Fold all journaled rows and updates into the Excel file
+        Returns the number of journal entries written to the workbook
+        """
+        while True:
+            folded = self._compact_once()
+            if folded is not None:
+                return folded
+            # Another compaction replaced the workbook first - fold what it left
+
+    def _compact_once(self):
+        """
+        Build the new workbook from a snapshot without holding the lock, so
+        readers and journal writers carry on; the rename and the removal of
+        the folded journal prefix are committed under the exclusive lock.
+        Returns None if another compaction committed in the meantime.
+        """
+        from openpyxl import load_workbook
+
+        with self.file_lock.shared(), self._lock:
+            rows, updates, journal_size = self.journal.snapshot()
+            if not rows and not updates:
+                return 0
+            signature = _file_signature(self.excel_file)
+            source = open(self.excel_file, 'rb')
+
+        tmp_path = temp_path(self.excel_file)
+        try:
+            with source, span('load'):
+                wb = load_workbook(source)
+                ws = wb[self.sheet_name]
+                data_rows = [
+                    index
+                    for index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2)
+                    if any(value is not None for value in row)
+                ]
+            base = data_rows[-1] - 1 if data_rows else 0
+
+            # Updates of journaled rows are applied before those rows are written
+            rows = [list(row) for row in rows]
+            for position, row_data in updates:
+                if position < len(data_rows):
+                    self._write_row(ws, data_rows[position], row_data)
+                elif position - len(data_rows) < len(rows):
+                    rows[position - len(data_rows)] = row_data
+            for offset, row_data in enumerate(rows, start=base + 2):
+                self._write_row(ws, offset, row_data)
+
+            with span('save'):
+                wb.save(tmp_path)
+
+            with self.file_lock.exclusive(), self._lock:
+                if _file_signature(self.excel_file) != signature:
+                    return None
+                before = self._signature()
+                unchanged = before == self._seen_signature
+                # Updates alone are idempotent and need no marker
+                if rows:
+                    self.journal.mark_compacting(base, len(rows), journal_size)
+                replace_file(tmp_path, self.excel_file)
+                self.journal.truncate(journal_size)
+                # Same rows, new files: the snapshot stays valid
+                self.snapshot.rekey(before, self._signature())
+                if unchanged:
+                    self._seen_signature = self._signature()
+            return len(rows) + len(updates)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    @staticmethod
+    def _write_row(ws, sheet_row, row_data):
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        for col, value in enumerate(row_data, start=1):
+            if isinstance(value, str):
+                # Control characters would make openpyxl reject the whole batch
+                value = ILLEGAL_CHARACTERS_RE.sub('', value)
+            ws.cell(row=sheet_row, column=col, value=value)
+
+    def close(self):
+        """Stop the background compactor and flush the journal into Excel"""
+        if self._compactor is not None:
+            self._compactor_stop = True
+            self._compact_requested.set()
+            self._compactor.join()
+            self._compactor = None
+        self.compact()
+
+    def _request_compaction(self):
+        if self._compactor is not None:
+            self._compact_requested.set()
+        else:
+            self.compact()
+
+    def _compact_loop(self):
+        while not self._compactor_stop:
+            self._compact_requested.wait(self.compact_interval)
+            self._compact_requested.clear()
+            if self._compactor_stop:
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"✗ Journal-Kompaktierung fehlgeschlagen: {e}")
+
+    def _excel_row_count(self):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(self.excel_file, read_only=True)
+        try:
+            return self._data_row_count(wb[self.sheet_name])
+        finally:
+            wb.close()
+
+    @staticmethod
+    def _data_row_count(ws):
+        """Number of data rows below the header, ignoring trailing empty rows"""
+        last = 1
+        for index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            if any(value is not None for value in row):
+                last = index
+        return last - 1
+
+
+class ShardedExcelStore:
+    """
+    Workbook partitioned into shards <stem>_<key>.xlsx. Only the newest
+    shard receives writes, it rolls over per month of Zeitstempel
+    (key YYYY-MM) and/or after shard_rows rows; older shards are immutable.
+    An existing <stem>.xlsx is kept as the first, read-only shard.
+    A row of a sealed shard is replaced by appending its new version and
+    listing the old position in <stem>.superseded.json; iter_rows() and the
+    export skip superseded rows, load_rows() keeps them so positions stay stable.
+    """
+
+    def __init__(self, excel_file, sheet_name, shard_rows=None, shard_period='month',
+                 compact_threshold=500, compact_interval=60.0):
+        if shard_period not in (None, 'month'):
+            raise ValueError(f"Ungültige Shard-Periode: {shard_period} (erlaubt: month)")
+        if shard_period is None and not shard_rows:
+            raise ValueError("Ohne Shard-Periode muss shard_rows gesetzt sein")
+
+        self.excel_file = excel_file
+        self.sheet_name = sheet_name
+        self.shard_rows = shard_rows
+        self.shard_period = shard_period
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+        self.export_path = str(Path(excel_file).with_name(f'{Path(excel_file).stem}_gesamt.xlsx'))
+        # Shard set and roll-over are coordinated across processes (each shard locks itself)
+        self.file_lock = FileLock(str(Path(excel_file).with_name(f'{Path(excel_file).stem}.shards.lock')))
+        self.superseded_file = str(Path(excel_file).with_name(f'{Path(excel_file).stem}.superseded.json'))
+        # Typed numeric values by global position (the shards' snapshots hold their rows)
+        self.numeric_snapshot = NumericSnapshot(Path(excel_file).with_name(f'{Path(excel_file).stem}.columns'))
+        self._lock = threading.RLock()
+        self._export_signature = None
+        self._open_shards()
+        self._load_superseded()
+
+    def _shard_path(self, key):
+        path = Path(self.excel_file)
+        return str(path.with_name(f'{path.stem}_{key}{path.suffix}'))
+
+    def _discover(self):
+        """Shard keys on disk, oldest first"""
+        path = Path(self.excel_file)
+        pattern = re.compile(re.escape(path.stem) + r'_(\d{4}-\d{2}(?:_\d{3})?|\d{4})'
+                             + re.escape(path.suffix) + '$')
+        keys = [match.group(1) for match in
+                (pattern.match(candidate.name) for candidate in path.parent.glob(f'{path.stem}_*'))
+                if match]
+        return sorted(keys)
+
+    def _open_shards(self):
+        # (name, store, row count) per shard; the last one is the writable shard
+        self.shards = []
+        if Path(self.excel_file).exists():
+            legacy = ExcelStore(self.excel_file, self.sheet_name, compact_interval=None)
+            legacy.compact()
+            self.shards.append([Path(self.excel_file).stem, legacy, _count_rows(legacy)])
+        keys = self._discover()
+        for index, key in enumerate(keys):
+            writable = index == len(keys) - 1
+            store = ExcelStore(
+                self._shard_path(key), self.sheet_name,
+                compact_threshold=self.compact_threshold,
+                compact_interval=self.compact_interval if writable else None
+            )
+            if not writable:
+                store.compact()
+            self.shards.append([key, store, _count_rows(store)])
+        self._current_key = keys[-1] if keys else None
+
+    def _load_superseded(self):
+        self._superseded_seen = _file_signature(self.superseded_file)
+        try:
+            with open(self.superseded_file, encoding='utf-8') as f:
+                self.superseded = set(json.load(f))
+        except FileNotFoundError:
+            self.superseded = set()
+
+    def locked(self):
+        """Exclusive lock across processes, e.g. around read-modify-write of the collector"""
+        return self.file_lock.exclusive()
+
+    @property
+    def sealed_rows(self):
+        """Rows in immutable shards - positions below this cannot be replaced"""
+        with self._lock:
+            count = sum(shard[2] for shard in self.shards)
+            if self._current_key is not None:
+                count -= self.shards[-1][2]
+            return count
+
+    def _target_key(self, row):
+        """Shard key a new row belongs to, given the current shard"""
+        current = self._current_key
+        count = self.shards[-1][2] if current is not None else 0
+        full = self.shard_rows and count >= self.shard_rows
+
+        if self.shard_period == 'month':
+            timestamp = row[HEADERS.index('Zeitstempel')]
+            month = str(timestamp)[:7] if timestamp else datetime.now().strftime('%Y-%m')
+            if current is None or month > current[:7]:
+                return month
+            if full:
+                sequence = int(current[8:]) + 1 if len(current) > 7 else 2
+                return f'{current[:7]}_{sequence:03d}'
+            return current
+
+        if current is None or full:
+            return f'{int(current) + 1 if current else 1:04d}'
+        return current
+
+    def _roll_over(self, key):
+        """Seal the current shard and start a new one"""
+        if self._current_key is not None:
+            sealed = self.shards[-1][1]
+            sealed.close()
+            print(f"✓ Shard abgeschlossen: {sealed.excel_file}")
+        store = ExcelStore(self._shard_path(key), self.sheet_name,
+                           compact_threshold=self.compact_threshold,
+                           compact_interval=self.compact_interval)
+        self.shards.append([key, store, 0])
+        self._current_key = key
+
+    def append(self, rows):
+        """Append rows to the current shard, rolling over where a row requires it"""
+        with self._lock:
+            batch = []
+            for row in rows:
+                key = self._target_key(row)
+                if key != self._current_key:
+                    self._flush(batch)
+                    batch = []
+                    self._roll_over(key)
+                batch.append(row)
+                if self.shard_rows and self.shards[-1][2] + len(batch) >= self.shard_rows:
+                    self._flush(batch)
+                    batch = []
+            self._flush(batch)
+
+    def _flush(self, batch):
+        if batch:
+            self.shards[-1][1].append(batch)
+            self.shards[-1][2] += len(batch)
+
+    def replace(self, replacements):
+        """
+        Replace rows of the current shard in place
+        replacements: (position, row) pairs, positions count across all shards
+        """
+        if not replacements:
+            return
+        with self._lock:
+            sealed = self.sealed_rows
+            if any(position < sealed for position, _ in replacements):
+                raise ValueError("Abgeschlossene Shards sind unveränderlich")
+            self.shards[-1][1].replace(
+                [(position - sealed, row) for position, row in replacements]
+            )
+
+    def supersede(self, positions):
+        """
+        Mark rows of sealed shards as replaced by a newer version that was
+        already appended - call after append(), so a crash keeps both versions
+        """
+        if not positions:
+            return
+        with self._lock:
+            self.superseded.update(positions)
+            with atomic_write(self.superseded_file, 'w', encoding='utf-8') as f:
+                json.dump(sorted(self.superseded), f)
+            self._superseded_seen = _file_signature(self.superseded_file)
+
+    def load_numeric(self, columns):
+        """Persisted typed values: (positions, source hashes, values) or None"""
+        return self.numeric_snapshot.load(columns)
+
+    def save_numeric(self, columns, positions, hashes, values):
+        with self._lock:
+            self.numeric_snapshot.save(columns, positions, hashes, values)
+
+    def superseded_positions(self):
+        """Sorted positions of superseded rows (see supersede)"""
+        with self._lock:
+            return sorted(self.superseded)
+
+    def load_rows(self):
+        """Every row of every shard as a list, from the shards' columnar snapshots"""
+        with self._lock:
+            stores = [store for _, store, _ in self.shards]
+        return [row for store in stores for row in store.load_rows()]
+
+    def iter_rows(self, filters=None):
+        """Yield the rows of every shard, oldest shard first, without superseded rows"""
+        with self._lock:
+            shards = [(store, count) for _, store, count in self.shards]
+            superseded = set(self.superseded)
+        start = 0
+        for store, count in shards:
+            skipped = {position - start for position in superseded
+                       if start <= position < start + count}
+            if skipped:
+                match = _row_matcher(filters)
+                yield from (row for position, row in enumerate(store.iter_rows())
+                            if position not in skipped and match(row))
+            else:
+                yield from store.iter_rows(filters)
+            start += count
+
+    def shard_names(self):
+        with self._lock:
+            return [name for name, _, _ in self.shards]
+
+    def shard_summary(self):
+        """Cached row count and file per shard (no workbook is opened)"""
+        with self._lock:
+            return [
+                {'Shard': name, 'Datei': os.path.basename(store.excel_file),
+                 'Datensätze': count, 'Schreibbar': name == self._current_key}
+                for name, store, count in self.shards
+            ]
+
+    def shard_file(self, name):
+        """
+        Path of a single shard workbook, with pending journal rows folded in
+        (a sealed shard is returned as written, including superseded rows)
+        """
+        with self._lock:
+            for shard_name, store, _ in self.shards:
+                if shard_name == name:
+                    return store.export_file()
+        raise ValueError(f"Unbekannter Shard: {name} (vorhanden: {', '.join(self.shard_names())})")
+
+    def changed_externally(self):
+        """True if any shard changed or another process added a shard"""
+        with self._lock:
+            keys = [name for name, store, _ in self.shards if store.excel_file != self.excel_file]
+            if self._discover() != keys:
+                for _, store, _ in self.shards:
+                    store.close()
+                self._open_shards()
+                self._load_superseded()
+                return True
+            changed = False
+            for shard in self.shards:
+                if shard[1].changed_externally():
+                    shard[2] = _count_rows(shard[1])
+                    changed = True
+            if _file_signature(self.superseded_file) != self._superseded_seen:
+                self._load_superseded()
+                changed = True
+            return changed
+
+    def _signature(self):
+        return (tuple(store._signature() for _, store, _ in self.shards),
+                _file_signature(self.superseded_file))
+
+    def change_signature(self):
+        """(signature, last modified) over all shards, see ExcelStore.change_signature"""
+        with self._lock:
+            signatures = [store.change_signature() for _, store, _ in self.shards]
+        modified = [modified for _, modified in signatures] + [_modified(self.superseded_file)]
+        return ((tuple(signature for signature, _ in signatures),
+                 _file_signature(self.superseded_file)),
+                max(filter(None, modified), default=None))
+
+    def export_file(self):
+        """Stitch all shards into one workbook, reusing the last export if nothing changed"""
+        with self._lock:
+            self.compact()
+            signature = self._signature()
+            if signature != self._export_signature or not Path(self.export_path).exists():
+                write_xlsx(self.export_path, self.iter_rows(), self.sheet_name,
+                           HEADERS, COLUMN_WIDTHS)
+                self._export_signature = signature
+            return self.export_path
+
+    def compact(self):
+        with self._lock:
+            if self._current_key is None:
+                return 0
+            return self.shards[-1][1].compact()
+
+    def close(self):
+        with self._lock:
+            for _, store, _ in self.shards:
+                store.close()
+
+
+class SQLiteStore:
+    """Indexed SQLite table as primary store, Excel produced on demand"""
+
+    TABLE = 'geraete'
+    META_TABLE = 'pue_revision'
+    NUMERIC_TABLE = 'geraete_numeric'
+    INDEXED_COLUMNS = ('Hersteller', 'Produktkategorie', 'Zeitstempel')
+
+    def __init__(self, db_file, sheet_name, export_file=None):
+        self.db_file = db_file
+        self.sheet_name = sheet_name
+        self.export_path = export_file or f'{Path(db_file).with_suffix("")}_export.xlsx'
+        self._export_version = None
+        # SQLite locks its own writes; this lock spans the collector's read-modify-write
+        self.file_lock = FileLock(f'{db_file}.lock')
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._initialize_db()
+        self._seen_data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        self._seen_revision = self._revision()
+
+    def _initialize_db(self):
+        """Create the device table, its indexes and the revision row if they don't exist"""
+        columns = ', '.join(f'{_quote(h)}' for h in HEADERS)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} '
+                f'(id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})'
+            )
+            # Committed with every write: identifies the data across connections and restarts
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.META_TABLE} '
+                f'(id INTEGER PRIMARY KEY CHECK (id = 1), '
+                f'database TEXT NOT NULL, revision INTEGER NOT NULL, modified REAL NOT NULL)'
+            )
+            self._conn.execute(
+                f'INSERT OR IGNORE INTO {self.META_TABLE} VALUES (1, ?, 0, ?)',
+                (uuid.uuid4().hex, time.time())
+            )
+            for column in self.INDEXED_COLUMNS:
+                self._conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_{column.lower()} '
+                    f'ON {self.TABLE} ({_quote(column)})'
+                )
+
+    def locked(self):
+        """Exclusive lock across processes, e.g. around read-modify-write of the collector"""
+        return self.file_lock.exclusive()
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute(f'SELECT 1 FROM {self.TABLE} LIMIT 1').fetchone() is None
+
+    def append(self, rows):
+        if not rows:
+            return
+        placeholders = ', '.join('?' for _ in HEADERS)
+        columns = ', '.join(_quote(h) for h in HEADERS)
+        with self._lock, span('save'), self._conn:
+            self._conn.executemany(
+                f'INSERT INTO {self.TABLE} ({columns}) VALUES ({placeholders})',
+                ([_sqlite_value(v) for v in row] for row in rows)
+            )
+            self._bump_revision()
+
+    def replace(self, replacements):
+        """
+        Replace stored rows in place
+        replacements: (position, row) pairs - rows are never deleted, so id = position + 1
+        """
+        if not replacements:
+            return
+        assignments = ', '.join(f'{_quote(h)} = ?' for h in HEADERS)
+        with self._lock, span('save'), self._conn:
+            self._conn.executemany(
+                f'UPDATE {self.TABLE} SET {assignments} WHERE id = ?',
+                ([_sqlite_value(v) for v in row] + [position + 1] for position, row in replacements)
+            )
+            self._bump_revision()
+
+    def _bump_revision(self):
+        # Part of the caller's transaction
+        seen = self._revision() == self._seen_revision
+        self._conn.execute(
+            f'UPDATE {self.META_TABLE} SET revision = revision + 1, modified = ? WHERE id = 1',
+            (time.time(),)
+        )
+        if seen:
+            # Nobody else wrote since changed_externally() last looked
+            self._seen_revision = self._revision()
+
+    def _revision(self):
+        return self._conn.execute(f'SELECT database, revision FROM {self.META_TABLE}').fetchone()
+
+    def load_numeric(self, columns):
+        """Persisted typed values: (positions, source hashes, values) or None"""
+        import numpy as np
+
+        with self._lock:
+            if self._numeric_columns() != ['id', 'source', *columns]:
+                return None
+            entries = self._conn.execute(
+                f'SELECT id, source, {", ".join(_quote(c) for c in columns)} '
+                f'FROM {self.NUMERIC_TABLE}'
+            ).fetchall()
+        if not entries:
+            return None
+        positions = np.fromiter((entry[0] - 1 for entry in entries), dtype=np.int64, count=len(entries))
+        hashes = np.fromiter((entry[1] for entry in entries), dtype=np.int64, count=len(entries))
+        # SQLite stores NaN as NULL, which NumPy reads back as NaN
+        values = np.array([entry[2:] for entry in entries], dtype=np.float64)
+        return positions, hashes, values
+
+    def save_numeric(self, columns, positions, hashes, values):
+        """
+        Persist typed values of the rows at positions in their own table -
+        a cache next to the rows, so the revision is not bumped
+        """
+        names = ', '.join(_quote(c) for c in columns)
+        with self._lock, self._conn:
+            if self._numeric_columns() != ['id', 'source', *columns]:
+                self._conn.execute(f'DROP TABLE IF EXISTS {self.NUMERIC_TABLE}')
+                self._conn.execute(
+                    f'CREATE TABLE {self.NUMERIC_TABLE} (id INTEGER PRIMARY KEY, '
+                    f'source INTEGER NOT NULL, {", ".join(f"{_quote(c)} REAL" for c in columns)})'
+                )
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO {self.NUMERIC_TABLE} (id, source, {names}) '
+                f'VALUES ({", ".join("?" for _ in range(len(columns) + 2))})',
+                ([int(position) + 1, int(source), *row]
+                 for position, source, row in zip(positions, hashes, values.tolist()))
+            )
+
+    def _numeric_columns(self):
+        return [row[1] for row in self._conn.execute(f'PRAGMA table_info({self.NUMERIC_TABLE})')]
+
+    def iter_rows(self, filters=None):
+        """
+        Yield stored rows lazily from a separate read connection (WAL readers
+        don't block the writer), optionally filtered by {column: value}
+        """
+        columns = ', '.join(_quote(h) for h in HEADERS)
+        filters = filters or {}
+        where = ' AND '.join(f'{_quote(column)} = ?' for column in filters)
+        sql = f'SELECT {columns} FROM {self.TABLE}'
+        if where:
+            sql += f' WHERE {where}'
+        sql += ' ORDER BY id'
+
+        conn = sqlite3.connect(self.db_file)
+        try:
+            for row in conn.execute(sql, list(filters.values())):
+                yield list(row)
+        finally:
+            conn.close()
+
+    def changed_externally(self):
+        """True if another connection or process committed since last seen"""
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._seen_data_version:
+                return False
+            self._seen_data_version = data_version
+            # Writes of the typed-value cache change data_version but not the revision
+            revision = self._revision()
+            if revision == self._seen_revision:
+                return False
+            self._seen_revision = revision
+            return True
+
+    def change_signature(self):
+        """
+        (signature, last modified) of the stored data: database id and revision,
+        committed with every write, so all connections and processes agree on it
+        """
+        with self._lock:
+            database, revision, modified = self._conn.execute(
+                f'SELECT database, revision, modified FROM {self.META_TABLE}').fetchone()
+        return (database, revision), _utc_seconds(modified)
+
+    def export_file(self):
+        """Materialize the table as xlsx, reusing the last export if nothing changed"""
+        with self._lock:
+            # Changes whenever rows are added or replaced
+            version, _ = self.change_signature()
+            if version == self._export_version and Path(self.export_path).exists():
+                return self.export_path
+
+            write_xlsx(self.export_path, self.iter_rows(), self.sheet_name,
+                       HEADERS, COLUMN_WIDTHS)
+            self._export_version = version
+            return self.export_path
+
+    def migrate_from_excel(self, excel_file, sheet_name=None, journal_file=None):
+        """
+        One-shot import of an existing workbook (and its pending journal)
+        Returns the number of migrated rows
+        """
+        source = ExcelStore(excel_file, sheet_name or self.sheet_name,
+                            journal_file=journal_file, compact_interval=None)
+        rows = list(source.iter_rows())
+        self.append(rows)
+        print(f"✓ {len(rows)} Datensätze aus {excel_file} nach {self.db_file} migriert")
+        return len(rows)
+
+    def compact(self):
+        return 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _row_matcher(filters):
+    """Predicate for rows matching all {column: value} filters"""
+    if not filters:
+        return lambda row: True
+    checks = [(HEADERS.index(column), str(value)) for column, value in filters.items()]
+    return lambda row: all(
+        row[index] is not None and str(row[index]) == value for index, value in checks
+    )
+
+
+def _count_rows(store):
+    return sum(1 for _ in store.iter_rows())
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # The inode tells an atomically replaced file from one rewritten in place
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _modified(*paths):
+    """Newest mtime of the existing paths as a UTC datetime, None if none exists"""
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except FileNotFoundError:
+            pass
+    return _utc_seconds(max(mtimes)) if mtimes else None
+
+
+def _utc_seconds(timestamp):
+    # HTTP dates have a resolution of one second
+    return datetime.fromtimestamp(int(timestamp), timezone.utc)
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _sqlite_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+def main():
+    """Migrate an existing Excel database into SQLite"""
+    if len(sys.argv) < 3:
+        print("Verwendung: python pue_storage.py <excel_datei> <sqlite_datei> [sheet_name]")
+        sys.exit(1)
+
+    excel_file, db_file = sys.argv[1], sys.argv[2]
+    sheet_name = sys.argv[3] if len(sys.argv) > 3 else 'Geräte'
+    store = SQLiteStore(db_file, sheet_name)
+    if not store.is_empty():
+        print(f"✗ {db_file} enthält bereits Daten - Migration abgebrochen")
+        sys.exit(1)
+    store.migrate_from_excel(excel_file, sheet_name)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
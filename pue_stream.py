@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Streaming readers for the PUE Data Collector
+Incremental JSON array, NDJSON and CSV parsing with constant memory per record
+"""
+
+import codecs
+import csv
+import io
+import json
+from itertools import islice
+
+
+READ_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class RejectedLines:
+    """
+    Collects rejected lines like a list, but keeps only the first limit of
+    them (all when limit is None) while counting every one
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.items = []
+        self.count = 0
+
+    def append(self, entry):
+        self.count += 1
+        if self.limit is None or len(self.items) < self.limit:
+            self.items.append(entry)
+
+    @property
+    def truncated(self):
+        return self.count > len(self.items)
+
+
+class _TextChunks:
+    """Read text chunks from a text or binary stream (UTF-8 decoded incrementally)"""
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+        self.eof = False
+
+    def read(self):
+        chunk = self.stream.read(self.read_size)
+        # A short read may decode to '' (BOM or part of a character) before the end
+        if not chunk:
+            self.eof = True
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk, final=not chunk)
+        return chunk
+
+
+def iter_json_records(stream, read_size=READ_SIZE):
+    """
+    Yield the elements of a top-level JSON array one by one
+    stream: Text or binary file-like object; a single JSON object yields one record
+    Raises json.JSONDecodeError on malformed input
+    """
+    chunks = _TextChunks(stream, read_size)
+    buf = ''
+    pos = 0
+
+    # Find the first significant character
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buf) or chunks.eof:
+            break
+        buf, pos = buf[pos:] + chunks.read(), 0
+
+    if pos == len(buf):
+        raise json.JSONDecodeError("Keine Daten", buf, pos)
+
+    if buf[pos] != '[':
+        # Single record (or non-array document) - small enough to parse at once
+        while not chunks.eof:
+            buf += chunks.read()
+        yield json.loads(buf[pos:])
+        return
+
+    pos += 1
+    expect_value = True
+    first = True
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos == len(buf):
+            if chunks.eof:
+                raise json.JSONDecodeError("Unerwartetes Ende des JSON-Arrays", buf, pos)
+            # Drop everything already consumed to keep the buffer small
+            buf, pos = buf[pos:] + chunks.read(), 0
+            continue
+
+        char = buf[pos]
+        if char == ']' and (not expect_value or first):
+            return
+        if not expect_value:
+            if char != ',':
+                raise json.JSONDecodeError("Erwartet ',' oder ']'", buf, pos)
+            pos += 1
+            expect_value = True
+            continue
+
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if chunks.eof:
+                raise
+            buf, pos = buf[pos:] + chunks.read(), 0
+            continue
+
+        if end == len(buf) and not chunks.eof:
+            # A number may continue in the next chunk - decode again with more data
+            buf, pos = buf[pos:] + chunks.read(), 0
+            continue
+
+        yield value
+        pos = end
+        expect_value = False
+        first = False
+
+
+def iter_ndjson_records(stream, rejected=None, read_size=READ_SIZE):
+    """
+    Yield the records of newline-delimited JSON (one object per line), line by line
+    stream: Text or binary file-like object; blank lines are ignored
+    rejected: List (or RejectedLines) collecting {'line': n, 'error': '...'} for lines
+              that are no valid JSON or no object - without it such a line raises ValueError
+    """
+    chunks = _TextChunks(stream, read_size)
+    number = 0
+    rest = ''
+    while not chunks.eof:
+        text = chunks.read()
+        if number == 0 and not rest:
+            # Text streams keep their byte order mark
+            text = text.removeprefix('\ufeff')
+        lines = (rest + text).split('\n')
+        # The last piece may continue in the next chunk (all of it at the end)
+        rest = lines.pop() if not chunks.eof else ''
+        for line in lines:
+            number += 1
+            if not line or line.isspace():
+                continue
+            try:
+                record = _decoder.decode(line)
+            except json.JSONDecodeError as e:
+                error = str(e)
+            else:
+                if isinstance(record, dict):
+                    yield record
+                    continue
+                error = f"Datensatz ist kein Objekt ({type(record).__name__})"
+            if rejected is None:
+                raise ValueError(f"Zeile {number}: {error}")
+            rejected.append({'line': number, 'error': error})
+
+
+def iter_csv_records(stream):
+    """
+    Yield CSV rows as dicts, reading the stream line by line
+    Empty cells become None
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(stream):
+        yield {key: (value if value != '' else None) for key, value in row.items()}
+
+
+def iter_chunks(iterable, size):
+    """Group an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory device table for the PUE Data Collector
+Repeated values (Hersteller, Produktkategorie, Betriebsbedingungen,
+Quelle_Dateiname, Fehlende_Angaben, ...) are stored once per column and
+referenced by small integer codes, Zeitstempel as int64 seconds, so a
+worker holds a few bytes per cell instead of one string object per cell
+"""
+
+from array import array
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+from pue_storage import HEADERS
+
+
+TIME_COLUMN = 'Zeitstempel'
+
+# A column whose values are mostly distinct (free text such as Modellbezeichnung)
+# saves nothing from a dictionary: checked at every doubling of the table
+# from this size on, it then becomes a plain list
+PLAIN_CHECK_ROWS = 1024
+PLAIN_DISTINCT_RATIO = 0.5
+
+# Code array type -> next wider type, and the largest code each type holds
+_WIDER = {'B': 'H', 'H': 'I'}
+_MAX_CODE = {'B': 0xFF, 'H': 0xFFFF, 'I': 0xFFFFFFFF}
+
+# Kinds of Zeitstempel cells
+_NONE, _TEXT, _DATETIME, _OTHER = range(4)
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def _value_key(value):
+    """Dictionary key of a cell: 1, 1.0 and True stay distinct values"""
+    return value if value.__class__ is str else (value.__class__, value)
+
+
+def format_seconds(seconds):
+    """'YYYY-MM-DD HH:MM:SS' of a TimestampColumn value (orders like the number)"""
+    return str(_EPOCH + timedelta(seconds=seconds))
+
+
+class CategoricalColumn:
+    """
+    Distinct values in order of first appearance plus one code per row.
+    Codes start as bytes and widen (B -> H -> I) when a column gets more
+    distinct values. Values of replaced rows stay in the dictionary.
+    """
+
+    __slots__ = ('values', 'codes', '_codes')
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('B')
+        self._codes = {}
+
+    def code(self, value):
+        """Code of value, added to the dictionary on first sight"""
+        key = _value_key(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value)
+            if code > _MAX_CODE[self.codes.typecode]:
+                self.codes = array(_WIDER[self.codes.typecode], self.codes)
+        return code
+
+    def canonical(self, value):
+        """The column's single copy of value"""
+        return self.values[self.code(value)]
+
+    def append(self, value):
+        # code() may widen self.codes, so it runs before self.codes is looked up
+        code = self.code(value)
+        self.codes.append(code)
+
+    def __getitem__(self, position):
+        return self.values[self.codes[position]]
+
+    def __setitem__(self, position, value):
+        self.codes[position] = self.code(value)
+
+
+class TextColumn(list):
+    """Plain value list for columns of mostly distinct values"""
+
+    __slots__ = ()
+
+    def canonical(self, value):
+        return value
+
+
+class TimestampColumn:
+    """
+    Zeitstempel as int64 seconds plus a kind byte per row: empty,
+    'YYYY-MM-DD HH:MM:SS' text or a datetime (both restored exactly).
+    Anything else (fractions of seconds, time zones, free text) is kept
+    as it is in a side dict.
+    """
+
+    __slots__ = ('seconds', 'kinds', 'other', '_last')
+
+    def __init__(self):
+        self.seconds = array('q')
+        self.kinds = array('B')
+        self.other = {}
+        self._last = (None, (_NONE, 0))
+
+    def _encode(self, value):
+        """(kind, seconds) of a cell"""
+        if value is None:
+            return _NONE, 0
+        if value.__class__ is str:
+            # All rows of a commit share one timestamp
+            last, encoded = self._last
+            if value == last:
+                return encoded
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                return _OTHER, 0
+            encoded = (_TEXT, (parsed - _EPOCH) // _SECOND) if str(parsed) == value else (_OTHER, 0)
+            self._last = (value, encoded)
+            return encoded
+        if value.__class__ is datetime and value.tzinfo is None and not value.microsecond:
+            return _DATETIME, (value - _EPOCH) // _SECOND
+        return _OTHER, 0
+
+    def canonical(self, value):
+        return value
+
+    def append(self, value):
+        kind, seconds = self._encode(value)
+        if kind == _OTHER:
+            self.other[len(self.kinds)] = value
+        self.kinds.append(kind)
+        self.seconds.append(seconds)
+
+    def __getitem__(self, position):
+        kind = self.kinds[position]
+        if kind == _TEXT:
+            return format_seconds(self.seconds[position])
+        if kind == _DATETIME:
+            return _EPOCH + timedelta(seconds=self.seconds[position])
+        if kind == _OTHER:
+            return self.other[position]
+        return None
+
+    def __setitem__(self, position, value):
+        kind, seconds = self._encode(value)
+        self.other.pop(position, None)
+        if kind == _OTHER:
+            self.other[position] = value
+        self.kinds[position] = kind
+        self.seconds[position] = seconds
+
+    def sortable(self, position):
+        """True if the cell is ordered by its seconds (text or datetime)"""
+        return self.kinds[position] in (_TEXT, _DATETIME)
+
+
+class Record(Mapping):
+    """Read-only view of one table row (column -> value), no copy of the row"""
+
+    __slots__ = ('_table', '_position')
+
+    def __init__(self, table, position):
+        self._table = table
+        self._position = position
+
+    def __getitem__(self, column):
+        return self._table.columns[column][self._position]
+
+    def __iter__(self):
+        return iter(HEADERS)
+
+    def __len__(self):
+        return len(HEADERS)
+
+
+class CompactTable:
+    """
+    All stored rows column by column (HEADERS order): Zeitstempel as a
+    TimestampColumn, every other column dictionary-encoded until it turns
+    out to hold mostly distinct values (then a TextColumn). Rows are
+    appended/replaced as sequences and read back as Record views or lists.
+    """
+
+    def __init__(self):
+        self.columns = {
+            column: TimestampColumn() if column == TIME_COLUMN else CategoricalColumn()
+            for column in HEADERS
+        }
+        self._columns = list(self.columns.values())
+        self.size = 0
+
+    def intern(self, rows):
+        """
+        Copies of rows whose cells are the table's single copy of each value,
+        so the other views hold references to these instead of duplicates
+        """
+        canonical = [column.canonical for column in self._columns]
+        return [[intern(value) for intern, value in zip(canonical, _padded(row))]
+                for row in rows]
+
+    def append(self, row):
+        for column, value in zip(self._columns, _padded(row)):
+            column.append(value)
+        self.size += 1
+        if self.size >= PLAIN_CHECK_ROWS and not self.size & (self.size - 1):
+            self._drop_dictionaries()
+
+    def _drop_dictionaries(self):
+        """Turn dictionary-encoded columns of mostly distinct values into plain lists"""
+        for index, (name, column) in enumerate(self.columns.items()):
+            if (column.__class__ is CategoricalColumn
+                    and len(column.values) > self.size * PLAIN_DISTINCT_RATIO):
+                plain = TextColumn(map(column.values.__getitem__, column.codes))
+                self.columns[name] = self._columns[index] = plain
+
+    def replace(self, position, row):
+        for column, value in zip(self._columns, _padded(row)):
+            column[position] = value
+
+    def row(self, position):
+        return [column[position] for column in self._columns]
+
+    def rows(self):
+        """All rows as lists, in storage order"""
+        return (self.row(position) for position in range(self.size))
+
+    def __getitem__(self, position):
+        return Record(self, position)
+
+    def __len__(self):
+        return self.size
+
+
+def _padded(row):
+    """Rows shorter than the header (trailing cells absent) filled up with None"""
+    if len(row) >= len(HEADERS):
+        return row
+    return list(row) + [None] * (len(HEADERS) - len(row))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Data version of the PUE Data Collector
+A change counter of the in-memory views plus HTTP cache validators
+(ETag/Last-Modified) for stats and downloads, derived from the store
+"""
+
+import hashlib
+
+
+class DataVersion:
+    """
+    In-memory view counting changes since startup (the ids of live stats
+    events). The validators come from the store's change signature instead,
+    so every worker - and a restarted one - sends the same ETag and
+    Last-Modified for the same stored data.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.version = 0
+
+    def reset(self, rows):
+        self.version += 1
+
+    def add_rows(self, rows):
+        if rows:
+            self.version += 1
+
+    def replace_rows(self, replacements):
+        if replacements:
+            self.version += 1
+
+    def remove_rows(self, positions):
+        if positions:
+            self.version += 1
+
+    def validators(self):
+        """(etag, last_modified UTC datetime or None) of the stored data"""
+        signature, modified = self.store.change_signature()
+        etag = hashlib.blake2b(repr(signature).encode('utf-8'), digest_size=16).hexdigest()
+        return etag, modified
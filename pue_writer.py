@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Group-Commit Writer for the PUE Data Collector
+Single writer thread that coalesces concurrent row batches into one storage commit
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from pue_metrics import add_spans, finish_request, start_request
+
+
+class GroupCommitWriter:
+    """
+    Queues row batches from many threads and commits everything that arrives
+    within window_ms (or until max_records rows are collected) in one call to
+    commit_fn. commit_fn receives a list of (rows, options) batches and returns
+    one result per batch. Each caller of write() gets its batch result only
+    after the group is durably written, or re-raises the commit error. The
+    spans timed during the commit are added to every caller's request, so
+    Server-Timing includes the write it waited for.
+    """
+
+    def __init__(self, commit_fn, window_ms=5, max_records=1000):
+        self.commit_fn = commit_fn
+        self.window = window_ms / 1000.0
+        self.max_records = max_records
+        self._queue = queue.Queue()
+        self._stopped = False
+        # Held while checking _stopped and enqueueing, so nothing is queued after close()
+        self._submit_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self.commits = 0
+        self.records_committed = 0
+        self.commit_seconds_total = 0.0
+        self.commit_seconds_max = 0.0
+        self.last_commit_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='pue-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, rows, **options):
+        """Queue rows for the next group commit, returns a Future of (result, span totals)"""
+        future = Future()
+        with self._submit_lock:
+            if self._stopped:
+                raise RuntimeError("Writer wurde bereits beendet")
+            self._queue.put((rows, options, future))
+        return future
+
+    def write(self, rows, **options):
+        """Queue rows and block until their group has been committed"""
+        result, spans = self.submit(rows, **options).result()
+        add_spans(spans)
+        return result
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread"""
+        with self._submit_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'commits': self.commits,
+                'records_committed': self.records_committed,
+                'avg_group_size': self.records_committed / self.commits if self.commits else 0,
+                'last_commit_ms': self.last_commit_seconds * 1000,
+                'avg_commit_ms': (self.commit_seconds_total / self.commits * 1000
+                                  if self.commits else 0),
+                'max_commit_ms': self.commit_seconds_max * 1000
+            }
+
+    def _run(self):
+        try:
+            self._process()
+        finally:
+            with self._submit_lock:
+                # Later submits raise instead of waiting for a thread that is gone
+                self._stopped = True
+            self._fail_queued()
+
+    def _process(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            group = [item]
+            count = len(item[0])
+            stop = False
+            deadline = time.monotonic() + self.window
+
+            # Collect everything arriving within the window
+            while count < self.max_records:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+                count += len(item[0])
+
+            self._commit(group)
+            if stop:
+                return
+
+    def _fail_queued(self):
+        """Fail the futures of batches still queued when the writer thread exits"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and not item[2].done():
+                item[2].set_exception(RuntimeError("Writer wurde beendet"))
+
+    def _commit(self, group):
+        record_count = sum(len(rows) for rows, _, _ in group)
+        started = time.perf_counter()
+        # Spans of commit_fn are collected here and handed to each caller
+        token = start_request()
+        try:
+            results = self.commit_fn([(rows, options) for rows, options, _ in group])
+        except Exception as e:
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+        except BaseException:
+            # The writer thread dies with it - fail the group instead of leaving it waiting
+            for _, _, future in group:
+                future.set_exception(RuntimeError("Writer wurde beendet"))
+            raise
+        finally:
+            spans = finish_request(token)
+        elapsed = time.perf_counter() - started
+
+        with self._metrics_lock:
+            self.commits += 1
+            self.records_committed += record_count
+            self.commit_seconds_total += elapsed
+            self.commit_seconds_max = max(self.commit_seconds_max, elapsed)
+            self.last_commit_seconds = elapsed
+
+        for (_, _, future), result in zip(group, results):
+            future.set_result((result, spans))
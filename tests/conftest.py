@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the PUE Data Collector tests
+Every test works in its own temporary directory, so no data file of the
+repository is read or written.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pue_data_collector  # noqa: E402
+import pue_jobs  # noqa: E402
+from pue_data_collector import PUEDataCollector  # noqa: E402
+
+
+def make_record(number, **fields):
+    """GPT-style device record; number makes Modellbezeichnung and Quelle unique"""
+    record = {
+        'Hersteller': 'Eaton',
+        'Produktkategorie': 'USV',
+        'Modellbezeichnung': f'M{number}',
+        'Nennleistung': f'{10 + number} kVA',
+        'Wirkungsgrad_oder_Verlustleistung': '96.5%',
+        'Quelle': {'Dateiname': 'datenblatt.pdf', 'Seitenzahl': number, 'Zitat': f'Seite {number}'},
+    }
+    record.update(fields)
+    return record
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Temporary working directory (the collector uses relative file names)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def open_collector(workdir):
+    """Factory for collectors in workdir - all of them are closed after the test"""
+    collectors = []
+
+    def factory(**options):
+        options.setdefault('compact_interval', None)
+        collector = PUEDataCollector(str(workdir / 'PUE_Datenbank.xlsx'), **options)
+        collectors.append(collector)
+        return collector
+
+    yield factory
+    for collector in collectors:
+        collector.close()
+
+
+@pytest.fixture
+def shared_collector(workdir, monkeypatch):
+    """Reset the get_collector()/get_job_queue() singletons around a test"""
+    monkeypatch.setattr(pue_data_collector, '_collector', None)
+    monkeypatch.setattr(pue_jobs, '_job_queue', None)
+    monkeypatch.setenv('PUE_BACKEND', 'excel')
+    monkeypatch.setenv('PUE_JOB_DIR', str(workdir / 'PUE_Jobs'))
+    yield
+    if pue_jobs._job_queue is not None:
+        pue_jobs._job_queue.close()
+    if pue_data_collector._collector is not None:
+        pue_data_collector._collector.close()
@@ -0,0 +1,70 @@
+"""skip/upsert/keep deduplication, including rows of sealed shards"""
+
+import pytest
+
+from conftest import make_record
+
+
+BACKENDS = [
+    {'backend': 'excel'},
+    {'backend': 'sqlite'},
+    # Three rows per shard: the first shards are sealed after a few inserts
+    {'backend': 'sharded', 'shard_rows': 3, 'shard_period': None},
+]
+
+
+def _models(collector):
+    return sorted(row[3] for row in collector.iter_rows())
+
+
+@pytest.mark.parametrize('options', BACKENDS, ids=lambda options: options['backend'])
+def test_skip_ignores_known_records(open_collector, options):
+    collector = open_collector(**options)
+    collector.add_json_data([make_record(number) for number in range(5)], dedup='skip')
+    result = collector.add_json_data([make_record(0), make_record(5), make_record(5)], dedup='skip')
+
+    assert result == {'inserted': 1, 'updated': 0, 'skipped': 2}
+    assert _models(collector) == ['M0', 'M1', 'M2', 'M3', 'M4', 'M5']
+
+
+@pytest.mark.parametrize('options', BACKENDS, ids=lambda options: options['backend'])
+def test_keep_appends_every_version(open_collector, options):
+    collector = open_collector(**options)
+    collector.add_json_data([make_record(number) for number in range(4)], dedup='keep')
+    result = collector.add_json_data([make_record(0)], dedup='keep')
+
+    assert result == {'inserted': 1, 'updated': 0, 'skipped': 0}
+    assert collector.get_summary()['Gesamtanzahl'] == 5
+
+
+@pytest.mark.parametrize('options', BACKENDS, ids=lambda options: options['backend'])
+def test_upsert_replaces_stored_record(open_collector, options):
+    collector = open_collector(**options)
+    collector.add_json_data([make_record(number) for number in range(7)], dedup='upsert')
+    # With the sharded backend M0 lives in a sealed shard
+    result = collector.add_json_data([make_record(0, Nennleistung='99 kVA')], dedup='upsert')
+
+    assert result == {'inserted': 0, 'updated': 1, 'skipped': 0}
+    assert collector.get_summary()['Gesamtanzahl'] == 7
+    rows = [row for row in collector.iter_rows() if row[3] == 'M0']
+    assert [row[4] for row in rows] == ['99 kVA']
+    assert len(collector.query_records(text='M0')['records']) == 1
+    assert collector.numeric_frame()['Nennleistung_kVA'].max() == 99.0
+
+    # The replacement survives a restart and is not counted twice
+    collector.close()
+    reopened = open_collector(**options)
+    assert reopened.get_summary()['Gesamtanzahl'] == 7
+    assert _models(reopened) == [f'M{number}' for number in range(7)]
+    assert reopened.add_json_data([make_record(0)], dedup='skip')['skipped'] == 1
+
+
+def test_upsert_twice_on_sealed_shard(open_collector):
+    collector = open_collector(backend='sharded', shard_rows=3, shard_period=None)
+    collector.add_json_data([make_record(number) for number in range(7)])
+    collector.add_json_data([make_record(0, Nennleistung='20 kVA')], dedup='upsert')
+    collector.add_json_data([make_record(0, Nennleistung='30 kVA')], dedup='upsert')
+
+    assert collector.get_summary()['Gesamtanzahl'] == 7
+    assert [row[4] for row in collector.iter_rows() if row[3] == 'M0'] == ['30 kVA']
+    assert collector.get_analytics()['Hersteller']['Eaton']['Anzahl'] == 7
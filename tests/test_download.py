@@ -0,0 +1,72 @@
+"""Conditional and partial requests on /api/download"""
+
+import pytest
+
+from conftest import make_record
+
+
+@pytest.fixture
+def client(shared_collector):
+    from app import app
+    from pue_data_collector import get_collector
+
+    get_collector().add_json_data([make_record(number) for number in range(3)])
+    return app.test_client()
+
+
+def test_unchanged_data_answers_304(client):
+    first = client.get('/api/download')
+    assert first.status_code == 200
+    assert first.headers['Accept-Ranges'] == 'bytes'
+    etag = first.headers['ETag']
+
+    assert client.get('/api/download', headers={'If-None-Match': etag}).status_code == 304
+    last_modified = first.headers['Last-Modified']
+    assert client.get('/api/download',
+                      headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_new_data_changes_the_etag(client):
+    from pue_data_collector import get_collector
+
+    etag = client.get('/api/download').headers['ETag']
+    get_collector().add_json_data([make_record(10)])
+
+    response = client.get('/api/download', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_range_resumes_the_download(client):
+    full = client.get('/api/download').data
+
+    response = client.get('/api/download', headers={'Range': 'bytes=100-'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-{len(full) - 1}/{len(full)}'
+    assert response.data == full[100:]
+
+
+def test_if_range_with_stale_etag_sends_everything(client):
+    from pue_data_collector import get_collector
+
+    etag = client.get('/api/download').headers['ETag']
+    partial = client.get('/api/download', headers={'Range': 'bytes=0-99', 'If-Range': etag})
+    assert partial.status_code == 206
+    assert len(partial.data) == 100
+
+    get_collector().add_json_data([make_record(10)])
+    # The file changed: a range of the old one must not be spliced onto it
+    response = client.get('/api/download', headers={'Range': 'bytes=100-', 'If-Range': etag})
+    assert response.status_code == 200
+    assert response.data == client.get('/api/download').data
+
+
+def test_filtered_export_is_not_ranged(client):
+    response = client.get('/api/download?Hersteller=Eaton', headers={'Range': 'bytes=100-'})
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'none'
+    assert response.data[:2] == b'PK'
+
+    etag = response.headers['ETag']
+    assert client.get('/api/download?Hersteller=Eaton',
+                      headers={'If-None-Match': etag}).status_code == 304
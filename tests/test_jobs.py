@@ -0,0 +1,98 @@
+"""Background jobs resuming after a restart"""
+
+import json
+import threading
+import time
+
+from conftest import make_record
+from pue_jobs import JobQueue
+from pue_locking import FileLock
+
+
+def _wait(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.status(job_id)
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} nicht beendet: {status}")
+
+
+def _interrupt(directory, job_id, processed, inserted):
+    """Leave the job as a process killed after its first chunks would"""
+    path = directory / f'{job_id}.json'
+    status = json.loads(path.read_text(encoding='utf-8'))
+    status.update(status='running', started=status['created'],
+                  records_processed=processed, inserted=inserted)
+    path.write_text(json.dumps(status), encoding='utf-8')
+
+
+def test_job_runs_to_completion(open_collector, workdir):
+    collector = open_collector()
+    queue = JobQueue(collector, workdir / 'jobs', workers=1)
+    try:
+        job = queue.submit(json.dumps([make_record(number) for number in range(3)]))
+        status = _wait(queue, job['id'])
+    finally:
+        queue.close()
+
+    assert status['status'] == 'done'
+    assert status['records_processed'] == 3
+    assert status['inserted'] == 3
+    assert not (workdir / 'jobs' / f"{job['id']}.payload").exists()
+
+
+def test_interrupted_job_resumes_after_last_chunk(open_collector, workdir):
+    collector = open_collector(ingest_chunk_size=2)
+    records = [make_record(number) for number in range(5)]
+    directory = workdir / 'jobs'
+
+    # No workers: the job is spooled but never started by this queue
+    job = JobQueue(collector, directory, workers=0).submit(json.dumps(records))
+    # The killed run had already written its first chunk
+    collector.add_json_data(records[:2], dedup='keep')
+    _interrupt(directory, job['id'], processed=2, inserted=2)
+
+    queue = JobQueue(collector, directory, workers=1)
+    try:
+        status = _wait(queue, job['id'])
+    finally:
+        queue.close()
+
+    assert status['status'] == 'done'
+    assert status['records_processed'] == 5
+    assert status['inserted'] == 5
+    # Resumed after record 2 instead of writing the first chunk again
+    assert collector.get_summary()['Gesamtanzahl'] == 5
+    assert sorted(row[3] for row in collector.iter_rows()) == [f'M{number}' for number in range(5)]
+
+
+def test_job_locked_by_another_process_is_not_resumed(open_collector, workdir):
+    collector = open_collector()
+    directory = workdir / 'jobs'
+    job = JobQueue(collector, directory, workers=0).submit(json.dumps([make_record(1)]))
+    _interrupt(directory, job['id'], processed=0, inserted=0)
+
+    # Locks are reentrant per thread: another thread stands in for the other process
+    claimed = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with FileLock(directory / f"{job['id']}.lock").claim() as taken:
+            assert taken
+            claimed.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    claimed.wait()
+    try:
+        queue = JobQueue(collector, directory, workers=1)
+        queue.close()
+    finally:
+        release.set()
+        holder.join()
+
+    assert queue.status(job['id'])['status'] == 'running'
+    assert collector.get_summary()['Gesamtanzahl'] == 0
@@ -0,0 +1,93 @@
+"""Recovery of the write-ahead journal after a crash during compaction"""
+
+import pytest
+
+import pue_storage
+from pue_journal import WriteAheadJournal
+from pue_storage import HEADERS, ExcelStore
+
+
+def _rows(*numbers):
+    return [[f'M{number}'] + [None] * (len(HEADERS) - 1) for number in numbers]
+
+
+def _models(store):
+    return [row[0] for row in store.iter_rows()]
+
+
+def test_recover_without_marker_never_reads_the_workbook(tmp_path):
+    journal = WriteAheadJournal(tmp_path / 'db.journal')
+    journal.append(_rows(1, 2))
+
+    def row_count():
+        raise AssertionError("Workbook gelesen")
+
+    recovered = WriteAheadJournal(tmp_path / 'db.journal')
+    recovered.recover(row_count)
+    assert recovered.pending_rows == 2
+
+
+@pytest.mark.parametrize('workbook_rows, expected', [
+    (0, ['M1', 'M2', 'M3']),  # crashed before the rename: nothing was folded
+    (2, ['M3']),              # crashed after the rename: only the later row is pending
+])
+def test_recover_after_marker(tmp_path, workbook_rows, expected):
+    journal = WriteAheadJournal(tmp_path / 'db.journal')
+    journal.append(_rows(1, 2))
+    size = journal.snapshot()[2]
+    # A writer appended while the compaction built the new workbook
+    journal.append(_rows(3))
+    journal.mark_compacting(0, 2, size)
+
+    recovered = WriteAheadJournal(tmp_path / 'db.journal')
+    recovered.recover(lambda: workbook_rows)
+    assert [row[0] for row in recovered.read_rows()] == expected
+    assert recovered.pending_rows == len(expected)
+
+
+def test_recover_ignores_torn_last_line(tmp_path):
+    journal = WriteAheadJournal(tmp_path / 'db.journal')
+    journal.append(_rows(1))
+    with open(tmp_path / 'db.journal', 'a', encoding='utf-8') as f:
+        f.write('["M2", nu')
+
+    recovered = WriteAheadJournal(tmp_path / 'db.journal')
+    recovered.recover(lambda: 0)
+    assert [row[0] for row in recovered.read_rows()] == ['M1']
+
+
+def _crashing(store, monkeypatch, target, name):
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt("Absturz")
+    monkeypatch.setattr(target, name, crash)
+    with pytest.raises(KeyboardInterrupt):
+        store.compact()
+    monkeypatch.undo()
+
+
+def test_excel_store_crash_after_rename_keeps_rows_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'db.xlsx')
+    store = ExcelStore(path, 'Geräte', compact_interval=None)
+    store.append(_rows(1, 2))
+    # The new workbook is in place, the folded journal prefix is not yet removed
+    _crashing(store, monkeypatch, store.journal, 'truncate')
+
+    reopened = ExcelStore(path, 'Geräte', compact_interval=None)
+    assert _models(reopened) == ['M1', 'M2']
+    reopened.append(_rows(3))
+    reopened.compact()
+    assert _models(ExcelStore(path, 'Geräte', compact_interval=None)) == ['M1', 'M2', 'M3']
+
+
+def test_excel_store_crash_before_rename_keeps_journal(tmp_path, monkeypatch):
+    path = str(tmp_path / 'db.xlsx')
+    store = ExcelStore(path, 'Geräte', compact_interval=None)
+    store.append(_rows(1, 2))
+    # The marker is written, the workbook still is the old one
+    _crashing(store, monkeypatch, pue_storage, 'replace_file')
+
+    reopened = ExcelStore(path, 'Geräte', compact_interval=None)
+    assert reopened.journal.pending_rows == 2
+    assert _models(reopened) == ['M1', 'M2']
+    reopened.compact()
+    assert _models(ExcelStore(path, 'Geräte', compact_interval=None)) == ['M1', 'M2']
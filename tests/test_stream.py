@@ -0,0 +1,104 @@
+"""Reporting of rejected NDJSON lines and unusable CSV/JSON records"""
+
+import io
+import json
+
+import pytest
+
+from conftest import make_record
+from pue_storage import HEADERS
+from pue_stream import RejectedLines, iter_csv_records, iter_ndjson_records
+
+
+def _ndjson(*lines):
+    return ''.join(line + '\n' for line in lines)
+
+
+def test_ndjson_reports_line_numbers():
+    rejected = []
+    data = _ndjson(json.dumps(make_record(1)), '', '{"Hersteller": ', '[1, 2]',
+                   json.dumps(make_record(2)))
+    # A small read size splits lines across chunks
+    records = list(iter_ndjson_records(io.BytesIO(data.encode('utf-8')), rejected, read_size=7))
+
+    assert [record['Modellbezeichnung'] for record in records] == ['M1', 'M2']
+    assert [entry['line'] for entry in rejected] == [3, 4]
+    assert 'kein Objekt (list)' in rejected[1]['error']
+
+
+def test_ndjson_without_rejected_list_raises():
+    with pytest.raises(ValueError, match='Zeile 2'):
+        list(iter_ndjson_records(io.StringIO(_ndjson('{}', 'x'))))
+
+
+def test_rejected_lines_keeps_the_first_ones():
+    rejected = RejectedLines(limit=2)
+    for line in range(1, 6):
+        rejected.append({'line': line, 'error': 'x'})
+
+    assert [entry['line'] for entry in rejected.items] == [1, 2]
+    assert rejected.count == 5
+    assert rejected.truncated
+
+
+def test_add_ndjson_data_stores_the_valid_lines(open_collector):
+    collector = open_collector()
+    data = _ndjson(json.dumps(make_record(1)), 'kaputt', json.dumps(make_record(2)), '"text"')
+    result = collector.add_ndjson_data(data, batch_size=1, max_rejected=1)
+
+    assert result['inserted'] == 2
+    assert result['accepted'] == 2
+    assert result['rejected'] == [{'line': 2, 'error': result['rejected'][0]['error']}]
+    assert result['rejected_count'] == 2
+    assert result['truncated'] is True
+    assert collector.get_summary()['Gesamtanzahl'] == 2
+
+
+def test_bulk_endpoint_reports_rejected_lines(shared_collector):
+    from app import app
+
+    data = _ndjson(json.dumps(make_record(1)), '{nope', json.dumps(make_record(2)))
+    response = app.test_client().post('/api/bulk?dedup=skip', data=data,
+                                      content_type='application/x-ndjson')
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert body['inserted'] == 2
+    assert body['rejected_count'] == 1
+    assert body['rejected'][0]['line'] == 2
+    assert '1 abgelehnt' in body['message']
+
+
+def test_csv_empty_cells_become_none():
+    data = 'Hersteller,Modellbezeichnung,Nennleistung\r\nEaton,M1,\r\n"ABB, AG",M2,10 kW\r\n'
+    records = list(iter_csv_records(io.BytesIO(data.encode('utf-8-sig'))))
+
+    assert records == [
+        {'Hersteller': 'Eaton', 'Modellbezeichnung': 'M1', 'Nennleistung': None},
+        {'Hersteller': 'ABB, AG', 'Modellbezeichnung': 'M2', 'Nennleistung': '10 kW'},
+    ]
+
+
+def test_csv_rows_missing_required_fields_are_flagged(open_collector):
+    collector = open_collector()
+    data = 'Hersteller,Produktkategorie,Modellbezeichnung\nEaton,USV,M1\nEaton,,M2\n'
+    errors = []
+    result = collector.ingest(data, format='csv', errors=errors)
+
+    assert result['inserted'] == 2
+    assert errors == []
+    error_column = HEADERS.index('Verarbeitungsfehler')
+    flagged = {row[3]: row[error_column] for row in collector.iter_rows()}
+    assert flagged['M1'] is None
+    assert 'Pflichtfeld fehlt: Produktkategorie' in flagged['M2']
+
+
+def test_ingest_reports_records_that_are_no_objects(open_collector):
+    collector = open_collector()
+    errors = []
+    data = json.dumps([make_record(1), 'text', make_record(2), 5])
+    result = collector.ingest(data, errors=errors)
+
+    assert result['inserted'] == 2
+    assert [error['record'] for error in errors] == [1, 3]
+    assert all('kein Objekt' in error['error'] for error in errors)